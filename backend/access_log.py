@@ -0,0 +1,137 @@
+"""
+Structured logging.
+
+Every record is rendered as one JSON line by a QueueListener thread: request
+handlers only put the record on a queue, so slow stdout/disk never holds up the
+event loop. AccessLogMiddleware emits one record per HTTP request.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import random
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+import db_profiler
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Fraction of successful (< 400) requests logged; errors and slow requests are always logged
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0"))
+ACCESS_LOG_SLOW_MS = float(os.getenv("ACCESS_LOG_SLOW_MS", "1000"))
+
+access_logger = logging.getLogger("ordera.access")
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; fields passed as extra={"fields": {...}} are merged in"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Keep the record's args and traceback for the JSON formatter on the listener side
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+_listener = None
+
+def configure_logging(stream=None):
+    """Routes the root logger through a queue to a JSON stream handler (stdout by default)"""
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+def stop_logging():
+    """Flushes queued records; called on shutdown"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+class AccessLogMiddleware:
+    """
+    Pure ASGI access log: one record per HTTP request with the route template,
+    tenant, status, duration, response bytes and time spent in the database.
+    """
+
+    def __init__(self, app, routes=(), sample_rate: float = None, slow_ms: float = None):
+        self.app = app
+        # endpoint -> path template, so /orders/42/status is logged as /orders/{order_id:int}/status
+        self.route_paths = {route.endpoint: route.path for route in routes if hasattr(route, "endpoint")}
+        self.sample_rate = ACCESS_LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.slow_ms = ACCESS_LOG_SLOW_MS if slow_ms is None else slow_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        bytes_sent = 0
+
+        async def send_wrapper(message):
+            nonlocal status, bytes_sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                bytes_sent += len(message.get("body", b""))
+            elif message["type"] == "http.response.zerocopysend":
+                bytes_sent += message.get("count") or 0
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Owned by the enclosing QueryProfilerMiddleware
+            query_stats = db_profiler.current_stats() or db_profiler.QueryStats()
+            duration_ms = (time.perf_counter() - started) * 1000
+            if status >= 400 or duration_ms >= self.slow_ms or random.random() < self.sample_rate:
+                self._log(scope, status, duration_ms, bytes_sent, query_stats)
+
+    def _log(self, scope, status: int, duration_ms: float, bytes_sent: int, query_stats):
+        user = (scope.get("state") or {}).get("user") or {}
+        fields = {
+            "method": scope["method"],
+            "route": self.route_paths.get(scope.get("endpoint"), "<unmatched>"),
+            "path": scope["path"],
+            "status": status,
+            "duration_ms": round(duration_ms, 2),
+            "bytes": bytes_sent,
+            "db_ms": round(query_stats.seconds * 1000, 2),
+            "db_queries": query_stats.count,
+            "restaurant_id": user.get("restaurant_id"),
+        }
+        level = logging.ERROR if status >= 500 else logging.WARNING if status >= 400 else logging.INFO
+        access_logger.log(level, "request", extra={"fields": fields})
@@ -0,0 +1,199 @@
+"""
+In-memory projection of each restaurant's active orders, for kitchen displays.
+
+A projection is loaded from the DB on first access. After that it follows the
+order events (create and status update): the ones this process handles directly,
+and everyone's through the restaurant's broadcast channel. Events carry the
+per-restaurant `seq`, so duplicates and stale events are dropped. Orders leave
+the projection when they reach a terminal status, so memory follows the number
+of open orders, not the order history. Reads never touch the DB: the JSON body
+is assembled from per-order payloads encoded when the order last changed.
+"""
+import os
+import time
+import asyncio
+import logging
+import collections
+import msgspec
+from sqlalchemy.orm import selectinload, joinedload
+import database, models, codec, ws_manager, metrics
+
+logger = logging.getLogger("ordera.active_orders")
+
+# Statuses the kitchen no longer shows; every other status is active
+TERMINAL_STATUSES = frozenset({"completed", "cancelled"})
+ACTIVE_ORDERS_MAX_RESTAURANTS = int(os.getenv("ACTIVE_ORDERS_MAX_RESTAURANTS", "1024"))
+# Rebuilt from the DB in the background after this long, in case an event was lost
+ACTIVE_ORDERS_REFRESH_SECONDS = float(os.getenv("ACTIVE_ORDERS_REFRESH_SECONDS", "300"))
+# Recently finished orders remembered per restaurant, so late events can't revive them
+MAX_TOMBSTONES = 512
+MAX_INTERNED_MODIFIERS = 4096
+
+_modifiers: dict[bytes, dict] = {}
+
+def intern_modifiers(modifiers):
+    """One shared dict per distinct modifier selection ({"size": "M"} repeats a lot)"""
+    if not isinstance(modifiers, dict):
+        return modifiers
+    key = codec.encode(modifiers)
+    shared = _modifiers.get(key)
+    if shared is None:
+        if len(_modifiers) >= MAX_INTERNED_MODIFIERS:
+            _modifiers.clear()
+        shared = _modifiers[key] = modifiers
+    return shared
+
+class ActiveOrder:
+    __slots__ = ("seq", "order", "payload")
+
+    def __init__(self, seq: int, order: codec.Order):
+        for item in order.items:
+            item.selected_modifiers = intern_modifiers(item.selected_modifiers)
+        self.seq = seq
+        self.order = order
+        self.payload = codec.encode(order)
+
+class RestaurantProjection:
+    def __init__(self, restaurant_id: int, base_seq: int, orders: list):
+        self.restaurant_id = restaurant_id
+        # Everything up to base_seq is already in the loaded state
+        self.base_seq = base_seq
+        # order id -> ActiveOrder, oldest first
+        self.orders: dict[int, ActiveOrder] = {order.id: ActiveOrder(base_seq, order) for order in orders}
+        self.tombstones: collections.OrderedDict[int, int] = collections.OrderedDict()
+        self.generation = os.urandom(4).hex()
+        self.version = 0
+        self.built_at = time.monotonic()
+        self._body = None
+
+    def apply(self, seq: int, order: codec.Order) -> bool:
+        """Applies an order event; returns False if it was a duplicate or stale"""
+        if seq <= self.base_seq:
+            return False
+        current = self.orders.get(order.id)
+        if current is not None and seq <= current.seq:
+            return False
+        finished_at = self.tombstones.get(order.id)
+        if finished_at is not None and seq <= finished_at:
+            return False
+
+        if order.status in TERMINAL_STATUSES:
+            self.orders.pop(order.id, None)
+            self.tombstones[order.id] = seq
+            if len(self.tombstones) > MAX_TOMBSTONES:
+                self.tombstones.popitem(last=False)
+        else:
+            self.orders[order.id] = ActiveOrder(seq, order)
+        self.version += 1
+        self._body = None
+        return True
+
+    def etag(self) -> str:
+        return f'"active-{self.restaurant_id}-{self.generation}-{self.version}"'
+
+    def body(self) -> bytes:
+        """JSON list of active orders, newest first, as list_orders returns them"""
+        if self._body is None:
+            self._body = b"[" + b",".join(record.payload for record in reversed(self.orders.values())) + b"]"
+        return self._body
+
+def load_active_orders(restaurant_id: int):
+    with database.get_db_context() as db:
+        # Sequence first: orders committed with a seq up to this one are in the query below
+        seq = db.query(models.Restaurant.event_seq).filter(models.Restaurant.id == restaurant_id).scalar() or 0
+        orders = db.query(models.Order).options(
+            selectinload(models.Order.items).joinedload(models.OrderItem.product)
+        ).filter(
+            models.Order.restaurant_id == restaurant_id,
+            models.Order.status.notin_(TERMINAL_STATUSES)
+        ).order_by(models.Order.created_at, models.Order.id).all()
+        return seq, [codec.order_from_orm(order) for order in orders]
+
+class ActiveOrderStore:
+    """Projections of the most recently used restaurants (event loop only)"""
+
+    def __init__(self, maxsize: int = ACTIVE_ORDERS_MAX_RESTAURANTS, refresh_seconds: float = ACTIVE_ORDERS_REFRESH_SECONDS):
+        self.maxsize = maxsize
+        self.refresh_seconds = refresh_seconds
+        self._projections: collections.OrderedDict[int, RestaurantProjection] = collections.OrderedDict()
+        self._builds: dict[int, asyncio.Task] = {}
+        # Events received while a projection is being (re)built, replayed onto the result
+        self._pending: dict[int, list] = {}
+        self._observers: dict[int, object] = {}
+
+    async def get(self, restaurant_id: int) -> RestaurantProjection:
+        projection = self._projections.get(restaurant_id)
+        if projection is not None:
+            self._projections.move_to_end(restaurant_id)
+            if time.monotonic() - projection.built_at > self.refresh_seconds:
+                self._start_build(restaurant_id)
+            return projection
+        return await asyncio.shield(self._start_build(restaurant_id))
+
+    def apply(self, restaurant_id: int, seq: int, order: codec.Order):
+        projection = self._projections.get(restaurant_id)
+        if projection is not None:
+            projection.apply(seq, order)
+        if restaurant_id in self._pending:
+            self._pending[restaurant_id].append((seq, order))
+
+    def _start_build(self, restaurant_id: int) -> asyncio.Task:
+        task = self._builds.get(restaurant_id)
+        if task is None:
+            task = self._builds[restaurant_id] = asyncio.create_task(self._build(restaurant_id))
+            task.add_done_callback(lambda _: self._builds.pop(restaurant_id, None))
+        return task
+
+    async def _build(self, restaurant_id: int) -> RestaurantProjection:
+        self._pending[restaurant_id] = []
+        try:
+            # Subscribe before reading so no event falls between the two
+            await self._observe(restaurant_id)
+            seq, orders = await database.run_db(load_active_orders, restaurant_id)
+            projection = RestaurantProjection(restaurant_id, seq, orders)
+            for event_seq, order in self._pending[restaurant_id]:
+                projection.apply(event_seq, order)
+        finally:
+            self._pending.pop(restaurant_id, None)
+
+        self._projections[restaurant_id] = projection
+        self._projections.move_to_end(restaurant_id)
+        while len(self._projections) > self.maxsize:
+            evicted, _ = self._projections.popitem(last=False)
+            self._unobserve(evicted)
+        return projection
+
+    async def _observe(self, restaurant_id: int):
+        # Re-registered on every build, which also revives a subscription that failed
+        self._unobserve(restaurant_id)
+        callback = self._observers[restaurant_id] = lambda message: self._on_message(restaurant_id, message)
+        await ws_manager.manager.add_observer(restaurant_id, callback)
+
+    def _unobserve(self, restaurant_id: int):
+        callback = self._observers.pop(restaurant_id, None)
+        if callback is not None:
+            ws_manager.manager.remove_observer(restaurant_id, callback)
+
+    def _on_message(self, restaurant_id: int, message: str):
+        try:
+            event = codec.decode(message.encode(), codec.OrderEvent)
+        except msgspec.DecodeError:
+            return  # not an order event
+        self.apply(restaurant_id, event.seq, event.order)
+
+    def close(self):
+        for task in self._builds.values():
+            task.cancel()
+        for restaurant_id in list(self._observers):
+            self._unobserve(restaurant_id)
+        self._projections.clear()
+
+    def counts(self) -> dict:
+        return {(restaurant_id,): len(projection.orders) for restaurant_id, projection in self._projections.items()}
+
+store = ActiveOrderStore()
+
+metrics.register(metrics.Gauge(
+    "ordera_active_orders", "Orders held in the active order projection of this process",
+    ("restaurant_id",), collect=store.counts
+))
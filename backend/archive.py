@@ -0,0 +1,150 @@
+"""
+Hot/cold order storage.
+
+Completed orders older than ORDER_ARCHIVE_AFTER_DAYS are moved from orders /
+order_items into orders_archive / order_items_archive, keeping their ids. Each
+batch is one short transaction: INSERT ... SELECT into the archive, then DELETE
+from the hot tables, by order id. Row locks are held only for one batch, and
+kiosks and the kitchen keep writing in between. Batches are ORDER_ARCHIVE_BATCH_SIZE
+orders, separated by ORDER_ARCHIVE_BATCH_PAUSE_SECONDS so replicas and autovacuum
+keep up.
+
+Every worker runs the archiver, so batches take a lock shared by all processes on
+the database: an advisory lock in the batch's transaction on Postgres, a lock file
+next to the database on SQLite. A worker that finds it taken ends its pass; the
+holder finishes the work.
+
+Order reads go to the hot tables; list_orders spans the archive only with
+?history=true. The hot tables are sized by the archive age (days), not by the
+restaurant's lifetime.
+
+Run once from backend/:  python archive.py [--days N]
+"""
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, delete, func, literal, text, DateTime
+import database, models, locks
+
+logger = logging.getLogger("ordera.archive")
+
+ORDER_ARCHIVE_AFTER_DAYS = float(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", "14"))
+ORDER_ARCHIVE_BATCH_SIZE = int(os.getenv("ORDER_ARCHIVE_BATCH_SIZE", "500"))
+ORDER_ARCHIVE_BATCH_PAUSE_SECONDS = float(os.getenv("ORDER_ARCHIVE_BATCH_PAUSE_SECONDS", "0.1"))
+# 0 disables the background task (e.g. when archive.py runs from cron instead)
+ORDER_ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ORDER_ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+ARCHIVED_STATUSES = ("completed",)
+# pg_try_advisory_xact_lock key, next to migrate.ADVISORY_LOCK_ID
+ARCHIVE_LOCK_ID = 7_212_002
+
+ORDER_COLUMNS = ("id", "order_number", "status", "total_amount", "payment_status", "payment_method", "created_at", "restaurant_id")
+ITEM_COLUMNS = ("id", "order_id", "product_id", "quantity", "selected_modifiers")
+
+def archive_lock():
+    """
+    Lock file serialising batches of every process on a SQLite database, or None
+    where it isn't needed (Postgres locks in the batch transaction; an in-memory
+    database has no other process)
+    """
+    if database.is_sqlite and not database.is_sqlite_memory:
+        return locks.FileLock(f"{database.engine.url.database}.archive.lock")
+    return None
+
+def archive_batch(cutoff: datetime, batch_size: int = None) -> int:
+    """
+    Moves up to batch_size completed orders created before cutoff; returns how
+    many moved, 0 if another process is archiving
+    """
+    lock = archive_lock()
+    if lock is not None and not lock.acquire():
+        return 0
+    try:
+        return _archive_batch(cutoff, batch_size or ORDER_ARCHIVE_BATCH_SIZE)
+    finally:
+        if lock is not None:
+            lock.release()
+
+def _archive_batch(cutoff: datetime, batch_size: int) -> int:
+    order, item = models.Order, models.OrderItem
+    with database.get_db_context() as db:
+        if db.bind.dialect.name == "postgresql":
+            # Released with the transaction, so it also works through PgBouncer in transaction mode
+            if not db.execute(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": ARCHIVE_LOCK_ID}).scalar():
+                return 0
+        # The newest order always stays hot: SQLite hands out max(id) + 1 as the next
+        # id, so an emptied table would reuse ids that are already in the archive.
+        newest_id = db.query(func.max(order.id)).scalar()
+        query = db.query(order.id).filter(
+            order.status.in_(ARCHIVED_STATUSES),
+            order.created_at < cutoff,
+            order.id < newest_id
+        ).order_by(order.created_at).limit(batch_size)
+        if db.bind.dialect.name == "postgresql":
+            # Leave rows another transaction is touching for the next pass
+            query = query.with_for_update(skip_locked=True)
+        ids = [row.id for row in query]
+        if not ids:
+            return 0
+
+        now = datetime.utcnow()
+        db.execute(insert(models.ArchivedOrder).from_select(
+            ORDER_COLUMNS + ("archived_at",),
+            select(*(getattr(order, c) for c in ORDER_COLUMNS), literal(now, DateTime)).where(order.id.in_(ids))
+        ))
+        db.execute(insert(models.ArchivedOrderItem).from_select(
+            ITEM_COLUMNS,
+            select(*(getattr(item, c) for c in ITEM_COLUMNS)).where(item.order_id.in_(ids))
+        ))
+        db.execute(delete(item).where(item.order_id.in_(ids)))
+        db.execute(delete(order).where(order.id.in_(ids)))
+        db.commit()
+        return len(ids)
+
+def archive_cutoff(max_age_days: float = None) -> datetime:
+    max_age_days = ORDER_ARCHIVE_AFTER_DAYS if max_age_days is None else max_age_days
+    return datetime.utcnow() - timedelta(days=max_age_days)
+
+def archive_completed(max_age_days: float = None) -> int:
+    """Archives everything eligible, batch by batch; returns the number of orders moved"""
+    cutoff = archive_cutoff(max_age_days)
+    total = 0
+    while True:
+        moved = archive_batch(cutoff)
+        total += moved
+        if moved < ORDER_ARCHIVE_BATCH_SIZE:
+            return total
+        time.sleep(ORDER_ARCHIVE_BATCH_PAUSE_SECONDS)
+
+async def archive_pass() -> int:
+    """archive_completed for the event loop: one DB worker per batch, not one for the whole pass"""
+    cutoff = archive_cutoff()
+    total = 0
+    while True:
+        moved = await database.run_db(archive_batch, cutoff)
+        total += moved
+        if moved < ORDER_ARCHIVE_BATCH_SIZE:
+            return total
+        await asyncio.sleep(ORDER_ARCHIVE_BATCH_PAUSE_SECONDS)
+
+async def archive_periodically(interval_seconds: int = ORDER_ARCHIVE_INTERVAL_SECONDS):
+    """Background task started by main.startup"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            moved = await archive_pass()
+            if moved:
+                logger.info("Archived %d completed orders", moved)
+        except Exception:
+            logger.exception("Order archival failed")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Move old completed orders to the archive tables")
+    parser.add_argument("--days", type=float, default=ORDER_ARCHIVE_AFTER_DAYS, help="archive orders older than this")
+    args = parser.parse_args()
+    import migrate
+    migrate.upgrade()
+    print(f"Archived {archive_completed(args.days)} completed orders older than {args.days:g} days")
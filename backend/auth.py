@@ -2,9 +2,14 @@ import hmac
 import hashlib
 import base64
 import json
+import os
+import time
+import asyncio
+import collections
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
-from starlette.requests import Request
+from starlette.requests import HTTPConnection, Request
 
 # Configuration
 SECRET_KEY = "your_secret_key_keep_it_safe"
@@ -12,14 +17,124 @@ ALGORITHM = "HS256"
 
 # --- Pure Python Crypto Primitives ---
 
+# scrypt cost parameters; raising them upgrades stored hashes on the next login
+PASSWORD_SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", str(2 ** 14)))
+PASSWORD_SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+PASSWORD_SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+
+LEGACY_SALT = "fixed_salt_for_proto"
+
+def _legacy_hash(password: str) -> str:
+    # Prototype scheme: single SHA-256 with a fixed salt (kept only to verify old hashes)
+    return hashlib.sha256((password + LEGACY_SALT).encode()).hexdigest()
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 1024 * 1024, dklen=32)
+
 def get_password_hash(password: str) -> str:
-    # Fixed salt for prototype stability
-    salt = "fixed_salt_for_proto" 
-    return hashlib.sha256((password + salt).encode()).hexdigest()
+    """scrypt with a per-user salt, stored as scrypt$n$r$p$salt$hash"""
+    salt = os.urandom(16)
+    digest = _scrypt(password, salt, PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P)
+    return f"scrypt${PASSWORD_SCRYPT_N}${PASSWORD_SCRYPT_R}${PASSWORD_SCRYPT_P}${base64url_encode(salt)}${base64url_encode(digest)}"
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    salt = "fixed_salt_for_proto"
-    return hashlib.sha256((plain_password + salt).encode()).hexdigest() == hashed_password
+    if not plain_password or not hashed_password:
+        return False
+    if not hashed_password.startswith("scrypt$"):
+        return hmac.compare_digest(_legacy_hash(plain_password), hashed_password)
+    try:
+        _, n, r, p, salt, digest = hashed_password.split("$")
+        expected = _scrypt(plain_password, base64url_decode(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(base64url_encode(expected), digest)
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True for legacy SHA-256 hashes and scrypt hashes with outdated cost parameters"""
+    return not hashed_password.startswith(
+        f"scrypt${PASSWORD_SCRYPT_N}${PASSWORD_SCRYPT_R}${PASSWORD_SCRYPT_P}$"
+    )
+
+# --- Password Hashing Pool ---
+# Hashing is deliberately expensive, so it never runs on the event loop. A bounded pool
+# caps the CPU spent on it; when too many requests are already waiting, new ones are
+# refused instead of queueing without limit.
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "256"))
+# "thread" (hashlib.scrypt releases the GIL) or "process"
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+
+class PasswordHashBusy(Exception):
+    """Raised when the hashing queue is full"""
+
+class PasswordHasher:
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING,
+                 executor: str = PASSWORD_HASH_EXECUTOR):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor_kind = executor
+        self._executor = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ordera-hash")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHashBusy()
+        self.pending += 1
+        submitted = time.perf_counter()
+        try:
+            result, started, finished = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), _timed_call, fn, *args
+            )
+        finally:
+            self.pending -= 1
+        # perf_counter is system-wide, so worker timestamps compare with ours
+        queued = max(started - submitted, 0.0)
+        self.completed += 1
+        self.queue_seconds_total += queued
+        self.queue_seconds_max = max(self.queue_seconds_max, queued)
+        self.run_seconds_total += finished - started
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "executor": self.executor_kind,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_seconds_avg": round(self.queue_seconds_total / self.completed, 6) if self.completed else 0.0,
+            "queue_seconds_max": round(self.queue_seconds_max, 6),
+            "run_seconds_avg": round(self.run_seconds_total / self.completed, 6) if self.completed else 0.0,
+        }
+
+def _timed_call(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, started, time.perf_counter()
+
+password_hasher = PasswordHasher()
 
 # --- Pure Python JWT Implementation ---
 
@@ -84,9 +199,60 @@ def decode_token(token: str) -> Optional[dict]:
     except Exception:
         return None
 
+# --- Verified Token Cache ---
+
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "4096"))
+
+class TokenCache:
+    """
+    Bounded LRU of recently verified tokens, keyed by signature.
+    A hit skips the HMAC, base64 and JSON work of decode_token; expiry is still checked.
+    """
+
+    def __init__(self, maxsize: int = AUTH_TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "collections.OrderedDict[str, tuple[str, dict]]" = collections.OrderedDict()
+
+    def decode(self, token: str) -> Optional[dict]:
+        signed, _, signature = token.rpartition('.')
+        entry = self._entries.get(signature)
+        if entry and entry[0] == signed:
+            payload = entry[1]
+            exp = payload.get("exp")
+            if exp and datetime.utcnow().timestamp() > exp:
+                del self._entries[signature]
+                return None
+            self._entries.move_to_end(signature)
+            return payload
+
+        payload = decode_token(token)
+        if payload is not None:
+            self._entries[signature] = (signed, payload)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return payload
+
+token_cache = TokenCache()
+
+class AuthMiddleware:
+    """
+    Pure ASGI middleware that verifies the bearer token (or ?token= for WebSockets)
+    once per request and stores the payload in request.state.user (None when absent
+    or invalid). Endpoints decide whether a user is required.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            token = get_current_user_token(HTTPConnection(scope))
+            scope.setdefault("state", {})["user"] = token_cache.decode(token) if token else None
+        await self.app(scope, receive, send)
+
 # --- Utils ---
 
-def get_current_user_token(request: Request) -> Optional[str]:
+def get_current_user_token(request: HTTPConnection) -> Optional[str]:
     auth_header = request.headers.get("Authorization")
     if not auth_header:
         # Check query param (for WebSocket)
@@ -0,0 +1,152 @@
+"""
+Encode/decode throughput of the codec layer against the previous hand-built path.
+
+Payloads mirror GET /orders/ (orders with items and product refs) and
+GET /products/. "legacy" builds dicts field by field and renders them with
+starlette's JSONResponse (stdlib json); "codec" encodes msgspec Structs
+straight to bytes. Decoding compares json.loads + .get() against a typed
+one-pass decode of an order creation body.
+
+Usage (from backend/):
+    python benchmarks/codec_bench.py --orders 500 --items 4 --products 200
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from starlette.responses import JSONResponse
+import models, codec
+
+
+def make_orders(count, items_per_order, products):
+    orders = []
+    for n in range(count):
+        order = models.Order(
+            id=n + 1, order_number=n + 1, status="pending", total_amount=42.5,
+            payment_status="paid", payment_method="upi", created_at=datetime.utcnow(), restaurant_id=1
+        )
+        order.items = [
+            models.OrderItem(
+                id=n * items_per_order + i, product_id=products[i % len(products)].id,
+                product=products[i % len(products)], quantity=2, selected_modifiers={"size": "L", "spice": "medium"}
+            )
+            for i in range(items_per_order)
+        ]
+        orders.append(order)
+    return orders
+
+
+def make_products(count):
+    return [
+        models.Product(
+            id=i + 1, name=f"Item {i}", price=4.5 + i, description="House special with a long description",
+            category_id=1 + i % 8, image_url=f"/uploads/{i:064x}.jpg", is_available=True,
+            modifiers={"size": ["S", "M", "L"], "extras": ["cheese", "jalapeno"]}, restaurant_id=1
+        )
+        for i in range(count)
+    ]
+
+
+def legacy_orders(orders):
+    data = []
+    for o in orders:
+        items = []
+        for i in o.items:
+            items.append({
+                "id": i.id,
+                "product_id": i.product_id,
+                "product": {"id": i.product.id, "name": i.product.name, "price": i.product.price} if i.product else None,
+                "quantity": i.quantity,
+                "selected_modifiers": i.selected_modifiers
+            })
+        data.append({
+            "id": o.id, "order_number": o.order_number, "status": o.status, "total_amount": o.total_amount,
+            "payment_status": o.payment_status, "payment_method": o.payment_method,
+            "created_at": o.created_at.isoformat() if o.created_at else None, "items": items
+        })
+    return JSONResponse(data).body
+
+
+def legacy_products(products, category_names):
+    data = []
+    for p in products:
+        data.append({
+            "id": p.id, "name": p.name, "price": p.price, "description": p.description,
+            "category_id": p.category_id, "category_name": category_names.get(p.category_id),
+            "image_url": p.image_url, "is_available": p.is_available, "modifiers": p.modifiers
+        })
+    return JSONResponse(data).body
+
+
+def legacy_decode(body):
+    data = json.loads(body)
+    total_amount = float(data.get("total_amount"))
+    items = [(int(i.get("product_id")), i.get("quantity", 1), i.get("selected_modifiers", {})) for i in data.get("items", [])]
+    return total_amount, items, data.get("payment_status", "unpaid"), data.get("payment_method", "cash")
+
+
+def measure(fn, min_seconds):
+    runs, start = 0, time.perf_counter()
+    while True:
+        result = fn()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return runs / elapsed, result
+
+
+def report(name, legacy_fn, codec_fn, min_seconds, size=None):
+    legacy_rate, _ = measure(legacy_fn, min_seconds)
+    codec_rate, codec_out = measure(codec_fn, min_seconds)
+    return {
+        "payload": name,
+        "bytes": size if size is not None else len(codec_out),
+        "legacy_ops_per_s": round(legacy_rate, 1),
+        "codec_ops_per_s": round(codec_rate, 1),
+        "speedup": round(codec_rate / legacy_rate, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--items", type=int, default=4, help="items per order")
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=1.0, help="minimum run time per measurement")
+    args = parser.parse_args()
+
+    products = make_products(args.products)
+    orders = make_orders(args.orders, args.items, products)
+    category_names = {c: f"Category {c}" for c in range(1, 9)}
+    order_body = json.dumps({
+        "total_amount": 42.5, "payment_status": "paid", "payment_method": "card",
+        "items": [{"product_id": p.id, "quantity": 1, "selected_modifiers": {"size": "M"}} for p in products[:12]]
+    }).encode()
+
+    results = [
+        report(
+            "list_orders encode", lambda: legacy_orders(orders),
+            lambda: codec.encode([codec.order_from_orm(o) for o in orders]), args.seconds
+        ),
+        report(
+            "list_products encode", lambda: legacy_products(products, category_names),
+            lambda: codec.encode([codec.product_from_orm(p, category_names.get(p.category_id)) for p in products]),
+            args.seconds
+        ),
+        report(
+            "create_order decode", lambda: legacy_decode(order_body),
+            lambda: codec.decode(order_body, codec.OrderIn), args.seconds, size=len(order_body)
+        ),
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
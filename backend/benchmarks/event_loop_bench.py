@@ -0,0 +1,187 @@
+"""
+Event loop blocking benchmark: p99 latency under mixed HTTP + WebSocket load.
+
+Runs main.app in-process against a throwaway SQLite database with a simulated
+per-statement round trip (to stand in for a remote Postgres), while kitchen
+sockets registered with ws_manager receive broadcasts. Two modes are compared:
+
+  inline    - DB work runs directly on the event loop (the old handler behaviour)
+  executor  - DB work goes through database.run_db (the bounded worker pool)
+
+Load is open loop (a fixed request rate, latency measured from each request's
+scheduled start), so time the event loop spends blocked is counted. Inline mode
+tops out near 1 / (statements per request * round trip); pick --rate above that
+to see the difference in HTTP tail latency, below it the two modes match.
+
+Usage (from backend/, requires httpx):
+    python benchmarks/event_loop_bench.py --duration 10 --rate 45 --db-latency-ms 5
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_tmp_dir = tempfile.mkdtemp(prefix="ordera-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+
+import httpx
+from sqlalchemy import event
+from starlette.websockets import WebSocketState
+import main, database, models, auth, ws_manager
+
+
+class BenchSocket:
+    """Stands in for a connected kitchen display and records push latency"""
+
+    def __init__(self, latencies):
+        self.application_state = WebSocketState.CONNECTED
+        self.latencies = latencies
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        sent_at = json.loads(message).get("sent_at")
+        if sent_at:
+            self.latencies.append(time.perf_counter() - sent_at)
+
+
+def seed(products_per_restaurant=30):
+    with database.get_db_context() as db:
+        restaurant = models.Restaurant(name="Bench - Central", city="Bench")
+        db.add(restaurant)
+        db.commit()
+        category = models.Category(name="Mains", restaurant_id=restaurant.id)
+        db.add(category)
+        db.commit()
+        for i in range(products_per_restaurant):
+            db.add(models.Product(
+                name=f"Item {i}", price=5.0 + i, description="", image_url="",
+                category_id=category.id, modifiers={}, restaurant_id=restaurant.id
+            ))
+        db.commit()
+        product_ids = [p.id for p in db.query(models.Product.id).all()]
+        return restaurant.id, product_ids
+
+
+def percentiles(samples):
+    if len(samples) < 2:
+        return {"count": len(samples)}
+    # Inclusive: cut points stay within the observed samples (the default
+    # exclusive method extrapolates past the maximum on small or skewed samples)
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "count": len(samples),
+        "p50_ms": round(cuts[49] * 1000, 2),
+        "p95_ms": round(cuts[94] * 1000, 2),
+        "p99_ms": round(cuts[98] * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+    }
+
+
+async def run_mode(mode, args, restaurant_id, product_ids):
+    original_run_db = database.run_db
+    if mode == "inline":
+        async def run_inline(fn, *a, **kw):
+            return fn(*a, **kw)
+        database.run_db = run_inline
+
+    token = auth.create_access_token(data={"sub": "bench", "role": "admin", "restaurant_id": restaurant_id})
+    headers = {"Authorization": f"Bearer {token}"}
+    http_latencies, ws_latencies = [], []
+    deadline = time.perf_counter() + args.duration
+
+    await main.startup()
+    sockets = [BenchSocket(ws_latencies) for _ in range(args.sockets)]
+    for socket in sockets:
+        await ws_manager.manager.connect(socket, restaurant_id)
+    await asyncio.sleep(0.05)  # let the channel subscription start
+
+    async def request(client, i, scheduled):
+        kind = i % 4
+        if kind == 0:
+            await client.get("/products/", headers=headers)
+        elif kind == 1:
+            await client.post("/orders/", headers=headers, json={
+                "total_amount": 10.0,
+                "items": [{"product_id": product_ids[i % len(product_ids)], "quantity": 1}]
+            })
+        elif kind == 2:
+            await client.get("/orders/?status=pending,preparing,ready&limit=50", headers=headers)
+        else:
+            await client.put(f"/orders/{1 + i % 50}/status?status_update=preparing", headers=headers)
+        http_latencies.append(time.perf_counter() - scheduled)
+
+    async def load(client):
+        # Open loop: request i is due at start + i / rate whether or not earlier ones
+        # have finished, and its latency counts from that time. A blocked event loop
+        # then shows up as latency instead of quietly lowering the offered load.
+        start = time.perf_counter()
+        tasks = []
+        for i in range(int(args.duration * args.rate)):
+            scheduled = start + i / args.rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(request(client, i, scheduled)))
+        await asyncio.gather(*tasks)
+
+    async def publisher():
+        while time.perf_counter() < deadline:
+            await ws_manager.manager.broadcast_to_restaurant(
+                json.dumps({"event": "ping", "sent_at": time.perf_counter()}), restaurant_id
+            )
+            await asyncio.sleep(0.02)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(publisher(), load(client))
+        elapsed = time.perf_counter() - started
+
+    for socket in sockets:
+        ws_manager.manager.disconnect(socket, restaurant_id)
+    await main.shutdown()
+    database.run_db = original_run_db
+
+    return {
+        "mode": mode,
+        "http": percentiles(http_latencies),
+        "http_rps": round(len(http_latencies) / elapsed, 1),
+        "ws_push": percentiles(ws_latencies),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per mode")
+    parser.add_argument("--rate", type=float, default=45.0, help="HTTP requests started per second")
+    parser.add_argument("--sockets", type=int, default=100, help="kitchen sockets receiving broadcasts")
+    parser.add_argument("--db-latency-ms", type=float, default=5.0, help="simulated round trip per statement")
+    parser.add_argument("--mode", choices=["inline", "executor", "both"], default="both")
+    args = parser.parse_args()
+
+    # Silence per-request logging so it doesn't dominate the measurement
+    import logging
+    logging.getLogger("ordera").setLevel(logging.WARNING)
+
+    if args.db_latency_ms:
+        @event.listens_for(database.engine, "before_cursor_execute")
+        def simulate_round_trip(*_):
+            time.sleep(args.db_latency_ms / 1000)
+
+    restaurant_id, product_ids = seed()
+    modes = ["inline", "executor"] if args.mode == "both" else [args.mode]
+    results = [asyncio.run(run_mode(mode, args, restaurant_id, product_ids)) for mode in modes]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
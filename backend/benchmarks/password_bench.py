@@ -0,0 +1,82 @@
+"""
+Login throughput per core for the password hashing pool.
+
+Fires concurrent verifications through auth.password_hasher for a fixed time and
+reports verifications/s, verifications/s per worker core, pool queue time, and
+the event loop lag seen meanwhile by a 10 ms ticker (a stand-in for WebSocket
+pushes during a shift-change login storm). The legacy inline SHA-256 check is
+measured for reference.
+
+Usage (from backend/):
+    python benchmarks/password_bench.py --duration 5 --concurrency 64 --workers 2
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import auth
+
+
+async def storm(hasher, hashed, duration, concurrency):
+    deadline = time.perf_counter() + duration
+    verified = 0
+    lags = []
+
+    async def client():
+        nonlocal verified
+        while time.perf_counter() < deadline:
+            assert await hasher.verify("correct horse battery staple", hashed)
+            verified += 1
+
+    async def ticker():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - start - 0.01)
+
+    await asyncio.gather(ticker(), *(client() for _ in range(concurrency)))
+    return verified, lags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=64, help="concurrent logins")
+    parser.add_argument("--workers", type=int, default=auth.PASSWORD_HASH_WORKERS)
+    parser.add_argument("--executor", choices=["thread", "process"], default=auth.PASSWORD_HASH_EXECUTOR)
+    args = parser.parse_args()
+
+    hashed = auth.get_password_hash("correct horse battery staple")
+    hasher = auth.PasswordHasher(workers=args.workers, max_pending=args.concurrency, executor=args.executor)
+    verified, lags = asyncio.run(storm(hasher, hashed, args.duration, args.concurrency))
+
+    legacy_hash = auth._legacy_hash("correct horse battery staple")
+    runs, start = 0, time.perf_counter()
+    while time.perf_counter() - start < 1.0:
+        auth.verify_password("correct horse battery staple", legacy_hash)
+        runs += 1
+
+    cores = min(args.workers, os.cpu_count() or 1)
+    lag_cuts = statistics.quantiles(lags, n=100) if len(lags) > 1 else [0.0] * 99
+    print(json.dumps({
+        "kdf": hashed.rsplit("$", 2)[0],
+        "executor": args.executor,
+        "workers": args.workers,
+        "cores_used": cores,
+        "verifications_per_s": round(verified / args.duration, 1),
+        "verifications_per_s_per_core": round(verified / args.duration / cores, 1),
+        "pool": hasher.stats(),
+        "loop_lag_p99_ms": round(lag_cuts[98] * 1000, 2),
+        "legacy_sha256_inline_per_s": runs,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Typed wire format for orders and the menu.
+
+Request bodies are decoded and validated in one pass into msgspec Structs, and
+responses are encoded from Structs straight to bytes, replacing request.json()
+with hand-picked fields and dicts rendered by the stdlib json module.
+"""
+from datetime import datetime
+from typing import Any, Optional, Union
+import msgspec
+from msgspec import UNSET, UnsetType
+from starlette.requests import Request
+from starlette.responses import Response
+import models
+
+# --- Response types ---
+
+class ProductRef(msgspec.Struct):
+    id: int
+    name: str
+    price: float
+
+class OrderItem(msgspec.Struct):
+    id: int
+    product_id: int
+    product: Optional[ProductRef]
+    quantity: int
+    selected_modifiers: Any
+
+class Order(msgspec.Struct):
+    id: int
+    order_number: Optional[int]
+    status: str
+    total_amount: Optional[float]
+    payment_status: str
+    payment_method: str
+    items: list[OrderItem]
+    created_at: Optional[datetime]
+
+class Product(msgspec.Struct):
+    id: int
+    name: str
+    price: Optional[float]
+    description: Optional[str]
+    category_id: Optional[int]
+    category_name: Optional[str]
+    image_url: Optional[str]
+    is_available: Optional[bool]
+    modifiers: Any
+
+class Category(msgspec.Struct):
+    id: int
+    name: str
+    restaurant_id: int
+
+class OrderEvent(msgspec.Struct):
+    event: str
+    seq: int
+    order_id: int
+    order: Order
+    status: Union[str, None, UnsetType] = UNSET
+
+# --- Request types ---
+# Fields the handlers check themselves default to empty values, so the existing
+# error messages are kept; wrong types are rejected by the decoder.
+
+class OrderItemIn(msgspec.Struct):
+    product_id: int
+    quantity: int = 1
+    selected_modifiers: dict[str, Any] = {}
+
+class OrderIn(msgspec.Struct):
+    total_amount: Optional[float] = None
+    items: list[OrderItemIn] = []
+    payment_status: str = "unpaid"
+    payment_method: str = "cash"
+
+class CategoryIn(msgspec.Struct):
+    name: Optional[str] = None
+
+class ProductIn(msgspec.Struct):
+    name: Optional[str] = None
+    price: Optional[float] = None
+    category_id: Optional[int] = None
+    description: str = ""
+    image_url: str = ""
+    is_available: bool = True
+    modifiers: dict[str, Any] = {}
+
+class ProductUpdate(msgspec.Struct):
+    name: Union[str, UnsetType] = UNSET
+    price: Union[float, UnsetType] = UNSET
+    description: Union[Optional[str], UnsetType] = UNSET
+    image_url: Union[Optional[str], UnsetType] = UNSET
+    category_id: Union[int, UnsetType] = UNSET
+    is_available: Union[bool, UnsetType] = UNSET
+    modifiers: Union[dict[str, Any], UnsetType] = UNSET
+
+# Bulk menu import (menu_bulk.py). Products refer to their category by name, so a
+# menu exported from one branch imports into another; a matching `id` updates that product.
+
+class MenuCategoryIn(msgspec.Struct):
+    name: str
+
+class MenuProductIn(msgspec.Struct):
+    name: str
+    price: float
+    category: str
+    id: Optional[int] = None
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+    is_available: bool = True
+    modifiers: dict[str, Any] = {}
+
+class MenuIn(msgspec.Struct):
+    categories: list[MenuCategoryIn] = []
+    products: list[MenuProductIn] = []
+
+# --- ORM -> Struct ---
+
+def order_from_orm(order: models.Order) -> Order:
+    return Order(
+        id=order.id,
+        order_number=order.order_number,
+        status=order.status,
+        total_amount=order.total_amount,
+        payment_status=order.payment_status,
+        payment_method=order.payment_method,
+        items=[
+            OrderItem(
+                id=i.id,
+                product_id=i.product_id,
+                product=ProductRef(id=i.product.id, name=i.product.name, price=i.product.price) if i.product else None,
+                quantity=i.quantity,
+                selected_modifiers=i.selected_modifiers
+            )
+            for i in order.items
+        ],
+        created_at=order.created_at
+    )
+
+def product_from_orm(product: models.Product, category_name: Optional[str]) -> Product:
+    return Product(
+        id=product.id,
+        name=product.name,
+        price=product.price,
+        description=product.description,
+        category_id=product.category_id,
+        category_name=category_name,
+        image_url=product.image_url,
+        is_available=product.is_available,
+        modifiers=product.modifiers
+    )
+
+def category_from_orm(category: models.Category) -> Category:
+    return Category(id=category.id, name=category.name, restaurant_id=category.restaurant_id)
+
+# --- Encoding / decoding ---
+
+_encoder = msgspec.json.Encoder()
+_decoders: dict[type, msgspec.json.Decoder] = {}
+
+def encode(obj) -> bytes:
+    return _encoder.encode(obj)
+
+def decode(data: bytes, type_):
+    """Decodes and validates; numeric strings are accepted for numbers as before"""
+    decoder = _decoders.get(type_)
+    if decoder is None:
+        decoder = _decoders[type_] = msgspec.json.Decoder(type_, strict=False)
+    return decoder.decode(data)
+
+async def decode_body(request: Request, type_):
+    """Raises msgspec.DecodeError (including ValidationError) on a bad body"""
+    return decode(await request.body(), type_)
+
+class StructResponse(Response):
+    """JSON response rendered by msgspec (Structs, lists of Structs or plain data)"""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return encode(content)
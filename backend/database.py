@@ -1,7 +1,15 @@
 import os
-from sqlalchemy import create_engine
+import time
+import asyncio
+import functools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,20 +19,136 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./ordera_v5.db")
 
 # Determine if we are using SQLite or Postgres
 is_sqlite = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+is_sqlite_memory = is_sqlite and (SQLALCHEMY_DATABASE_URL in ("sqlite://", "sqlite:///:memory:"))
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+# Pool settings (size them from the /health/db numbers, not by guessing)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800")) # seconds, -1 disables
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+# PgBouncer in transaction mode: server connections change between transactions,
+# so server-side prepared statements must not be cached on the client connection.
+DB_PGBOUNCER_TRANSACTION_MODE = _env_bool("DB_PGBOUNCER_TRANSACTION_MODE", False)
+
+# Upper bounds (seconds) of the pool checkout wait time histogram
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf"))
+
+class PoolWaitStats:
+    """Cumulative histogram of how long callers waited to check a connection out"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bucket_counts = [0] * len(POOL_WAIT_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.timeouts = 0
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+            for i, upper in enumerate(POOL_WAIT_BUCKETS):
+                if seconds <= upper:
+                    self.bucket_counts[i] += 1
+                    break
+
+    def observe_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "sum_seconds": round(self.total, 6),
+                "max_seconds": round(self.max, 6),
+                "timeouts": self.timeouts,
+                "buckets": {
+                    ("+Inf" if upper == float("inf") else str(upper)): count
+                    for upper, count in zip(POOL_WAIT_BUCKETS, self.bucket_counts)
+                }
+            }
+
+pool_wait_stats = PoolWaitStats()
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records checkout wait time and pool timeouts"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            pool_wait_stats.observe_timeout()
+            raise
+        pool_wait_stats.observe(time.perf_counter() - start)
+        return conn
+
+engine_kwargs = {}
+connect_args = {}
+if is_sqlite_memory:
+    # An in-memory database lives and dies with its connection: every DB worker
+    # thread must share the one connection (the default SingletonThreadPool would
+    # give each thread its own empty database)
+    engine_kwargs["poolclass"] = StaticPool
+else:
+    engine_kwargs.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
 
 if is_sqlite:
     # SQLite-specific config
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-    )
+    connect_args["check_same_thread"] = False
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args, **engine_kwargs)
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers proceed while a DB worker thread writes
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
 else:
     # PostgreSQL config
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    if DB_PGBOUNCER_TRANSACTION_MODE and "+psycopg:" in SQLALCHEMY_DATABASE_URL:
+        # psycopg 3 prepares repeated statements server-side; turn that off.
+        # psycopg2 (the default driver) never uses server-side prepared statements.
+        connect_args["prepare_threshold"] = None
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args, **engine_kwargs)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+def pool_stats() -> dict:
+    """Live connection pool statistics for engine"""
+    pool = engine.pool
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "max_overflow": DB_MAX_OVERFLOW,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "timeout_seconds": DB_POOL_TIMEOUT,
+        })
+    stats["wait"] = pool_wait_stats.snapshot()
+    return stats
+
 # Dependency to get DB session
 from contextlib import contextmanager
 
@@ -42,3 +166,19 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Bounded worker pool for blocking DB work.
+# Handlers are async, but SQLAlchemy sessions are synchronous: every query and commit
+# goes through run_db so a slow round trip only occupies a worker thread, never the event loop.
+# Defaults to one worker per pooled connection so workers don't queue on the pool,
+# and to a single worker for in-memory SQLite, whose one shared connection must not be
+# used by two threads at once.
+DB_WORKERS = 1 if is_sqlite_memory else int(os.getenv("DB_WORKERS", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="ordera-db")
+
+async def run_db(fn, *args, **kwargs):
+    """Runs a blocking DB callable in the DB worker pool and awaits its result"""
+    loop = asyncio.get_running_loop()
+    # Copy the caller's context so per-request state (db_profiler stats) follows the work into the thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(db_executor, functools.partial(context.run, fn, *args, **kwargs))
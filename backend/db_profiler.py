@@ -0,0 +1,136 @@
+"""
+Per-request SQL profiling.
+
+Cursor execute events on database.engine count statements and time them into the
+QueryStats of the current request (a context variable that database.run_db carries
+into the worker thread). At the end of a request, statement shapes repeated at
+least DB_N_PLUS_ONE_THRESHOLD times are logged: that is a lazy load in a loop.
+Statements slower than DB_SLOW_QUERY_MS are logged as they finish.
+"""
+import os
+import re
+import time
+import logging
+import contextvars
+from sqlalchemy import event
+import database
+
+logger = logging.getLogger("ordera.sql")
+
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "250"))
+DB_N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "5"))
+
+class QueryStats:
+    """Statements issued and time spent in the database on behalf of one request"""
+    __slots__ = ("method", "path", "count", "seconds", "statements")
+
+    def __init__(self, method: str = None, path: str = None):
+        self.method = method
+        self.path = path
+        self.count = 0
+        self.seconds = 0.0
+        # raw statement -> executions; normalized only when reporting
+        self.statements: dict[str, int] = {}
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Normalized statement shapes executed at least `threshold` times, most frequent first"""
+        shapes: dict[str, int] = {}
+        for statement, count in self.statements.items():
+            shape = normalize_sql(statement)
+            shapes[shape] = shapes.get(shape, 0) + count
+        return sorted(((s, n) for s, n in shapes.items() if n >= threshold), key=lambda item: -item[1])
+
+_current: contextvars.ContextVar = contextvars.ContextVar("db_query_stats", default=None)
+
+def current_stats():
+    """QueryStats of the request being handled, or None outside a request"""
+    return _current.get()
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+# Expanded IN lists: "IN (?, ?, ?)", "IN (%(id_1_1)s, %(id_1_2)s)", "IN ($1, $2)"
+_IN_LIST = re.compile(r"\bIN\s*\(\s*(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|\$\d+|:\w+))*\s*\)", re.IGNORECASE)
+
+def normalize_sql(statement: str) -> str:
+    """Statement shape: whitespace collapsed, literals and IN list lengths erased"""
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    return _IN_LIST.sub("IN (...)", statement)
+
+@event.listens_for(database.engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(database.engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+        stats.statements[statement] = stats.statements.get(statement, 0) + 1
+    if elapsed * 1000 >= DB_SLOW_QUERY_MS:
+        logger.warning("Slow query", extra={"fields": {
+            "duration_ms": round(elapsed * 1000, 2),
+            "sql": normalize_sql(statement),
+            "method": stats.method if stats else None,
+            "path": stats.path if stats else None,
+        }})
+
+@event.listens_for(database.engine, "handle_error")
+def _query_failed(exception_context):
+    # after_cursor_execute is skipped when a statement fails. Only connection
+    # is part of ExceptionContext everywhere (2.1 has no cursor attribute), and
+    # a handler that raises here would replace the database error.
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+class QueryProfilerMiddleware:
+    """
+    Pure ASGI middleware owning the QueryStats of each HTTP request. Reports N+1
+    shapes when the request ends and, with `headers` on (debug), adds X-DB-Queries
+    and X-DB-Time (milliseconds) to the response.
+    """
+
+    def __init__(self, app, routes=(), headers: bool = False, threshold: int = None):
+        self.app = app
+        self.route_paths = {route.endpoint: route.path for route in routes if hasattr(route, "endpoint")}
+        self.headers = headers
+        self.threshold = DB_N_PLUS_ONE_THRESHOLD if threshold is None else threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(scope["method"], scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and self.headers:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-db-queries", str(stats.count).encode()),
+                    (b"x-db-time", f"{stats.seconds * 1000:.2f}".encode()),
+                ]
+            await send(message)
+
+        token = _current.set(stats)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if self.threshold and stats.count >= self.threshold:
+                self._report(scope, stats)
+
+    def _report(self, scope, stats: QueryStats):
+        route = self.route_paths.get(scope.get("endpoint"), "<unmatched>")
+        for shape, count in stats.repeated(self.threshold):
+            logger.warning("Repeated query (N+1)", extra={"fields": {
+                "method": scope["method"],
+                "route": route,
+                "executions": count,
+                "request_queries": stats.count,
+                "sql": shape,
+            }})
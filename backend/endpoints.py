@@ -1,24 +1,43 @@
 from starlette.requests import Request
-from starlette.responses import JSONResponse
-import database, models, auth, ws_manager
-from sqlalchemy import func
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+import database, models, auth, ws_manager, order_numbers, menu_cache, codec, tenants, uploads, images, metrics, active_orders, rollups, menu_bulk, order_export
+import msgspec
+from sqlalchemy import func, or_, and_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload, joinedload
+from datetime import datetime
+import base64
+import heapq
 import json
+import logging
+
+logger = logging.getLogger("ordera.endpoints")
+
+ORDERS_PAGE_SIZE = 100
+ORDERS_MAX_PAGE_SIZE = 500
+# Everything update_order_status accepts; events, rollups and the active order
+# projection all rely on an order always having one of these
+ORDER_STATUSES = ("pending", "paid", "preparing", "ready", "completed", "cancelled")
 
 # Utility to get current user with context
 def get_current_user_obj(request: Request):
-    token = auth.get_current_user_token(request)
-    if not token:
-        return None
-    # We need to manually verify locally since using same DB session
-    # In endpoints we create new sessions, so we might need to decode token here 
-    # and fetch user in the endpoint's session.
-    # For optimization, we can just decode token and trust the ID/RestaurantID if we put it there.
-    # Let's decode token.
-    try:
-        payload = auth.jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        return payload # Returns dict typically
-    except:
-        return None
+    # Verified once per request by auth.AuthMiddleware (token payload dict or None)
+    return getattr(request.state, "user", None)
+
+def next_event_seq(db, restaurant_id: int) -> int:
+    """
+    Allocates the next realtime event sequence number for a restaurant.
+    Must run inside the transaction that makes the change: the row lock taken by
+    the UPDATE keeps the numbers monotonic across workers.
+    """
+    stmt = update(models.Restaurant).where(models.Restaurant.id == restaurant_id).values(
+        event_seq=func.coalesce(models.Restaurant.event_seq, 0) + 1
+    )
+    if db.get_bind().dialect.update_returning:
+        return db.execute(stmt.returning(models.Restaurant.event_seq)).scalar()
+    db.execute(stmt)
+    return db.query(models.Restaurant.event_seq).filter(models.Restaurant.id == restaurant_id).scalar()
 
 async def signup(request: Request):
     try:
@@ -43,32 +62,46 @@ async def signup(request: Request):
     if " - " not in restaurant_name:
         return JSONResponse({"error": "Restaurant name must be in format: Name - Area"}, status_code=400)
 
-    with database.get_db_context() as db:
-        # Check if Restaurant Name + City exists (Case Insensitive)
-        if db.query(models.Restaurant).filter(
-            func.lower(models.Restaurant.name) == restaurant_name.lower(),
-            func.lower(models.Restaurant.city) == city.lower()
-        ).first():
-             return JSONResponse({"error": "Restaurant Name in this City already taken"}, status_code=400)
-
-        # Create Restaurant
-        restaurant = models.Restaurant(name=restaurant_name, city=city)
-        db.add(restaurant)
-        db.commit()
-        db.refresh(restaurant)
-        
-        # Create Admin User
-        hashed_password = auth.get_password_hash(password)
-        user = models.User(
-            username=username, 
-            hashed_password=hashed_password, 
-            role="admin",
-            restaurant_id=restaurant.id
-        )
-        db.add(user)
-        db.commit()
-        
-        return JSONResponse({"message": "Signup successful", "restaurant_id": restaurant.id})
+    if not password:
+        return JSONResponse({"error": "Missing fields"}, status_code=400)
+
+    # Hashed in the password pool, off the event loop and outside the DB transaction
+    try:
+        hashed_password = await auth.password_hasher.hash(password)
+    except auth.PasswordHashBusy:
+        return JSONResponse({"error": "Server busy, please retry"}, status_code=503)
+
+    def db_work():
+        with database.get_db_context() as db:
+            # Check if Restaurant Name + City exists (Case Insensitive)
+            if tenants.find_restaurant(db, restaurant_name, city):
+                 return JSONResponse({"error": "Restaurant Name in this City already taken"}, status_code=400)
+
+            # Create Restaurant and its Admin User in one transaction
+            restaurant = models.Restaurant(name=restaurant_name, city=city)
+            db.add(restaurant)
+            try:
+                db.flush()
+
+                user = models.User(
+                    username=username, 
+                    hashed_password=hashed_password, 
+                    role="admin",
+                    restaurant_id=restaurant.id
+                )
+                db.add(user)
+                restaurant_id = restaurant.id
+                db.commit()
+            except IntegrityError:
+                # Lost a race with a concurrent signup on the unique (name, city) index
+                db.rollback()
+                return JSONResponse({"error": "Restaurant Name in this City already taken"}, status_code=400)
+        
+            return JSONResponse({"message": "Signup successful", "restaurant_id": restaurant_id})
+
+    response = await database.run_db(db_work)
+    tenants.cache.invalidate(restaurant_name, city)
+    return response
 
 async def login(request: Request):
     try:
@@ -89,51 +122,75 @@ async def login(request: Request):
         restaurant_name = restaurant_name.strip()
         city = city.strip()
         
-        print(f"Login attempt for: {username} at {restaurant_name} ({city})")
-        
-        with database.get_db_context() as db:
-            # 1. Find Restaurant (Case Sensitive Name, Case Insensitive City)
-            restaurant = db.query(models.Restaurant).filter(
-                models.Restaurant.name == restaurant_name,
-                func.lower(models.Restaurant.city) == city.lower()
-            ).first()
+        def find_user():
+            with database.get_db_context() as db:
+                # 1. Find Restaurant (Case Sensitive Name, Case Insensitive City)
+                # Resolved through the tenant cache / unique lower(name, city) index
+                restaurant = tenants.find_restaurant(db, restaurant_name, city)
             
-            if not restaurant:
-                print(f"Restaurant '{restaurant_name}' in '{city}' not found")
-                return JSONResponse({"error": "Restaurant not found"}, status_code=404)
-
-            # 2. Find User in that Restaurant
-            user = db.query(models.User).filter(
-                models.User.username == username, 
-                models.User.restaurant_id == restaurant.id
-            ).first()
+                if not restaurant or restaurant["name"] != restaurant_name:
+                    logger.info("Login failed", extra={"fields": {"reason": "restaurant_not_found", "city": city}})
+                    return JSONResponse({"error": "Restaurant not found"}, status_code=404)
 
-            if not user:
-                print("User not found in this restaurant")
-                return JSONResponse({"error": "Invalid credentials"}, status_code=401)
-            
-            print(f"User found: {user.username}, verifying password...")
-            if not auth.verify_password(password, user.hashed_password):
-                print("Password verification failed")
+                # 2. Find User in that Restaurant
+                user = db.query(models.User).filter(
+                    models.User.username == username, 
+                    models.User.restaurant_id == restaurant["id"]
+                ).first()
+
+                if not user:
+                    logger.info("Login failed", extra={"fields": {"reason": "unknown_user", "restaurant_id": restaurant["id"]}})
+                    return JSONResponse({"error": "Invalid credentials"}, status_code=401)
+
+                return {
+                    "user_id": user.id,
+                    "username": user.username,
+                    "role": user.role,
+                    "hashed_password": user.hashed_password,
+                    "restaurant_id": restaurant["id"],
+                    "restaurant_name": restaurant["name"],
+                    "restaurant_city": restaurant["city"]
+                }
+
+        def store_rehash(user_id, old_hash, new_hash):
+            with database.get_db_context() as db:
+                # Only replace the hash we verified against, in case it changed meanwhile
+                db.query(models.User).filter(
+                    models.User.id == user_id,
+                    models.User.hashed_password == old_hash
+                ).update({models.User.hashed_password: new_hash}, synchronize_session=False)
+                db.commit()
+
+        found = await database.run_db(find_user)
+        if isinstance(found, JSONResponse):
+            return found
+
+        try:
+            # Verified (and upgraded if needed) in the password pool, off the event loop
+            if not await auth.password_hasher.verify(password, found["hashed_password"]):
+                logger.info("Login failed", extra={"fields": {"reason": "bad_password", "restaurant_id": found["restaurant_id"]}})
                 return JSONResponse({"error": "Invalid credentials"}, status_code=401)
-            
-            print("Password verified, creating token...")
-            # Include restaurant_id in token for easy filtering
-            access_token = auth.create_access_token(data={
-                "sub": user.username, 
-                "role": user.role,
-                "restaurant_id": user.restaurant_id
-            })
-            return JSONResponse({
-                "access_token": access_token, 
-                "token_type": "bearer",
-                "restaurant_id": user.restaurant_id,
-                "restaurant_name": user.restaurant.name,
-                "restaurant_city": user.restaurant.city
-            })
+            if auth.needs_rehash(found["hashed_password"]):
+                new_hash = await auth.password_hasher.hash(password)
+                await database.run_db(store_rehash, found["user_id"], found["hashed_password"], new_hash)
+        except auth.PasswordHashBusy:
+            return JSONResponse({"error": "Server busy, please retry"}, status_code=503)
+        
+        # Include restaurant_id in token for easy filtering
+        access_token = auth.create_access_token(data={
+            "sub": found["username"], 
+            "role": found["role"],
+            "restaurant_id": found["restaurant_id"]
+        })
+        return JSONResponse({
+            "access_token": access_token, 
+            "token_type": "bearer",
+            "restaurant_id": found["restaurant_id"],
+            "restaurant_name": found["restaurant_name"],
+            "restaurant_city": found["restaurant_city"]
+        })
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Login error")
         return JSONResponse({"error": f"Internal Login Error: {str(e)}"}, status_code=500)
 
 async def verify_password(request: Request):
@@ -150,17 +207,21 @@ async def verify_password(request: Request):
         username = user_payload.get("sub")
         restaurant_id = user_payload.get("restaurant_id")
         
-        with database.get_db_context() as db:
-            user = db.query(models.User).filter(
-                models.User.username == username,
-                models.User.restaurant_id == restaurant_id
-            ).first()
-            
-            if not user:
-                return JSONResponse({"authenticated": False, "error": "User not found"}, status_code=404)
-            
-            is_valid = auth.verify_password(password, user.hashed_password)
-            return JSONResponse({"authenticated": is_valid})
+        def db_work():
+            with database.get_db_context() as db:
+                return db.query(models.User.hashed_password).filter(
+                    models.User.username == username,
+                    models.User.restaurant_id == restaurant_id
+                ).scalar()
+
+        hashed_password = await database.run_db(db_work)
+        if not hashed_password:
+            return JSONResponse({"authenticated": False, "error": "User not found"}, status_code=404)
+        
+        is_valid = await auth.password_hasher.verify(password, hashed_password)
+        return JSONResponse({"authenticated": is_valid})
+    except auth.PasswordHashBusy:
+        return JSONResponse({"authenticated": False, "error": "Server busy, please retry"}, status_code=503)
     except Exception as e:
         return JSONResponse({"authenticated": False, "error": str(e)}, status_code=500)
 
@@ -172,34 +233,36 @@ async def create_category(request: Request):
     restaurant_id = user_payload.get("restaurant_id")
     
     try:
-        body = await request.json()
-    except:
+        body = await codec.decode_body(request, codec.CategoryIn)
+    except msgspec.ValidationError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except msgspec.DecodeError:
         return JSONResponse({"error": "Invalid JSON"}, status_code=400)
     
-    name = body.get("name")
+    name = body.name
     if not name:
         return JSONResponse({"error": "Category name required"}, status_code=400)
     
-    with database.get_db_context() as db:
-        # Check if category with same name exists in this restaurant
-        existing = db.query(models.Category).filter(
-            models.Category.restaurant_id == restaurant_id,
-            func.lower(models.Category.name) == name.lower()
-        ).first()
+    def db_work():
+        with database.get_db_context() as db:
+            # Check if category with same name exists in this restaurant
+            existing = db.query(models.Category).filter(
+                models.Category.restaurant_id == restaurant_id,
+                func.lower(models.Category.name) == name.lower()
+            ).first()
         
-        if existing:
-            return JSONResponse({"error": "Category already exists"}, status_code=400)
+            if existing:
+                return JSONResponse({"error": "Category already exists"}, status_code=400)
         
-        category = models.Category(name=name.strip(), restaurant_id=restaurant_id)
-        db.add(category)
-        db.commit()
-        db.refresh(category)
+            category = models.Category(name=name.strip(), restaurant_id=restaurant_id)
+            db.add(category)
+            menu_cache.bump_version(db, restaurant_id)
+            db.commit()
+            db.refresh(category)
         
-        return JSONResponse({
-            "id": category.id,
-            "name": category.name,
-            "restaurant_id": category.restaurant_id
-        })
+            return codec.StructResponse(codec.category_from_orm(category))
+
+    return await database.run_db(db_work)
 
 async def update_category(request: Request):
     user_payload = get_current_user_obj(request)
@@ -210,32 +273,34 @@ async def update_category(request: Request):
     category_id = request.path_params['category_id']
     
     try:
-        body = await request.json()
-    except:
+        body = await codec.decode_body(request, codec.CategoryIn)
+    except msgspec.ValidationError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except msgspec.DecodeError:
         return JSONResponse({"error": "Invalid JSON"}, status_code=400)
     
-    name = body.get("name")
+    name = body.name
     if not name:
         return JSONResponse({"error": "Category name required"}, status_code=400)
     
-    with database.get_db_context() as db:
-        category = db.query(models.Category).filter(
-            models.Category.id == category_id,
-            models.Category.restaurant_id == restaurant_id
-        ).first()
+    def db_work():
+        with database.get_db_context() as db:
+            category = db.query(models.Category).filter(
+                models.Category.id == category_id,
+                models.Category.restaurant_id == restaurant_id
+            ).first()
         
-        if not category:
-            return JSONResponse({"error": "Category not found"}, status_code=404)
+            if not category:
+                return JSONResponse({"error": "Category not found"}, status_code=404)
         
-        category.name = name.strip()
-        db.commit()
-        db.refresh(category)
+            category.name = name.strip()
+            menu_cache.bump_version(db, restaurant_id)
+            db.commit()
+            db.refresh(category)
         
-        return JSONResponse({
-            "id": category.id,
-            "name": category.name,
-            "restaurant_id": category.restaurant_id
-        })
+            return codec.StructResponse(codec.category_from_orm(category))
+
+    return await database.run_db(db_work)
 
 async def list_categories(request: Request):
     user_payload = get_current_user_obj(request)
@@ -244,16 +309,8 @@ async def list_categories(request: Request):
     
     restaurant_id = user_payload.get("restaurant_id")
     
-    with database.get_db_context() as db:
-        categories = db.query(models.Category).filter(models.Category.restaurant_id == restaurant_id).all()
-        data = []
-        for c in categories:
-            data.append({
-                "id": c.id,
-                "name": c.name,
-                "restaurant_id": c.restaurant_id
-            })
-        return JSONResponse(data)
+    # Served from the versioned menu snapshot, with ETag / If-None-Match support
+    return await menu_cache.menu_response(request, restaurant_id, "categories")
 
 async def delete_category(request: Request):
     user_payload = get_current_user_obj(request)
@@ -263,47 +320,37 @@ async def delete_category(request: Request):
     restaurant_id = user_payload.get("restaurant_id")
     category_id = request.path_params['category_id']
     
-    with database.get_db_context() as db:
-        category = db.query(models.Category).filter(
-            models.Category.id == category_id,
-            models.Category.restaurant_id == restaurant_id
-        ).first()
+    def db_work():
+        with database.get_db_context() as db:
+            category = db.query(models.Category).filter(
+                models.Category.id == category_id,
+                models.Category.restaurant_id == restaurant_id
+            ).first()
         
-        if not category:
-            return JSONResponse({"error": "Category not found"}, status_code=404)
+            if not category:
+                return JSONResponse({"error": "Category not found"}, status_code=404)
         
-        # Check if there are products in this category
-        products_count = db.query(models.Product).filter(models.Product.category_id == category_id).count()
-        if products_count > 0:
-            return JSONResponse({"error": f"Cannot delete category with {products_count} products"}, status_code=400)
+            # Check if there are products in this category
+            products_count = db.query(models.Product).filter(models.Product.category_id == category_id).count()
+            if products_count > 0:
+                return JSONResponse({"error": f"Cannot delete category with {products_count} products"}, status_code=400)
         
-        db.delete(category)
-        db.commit()
-        return JSONResponse({"status": "success"})
+            db.delete(category)
+            menu_cache.bump_version(db, restaurant_id)
+            db.commit()
+            return JSONResponse({"status": "success"})
+
+    return await database.run_db(db_work)
 
 async def list_products(request: Request):
     user_payload = get_current_user_obj(request)
     if not user_payload:
         return JSONResponse({"error": "Unauthorized"}, status_code=401)
-        
+    
     restaurant_id = user_payload.get("restaurant_id")
     
-    with database.get_db_context() as db:
-        products = db.query(models.Product).filter(models.Product.restaurant_id == restaurant_id).all()
-        data = []
-        for p in products:
-            data.append({
-                "id": p.id,
-                "name": p.name,
-                "price": p.price,
-                "description": p.description,
-                "category_id": p.category_id,
-                "category_name": p.category.name if p.category else None,
-                "image_url": p.image_url,
-                "is_available": p.is_available,
-                "modifiers": p.modifiers
-            })
-        return JSONResponse(data)
+    # Served from the versioned menu snapshot, with ETag / If-None-Match support
+    return await menu_cache.menu_response(request, restaurant_id, "products")
 
 async def create_product(request: Request):
     user_payload = get_current_user_obj(request)
@@ -313,52 +360,48 @@ async def create_product(request: Request):
     restaurant_id = user_payload.get("restaurant_id")
     
     try:
-        body = await request.json()
-    except:
+        body = await codec.decode_body(request, codec.ProductIn)
+    except msgspec.ValidationError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except msgspec.DecodeError:
         return JSONResponse({"error": "Invalid JSON"}, status_code=400)
     
-    name = body.get("name")
-    price = body.get("price")
-    category_id = body.get("category_id")
+    name = body.name
+    price = body.price
+    category_id = body.category_id
     
     if not name or price is None or not category_id:
         return JSONResponse({"error": "Name, price, and category_id required"}, status_code=400)
     
-    with database.get_db_context() as db:
-        # Verify category belongs to this restaurant
-        category = db.query(models.Category).filter(
-            models.Category.id == category_id,
-            models.Category.restaurant_id == restaurant_id
-        ).first()
-        
-        if not category:
-            return JSONResponse({"error": "Category not found"}, status_code=404)
+    def db_work():
+        with database.get_db_context() as db:
+            # Verify category belongs to this restaurant
+            category = db.query(models.Category).filter(
+                models.Category.id == category_id,
+                models.Category.restaurant_id == restaurant_id
+            ).first()
         
-        product = models.Product(
-            name=name.strip(),
-            price=float(price),
-            description=body.get("description", ""),
-            image_url=body.get("image_url", ""),
-            category_id=category_id,
-            is_available=body.get("is_available", True),
-            modifiers=body.get("modifiers", {}),
-            restaurant_id=restaurant_id
-        )
-        db.add(product)
-        db.commit()
-        db.refresh(product)
+            if not category:
+                return JSONResponse({"error": "Category not found"}, status_code=404)
+        
+            product = models.Product(
+                name=name.strip(),
+                price=price,
+                description=body.description,
+                image_url=body.image_url,
+                category_id=category_id,
+                is_available=body.is_available,
+                modifiers=body.modifiers,
+                restaurant_id=restaurant_id
+            )
+            db.add(product)
+            menu_cache.bump_version(db, restaurant_id)
+            db.commit()
+            db.refresh(product)
         
-        return JSONResponse({
-            "id": product.id,
-            "name": product.name,
-            "price": product.price,
-            "description": product.description,
-            "category_id": product.category_id,
-            "category_name": category.name,
-            "image_url": product.image_url,
-            "is_available": product.is_available,
-            "modifiers": product.modifiers
-        })
+            return codec.StructResponse(codec.product_from_orm(product, category.name))
+
+    return await database.run_db(db_work)
 
 async def update_product(request: Request):
     user_payload = get_current_user_obj(request)
@@ -369,40 +412,38 @@ async def update_product(request: Request):
     product_id = request.path_params['product_id']
     
     try:
-        body = await request.json()
-    except:
+        body = await codec.decode_body(request, codec.ProductUpdate)
+    except msgspec.ValidationError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except msgspec.DecodeError:
         return JSONResponse({"error": "Invalid JSON"}, status_code=400)
     
-    with database.get_db_context() as db:
-        product = db.query(models.Product).filter(
-            models.Product.id == product_id,
-            models.Product.restaurant_id == restaurant_id
-        ).first()
+    def db_work():
+        with database.get_db_context() as db:
+            product = db.query(models.Product).filter(
+                models.Product.id == product_id,
+                models.Product.restaurant_id == restaurant_id
+            ).first()
         
-        if not product:
-            return JSONResponse({"error": "Product not found"}, status_code=404)
+            if not product:
+                return JSONResponse({"error": "Product not found"}, status_code=404)
         
-        if "name" in body: product.name = body["name"].strip()
-        if "price" in body: product.price = float(body["price"])
-        if "description" in body: product.description = body["description"]
-        if "image_url" in body: product.image_url = body["image_url"]
-        if "category_id" in body: product.category_id = body["category_id"]
-        if "is_available" in body: product.is_available = body["is_available"]
-        if "modifiers" in body: product.modifiers = body["modifiers"]
+            if body.name is not msgspec.UNSET: product.name = body.name.strip()
+            if body.price is not msgspec.UNSET: product.price = body.price
+            if body.description is not msgspec.UNSET: product.description = body.description
+            if body.image_url is not msgspec.UNSET: product.image_url = body.image_url
+            if body.category_id is not msgspec.UNSET: product.category_id = body.category_id
+            if body.is_available is not msgspec.UNSET: product.is_available = body.is_available
+            if body.modifiers is not msgspec.UNSET: product.modifiers = body.modifiers
         
-        db.commit()
-        db.refresh(product)
+            menu_cache.bump_version(db, restaurant_id)
+            db.commit()
+            db.refresh(product)
         
-        return JSONResponse({
-            "id": product.id,
-            "name": product.name,
-            "price": product.price,
-            "description": product.description,
-            "category_id": product.category_id,
-            "image_url": product.image_url,
-            "is_available": product.is_available,
-            "modifiers": product.modifiers
-        })
+            category_name = product.category.name if product.category else None
+            return codec.StructResponse(codec.product_from_orm(product, category_name))
+
+    return await database.run_db(db_work)
 
 async def delete_product(request: Request):
     user_payload = get_current_user_obj(request)
@@ -412,52 +453,100 @@ async def delete_product(request: Request):
     restaurant_id = user_payload.get("restaurant_id")
     product_id = request.path_params['product_id']
     
-    with database.get_db_context() as db:
-        product = db.query(models.Product).filter(
-            models.Product.id == product_id,
-            models.Product.restaurant_id == restaurant_id
-        ).first()
+    def db_work():
+        with database.get_db_context() as db:
+            product = db.query(models.Product).filter(
+                models.Product.id == product_id,
+                models.Product.restaurant_id == restaurant_id
+            ).first()
         
-        if not product:
-            return JSONResponse({"error": "Product not found"}, status_code=404)
+            if not product:
+                return JSONResponse({"error": "Product not found"}, status_code=404)
         
-        db.delete(product)
-        db.commit()
-        return JSONResponse({"status": "success"})
+            db.delete(product)
+            menu_cache.bump_version(db, restaurant_id)
+            db.commit()
+            return JSONResponse({"status": "success"})
+
+    return await database.run_db(db_work)
+
+def menu_format(request: Request) -> str:
+    """`?format=csv|json`, else CSV when the body is sent as text/csv"""
+    requested = request.query_params.get("format")
+    if requested:
+        return requested.lower()
+    return "csv" if request.headers.get("content-type", "").startswith("text/csv") else "json"
+
+async def read_body(request: Request, max_bytes: int):
+    """
+    The request body, or None once it is known to be over max_bytes: from
+    Content-Length up front, else while it arrives, without buffering the rest
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        return None
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            return None
+        chunks.append(chunk)
+    return b"".join(chunks)
 
-import os
-import uuid
+async def import_menu(request: Request):
+    """Creates or updates many categories and products at once; see menu_bulk.py"""
+    user_payload = get_current_user_obj(request)
+    if not user_payload:
+        return JSONResponse({"error": "Unauthorized"}, status_code=401)
+
+    restaurant_id = user_payload.get("restaurant_id")
+    fmt = menu_format(request)
+    if fmt not in ("csv", "json"):
+        return JSONResponse({"error": "format must be csv or json"}, status_code=400)
+
+    body = await read_body(request, menu_bulk.MENU_IMPORT_MAX_BYTES)
+    if body is None:
+        return JSONResponse({"error": f"Menu file too large (max {menu_bulk.MENU_IMPORT_MAX_BYTES} bytes)"}, status_code=413)
+
+    try:
+        menu = menu_bulk.parse_csv(body) if fmt == "csv" else menu_bulk.parse_json(body)
+        result = await database.run_db(menu_bulk.import_menu, restaurant_id, menu)
+    except menu_bulk.MenuImportError as e:
+        return JSONResponse({"error": "Menu import failed, nothing was changed", "errors": e.errors}, status_code=400)
+    return JSONResponse(result)
+
+async def export_menu(request: Request):
+    """The whole menu in the import format (?format=json|csv), sent in chunks as it is encoded"""
+    user_payload = get_current_user_obj(request)
+    if not user_payload:
+        return JSONResponse({"error": "Unauthorized"}, status_code=401)
+
+    fmt = request.query_params.get("format", "json").lower()
+    if fmt not in ("csv", "json"):
+        return JSONResponse({"error": "format must be csv or json"}, status_code=400)
+
+    categories, products = await database.run_db(menu_bulk.load_menu, user_payload.get("restaurant_id"))
+    if fmt == "csv":
+        body, media_type = menu_bulk.export_csv(categories, products), "text/csv; charset=utf-8"
+    else:
+        body, media_type = menu_bulk.export_json(categories, products), "application/json"
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="menu.{fmt}"',
+        "Cache-Control": "no-cache",
+    })
 
 async def upload_image(request: Request):
     user_payload = get_current_user_obj(request)
     if not user_payload:
         return JSONResponse({"error": "Unauthorized"}, status_code=401)
     
-    # Get the uploads directory
-    uploads_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads")
-    os.makedirs(uploads_dir, exist_ok=True)
-    
     try:
-        form = await request.form()
-        file = form.get("file")
-        
-        if not file:
-            return JSONResponse({"error": "No file provided"}, status_code=400)
-        
-        # Generate unique filename
-        ext = os.path.splitext(file.filename)[1] if file.filename else ".jpg"
-        filename = f"{uuid.uuid4().hex}{ext}"
-        filepath = os.path.join(uploads_dir, filename)
-        
-        # Save file
-        contents = await file.read()
-        with open(filepath, "wb") as f:
-            f.write(contents)
-        
-        # Return the URL path
-        image_url = f"/uploads/{filename}"
-        return JSONResponse({"image_url": image_url})
-        
+        # Streamed to disk in chunks and stored under its SHA-256, so re-uploads are free
+        filename = await uploads.save_upload(request)
+        images.renderer.schedule_all(filename)
+        return JSONResponse({"image_url": f"/uploads/{filename}"})
+    except uploads.UploadError as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status_code)
     except Exception as e:
         return JSONResponse({"error": f"Upload failed: {str(e)}"}, status_code=500)
 
@@ -469,124 +558,224 @@ async def create_order(request: Request):
     restaurant_id = user_payload.get("restaurant_id")
 
     try:
-        body = await request.json()
-    except:
-         return JSONResponse({"error": "Invalid JSON"}, status_code=400)
+        body = await codec.decode_body(request, codec.OrderIn)
+    except msgspec.ValidationError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except msgspec.DecodeError:
+        return JSONResponse({"error": "Invalid JSON"}, status_code=400)
     
-    total_amount = body.get("total_amount")
-    items_data = body.get("items", [])
+    total_amount = body.total_amount
+    items_data = body.items
+    
+    if total_amount is None or not items_data:
+        return JSONResponse({"error": "Order total and items are required"}, status_code=400)
+    product_ids = {item.product_id for item in items_data}
     
     try:
-        with database.get_db_context() as db:
-            if total_amount is None or not items_data:
-                return JSONResponse({"error": "Order total and items are required"}, status_code=400)
-
-            # Calculate next order number for this restaurant
-            last_order = db.query(models.Order).filter(models.Order.restaurant_id == restaurant_id).order_by(models.Order.id.desc()).first()
-            next_order_number = (last_order.order_number + 1) if last_order and last_order.order_number else 1
-
-            db_order = models.Order(
-                order_number=next_order_number,
-                total_amount=float(total_amount),
-                payment_status=body.get("payment_status", "unpaid"),
-                payment_method=body.get("payment_method", "cash"),
-                status="pending",
-                restaurant_id=restaurant_id
-            )
-            db.add(db_order)
-            db.commit()
-            db.refresh(db_order)
-            
-            for item in items_data:
-                p_id = item.get("product_id")
-                # Basic validation that product exists
-                prod_check = db.query(models.Product).filter(models.Product.id == p_id).first()
-                if not prod_check:
-                    return JSONResponse({"error": f"Product with ID {p_id} does not exist"}, status_code=400)
-
-                db_item = models.OrderItem(
-                    order_id=db_order.id,
-                    product_id=p_id,
-                    quantity=item.get("quantity", 1),
-                    selected_modifiers=item.get("selected_modifiers", {})
+        def db_work():
+            # One transaction: validate, number, insert order + items, bump event seq, commit
+            with database.get_db_context() as db:
+                # Validate every product in one IN query, scoped to this restaurant
+                products = db.query(models.Product).filter(
+                    models.Product.restaurant_id == restaurant_id,
+                    models.Product.id.in_(product_ids)
+                ).all()
+                product_map = {p.id: p for p in products}
+                missing = sorted(product_ids - product_map.keys())
+                if missing:
+                    return JSONResponse({"error": f"Product with ID {missing[0]} does not exist"}, status_code=400)
+
+                # Next order number for this restaurant, allocated atomically
+                next_order_number = order_numbers.allocator.allocate(db, restaurant_id)
+
+                db_order = models.Order(
+                    order_number=next_order_number,
+                    total_amount=total_amount,
+                    payment_status=body.payment_status,
+                    payment_method=body.payment_method,
+                    status="pending",
+                    restaurant_id=restaurant_id
                 )
-                db.add(db_item)
-            db.commit()
-            
-            # Prepare Response with full details
-            enriched_items = []
-            db.refresh(db_order) # Reload relationships
-            for item in db_order.items:
-                enriched_items.append({
-                    "id": item.id,
-                    "product_id": item.product_id,
-                    "product": {
-                        "id": item.product.id,
-                        "name": item.product.name,
-                        "price": item.product.price
-                    } if item.product else None,
-                    "quantity": item.quantity,
-                    "selected_modifiers": item.selected_modifiers
-                })
-
-            response_data = {
-                "id": db_order.id,
-                "order_number": db_order.order_number,
-                "status": db_order.status,
-                "total_amount": db_order.total_amount,
-                "payment_status": db_order.payment_status,
-                "payment_method": db_order.payment_method,
-                "items": enriched_items,
-                "created_at": db_order.created_at.isoformat() if db_order.created_at else None
-            }
+                # Items attached through the relationship with their already loaded product,
+                # so the flush batches their INSERTs and serializing needs no lazy loads
+                db_order.items = [
+                    models.OrderItem(
+                        product=product_map[item.product_id],
+                        quantity=item.quantity,
+                        selected_modifiers=item.selected_modifiers
+                    )
+                    for item in items_data
+                ]
+                db.add(db_order)
+                db.flush()
+
+                seq = next_event_seq(db, restaurant_id)
+                rollups.record_order(db, restaurant_id, db_order)
+                # Serialize before commit expires the loaded state
+                order = codec.order_from_orm(db_order)
+                db.commit()
+                return order, seq
+
+        result = await database.run_db(db_work)
+        if isinstance(result, JSONResponse):
+            return result
+        order, seq = result
+        metrics.orders_created.inc()
+        # Read-your-writes for this worker's projection; other workers get the broadcast
+        active_orders.store.apply(restaurant_id, seq, order)
             
-        # Broadcast to ONLY this restaurant's room
-        await ws_manager.manager.broadcast_to_restaurant(json.dumps({"event": "new_order", "order_id": response_data["id"]}), restaurant_id)
+        # Broadcast to ONLY this restaurant's room, with the full order so clients can apply it locally
+        event = codec.OrderEvent(event="new_order", seq=seq, order_id=order.id, order=order)
+        await ws_manager.manager.broadcast_to_restaurant(codec.encode(event).decode(), restaurant_id)
         
-        return JSONResponse(response_data)
+        return codec.StructResponse(order)
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Order placement failed", extra={"fields": {"restaurant_id": restaurant_id}})
         return JSONResponse({"error": f"Order placement failed: {str(e)}"}, status_code=500)
 
+def encode_order_cursor(order: models.Order) -> str:
+    raw = json.dumps([order.created_at.isoformat(), order.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_order_cursor(cursor: str):
+    """Returns (created_at, id) of the last order of the previous page"""
+    padding = "=" * (-len(cursor) % 4)
+    created_at, order_id = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    return datetime.fromisoformat(created_at), int(order_id)
+
+def order_filters_from_query(params, model=models.Order) -> list:
+    """
+    Translates the order list query parameters into SQL criteria on `model`
+    (models.Order or models.ArchivedOrder).
+    `status` accepts a comma separated list (e.g. pending,preparing,ready),
+    `from`/`to` bound created_at as ISO datetimes (inclusive/exclusive).
+    Raises ValueError on malformed values.
+    """
+    criteria = []
+    status = params.get("status")
+    if status:
+        statuses = [s.strip() for s in status.split(",") if s.strip()]
+        criteria.append(model.status.in_(statuses))
+    payment_status = params.get("payment_status")
+    if payment_status:
+        criteria.append(model.payment_status == payment_status)
+    created_from = params.get("from")
+    if created_from:
+        criteria.append(model.created_at >= datetime.fromisoformat(created_from))
+    created_to = params.get("to")
+    if created_to:
+        criteria.append(model.created_at < datetime.fromisoformat(created_to))
+    return criteria
+
+def query_order_page(db, model, item_model, restaurant_id: int, criteria: list, after, limit: int) -> list:
+    """Up to `limit` orders of one table, newest first, after the keyset position `after`"""
+    query = db.query(model).filter(model.restaurant_id == restaurant_id, *criteria)
+    if after:
+        after_created_at, after_id = after
+        query = query.filter(or_(
+            model.created_at < after_created_at,
+            and_(model.created_at == after_created_at, model.id < after_id)
+        ))
+    # Items and their products come in one extra batched query instead of N + N*M lazy loads
+    return query.options(
+        selectinload(model.items).joinedload(item_model.product)
+    ).order_by(
+        model.created_at.desc(), model.id.desc()
+    ).limit(limit).all()
+
 async def list_orders(request: Request):
+    """
+    Newest first, keyset paginated on (created_at, id).
+    The cursor for the next page is returned in the X-Next-Cursor header and
+    passed back as ?cursor=; the body stays a plain list of orders.
+    Archived orders (see archive.py) are included only with ?history=true.
+    """
     user_payload = get_current_user_obj(request)
     if not user_payload:
         return JSONResponse({"error": "Unauthorized"}, status_code=401)
     
     restaurant_id = user_payload.get("restaurant_id")
+    history = request.query_params.get("history", "").lower() in ("1", "true", "yes")
 
-    with database.get_db_context() as db:
-        orders = db.query(models.Order).filter(models.Order.restaurant_id == restaurant_id).all()
-        if not orders:
-            return JSONResponse([])
-            
-        data = []
-        for o in orders:
-            items = []
-            for i in o.items:
-                items.append({
-                    "id": i.id,
-                    "product_id": i.product_id,
-                    "product": {
-                        "id": i.product.id,
-                        "name": i.product.name,
-                        "price": i.product.price
-                    } if i.product else None,
-                    "quantity": i.quantity,
-                    "selected_modifiers": i.selected_modifiers
-                })
-            data.append({
-                "id": o.id,
-                "order_number": o.order_number,
-                "status": o.status,
-                "total_amount": o.total_amount,
-                "payment_status": o.payment_status,
-                "payment_method": o.payment_method,
-                "created_at": o.created_at.isoformat() if o.created_at else None,
-                "items": items
-            })
-        return JSONResponse(data)
+    try:
+        criteria = order_filters_from_query(request.query_params)
+        archive_criteria = order_filters_from_query(request.query_params, models.ArchivedOrder) if history else None
+        limit = int(request.query_params.get("limit", ORDERS_PAGE_SIZE))
+        cursor = request.query_params.get("cursor")
+        after = decode_order_cursor(cursor) if cursor else None
+    except (ValueError, TypeError):
+        return JSONResponse({"error": "Invalid query parameters"}, status_code=400)
+    limit = max(1, min(limit, ORDERS_MAX_PAGE_SIZE))
+
+    def db_work():
+        with database.get_db_context() as db:
+            orders = query_order_page(db, models.Order, models.OrderItem, restaurant_id, criteria, after, limit + 1)
+            if history:
+                archived = query_order_page(
+                    db, models.ArchivedOrder, models.ArchivedOrderItem, restaurant_id, archive_criteria, after, limit + 1
+                )
+                # Both pages are newest first; ids are shared, so (created_at, id) stays a total order
+                orders = list(heapq.merge(orders, archived, key=lambda o: (o.created_at, o.id), reverse=True))[:limit + 1]
+
+            headers = {}
+            if len(orders) > limit:
+                orders = orders[:limit]
+                headers["X-Next-Cursor"] = encode_order_cursor(orders[-1])
+
+            return codec.StructResponse([codec.order_from_orm(o) for o in orders], headers=headers)
+
+    return await database.run_db(db_work)
+
+async def export_orders(request: Request):
+    """
+    Full order history, archive included, oldest first, streamed for accounting:
+    ?format=ndjson (one order per line) or csv (one row per item), filtered by
+    from/to (and status/payment_status) like list_orders.
+    Gzipped on the fly when the client accepts it.
+    """
+    user_payload = get_current_user_obj(request)
+    if not user_payload:
+        return JSONResponse({"error": "Unauthorized"}, status_code=401)
+
+    fmt = request.query_params.get("format", "ndjson").lower()
+    if fmt not in order_export.FORMATS:
+        return JSONResponse({"error": "format must be ndjson or csv"}, status_code=400)
+    try:
+        hot_criteria = order_filters_from_query(request.query_params)
+        archive_criteria = order_filters_from_query(request.query_params, models.ArchivedOrder)
+    except (ValueError, TypeError):
+        return JSONResponse({"error": "Invalid query parameters"}, status_code=400)
+
+    export = order_export.OrderExport(user_payload.get("restaurant_id"), fmt, hot_criteria, archive_criteria)
+    gzip = "gzip" in request.headers.get("accept-encoding", "").lower()
+    headers = {
+        "Content-Disposition": f'attachment; filename="orders.{fmt}"',
+        "Cache-Control": "no-store",
+        "Vary": "Accept-Encoding",
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    # The background task also covers a body that was never iterated, or abandoned at a yield
+    return StreamingResponse(
+        order_export.stream(export, gzip), media_type=order_export.FORMATS[fmt], headers=headers,
+        background=BackgroundTask(export.close_soon)
+    )
+
+async def list_active_orders(request: Request):
+    """
+    Every order not yet completed or cancelled, newest first, for kitchen displays.
+    Served from the in-memory projection in active_orders, without a DB query.
+    """
+    user_payload = get_current_user_obj(request)
+    if not user_payload:
+        return JSONResponse({"error": "Unauthorized"}, status_code=401)
+
+    projection = await active_orders.store.get(user_payload.get("restaurant_id"))
+    etag = projection.etag()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if menu_cache.etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(projection.body(), media_type="application/json", headers=headers)
 
 async def update_order_status(request: Request):
     user_payload = get_current_user_obj(request)
@@ -596,14 +785,62 @@ async def update_order_status(request: Request):
     restaurant_id = user_payload.get("restaurant_id")
     order_id = request.path_params['order_id']
     status = request.query_params.get("status_update")
+    if status not in ORDER_STATUSES:
+        return JSONResponse({"error": f"status_update must be one of {', '.join(ORDER_STATUSES)}"}, status_code=400)
     
-    with database.get_db_context() as db:
-        db_order = db.query(models.Order).filter(models.Order.id == order_id, models.Order.restaurant_id == restaurant_id).first()
-        if not db_order:
-            return JSONResponse({"error": "Order not found"}, status_code=404)
-        
-        db_order.status = status
-        db.commit()
-        
-    await ws_manager.manager.broadcast_to_restaurant(json.dumps({"event": "order_update", "order_id": order_id, "status": status}), restaurant_id)
+    def db_work():
+        with database.get_db_context() as db:
+            db_order = db.query(models.Order).options(
+                selectinload(models.Order.items).joinedload(models.OrderItem.product)
+            ).filter(models.Order.id == order_id, models.Order.restaurant_id == restaurant_id).first()
+            if not db_order:
+                return JSONResponse({"error": "Order not found"}, status_code=404)
+            
+            previous_status = db_order.status
+            db_order.status = status
+            seq = next_event_seq(db, restaurant_id)
+            rollups.record_status_change(db, restaurant_id, db_order, previous_status)
+            order = codec.order_from_orm(db_order)
+            db.commit()
+            return order, seq
+
+    result = await database.run_db(db_work)
+    if isinstance(result, JSONResponse):
+        return result
+    order, seq = result
+    active_orders.store.apply(restaurant_id, seq, order)
+        
+    event = codec.OrderEvent(event="order_update", seq=seq, order_id=order_id, status=status, order=order)
+    await ws_manager.manager.broadcast_to_restaurant(codec.encode(event).decode(), restaurant_id)
     return JSONResponse({"status": "success"})
+
+async def get_stats(request: Request):
+    """
+    Sales totals and series from the rollups: ?period=day (hourly, today), week or
+    month (daily). Days start at midnight ?utc_offset minutes east of UTC (default 0).
+    """
+    user_payload = get_current_user_obj(request)
+    if not user_payload:
+        return JSONResponse({"error": "Unauthorized"}, status_code=401)
+
+    period = request.query_params.get("period", "day")
+    if period not in rollups.PERIODS:
+        return JSONResponse({"error": f"period must be one of {', '.join(rollups.PERIODS)}"}, status_code=400)
+
+    try:
+        utc_offset = int(request.query_params.get("utc_offset", "0"))
+    except ValueError:
+        utc_offset = None
+    if utc_offset is None or abs(utc_offset) > rollups.MAX_UTC_OFFSET_MINUTES:
+        return JSONResponse({"error": "utc_offset must be whole minutes east of UTC, at most 14 hours"}, status_code=400)
+
+    result = await database.run_db(rollups.stats, user_payload.get("restaurant_id"), period, utc_offset=utc_offset)
+    return JSONResponse(result, headers={"Cache-Control": "no-cache"})
+
+async def db_pool_health(request: Request):
+    """Live DB connection pool statistics (checked out, overflow, checkout wait histogram)"""
+    return JSONResponse(database.pool_stats())
+
+async def password_hash_health(request: Request):
+    """Password hashing pool statistics (pending, queue time, rejections)"""
+    return JSONResponse(auth.password_hasher.stats())
@@ -0,0 +1,179 @@
+"""
+Resized image variants for menu tiles.
+
+Originals in uploads/ are phone photos; kiosks only need a few hundred pixels.
+Variants are rendered with Pillow in a process pool (decoding and resampling are
+CPU bound and would stall the event loop), written next to the originals under
+uploads/variants/ and served from disk afterwards.
+
+A variant is requested either by suffix or by query parameter:
+    /uploads/<name>_thumb.webp
+    /uploads/<name>.jpg?size=thumb&format=webp
+Without a format, WebP is served to clients that accept it and JPEG otherwise.
+"""
+import os
+import logging
+import re
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+import uploads, static_files
+
+logger = logging.getLogger("ordera.images")
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(os.cpu_count() or 1)))
+# Generate every variant right after an upload instead of on the first request
+IMAGE_PREGENERATE = os.getenv("IMAGE_PREGENERATE", "true").strip().lower() in ("1", "true", "yes", "on")
+
+# Longest side in pixels
+VARIANT_SIZES = {"thumb": 200, "medium": 800}
+VARIANT_FORMATS = {"webp": "image/webp", "jpg": "image/jpeg"}
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+_VARIANT_NAME = re.compile(r"^(?P<stem>[\w-]+)_(?P<size>[a-z]+)\.(?P<format>[a-z]+)$")
+
+def variants_dir() -> str:
+    return os.path.join(uploads.UPLOADS_DIR, uploads.VARIANTS_DIRNAME)
+
+def variant_name(stem: str, size: str, fmt: str) -> str:
+    return f"{stem}_{size}.{fmt}"
+
+def render_variant(source: str, target: str, max_side: int, fmt: str):
+    """Runs in a worker process. Writes atomically so readers never see a partial file."""
+    with Image.open(source) as img:
+        # Let the JPEG decoder downscale while decoding; much cheaper than a full decode
+        img.draft("RGB", (max_side, max_side))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+        has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+
+        tmp = f"{target}.{os.getpid()}.tmp"
+        if fmt == "jpg":
+            if has_alpha:
+                rgba = img.convert("RGBA")
+                img = Image.new("RGB", rgba.size, (255, 255, 255))
+                img.paste(rgba, mask=rgba.getchannel("A"))
+            else:
+                img = img.convert("RGB")
+            img.save(tmp, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        else:
+            img = img.convert("RGBA" if has_alpha else "RGB")
+            img.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+    os.replace(tmp, target)
+
+class VariantRenderer:
+    """
+    Renders variants in a process pool, at most once per target file:
+    concurrent requests for the same missing variant share one render.
+    """
+
+    def __init__(self, workers: int = IMAGE_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._background: set[asyncio.Task] = set()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def ensure(self, source: str, size: str, fmt: str) -> str:
+        """Returns the path of the variant, rendering it first if it is missing"""
+        stem = os.path.splitext(os.path.basename(source))[0]
+        target = os.path.join(variants_dir(), variant_name(stem, size, fmt))
+        if os.path.exists(target):
+            return target
+
+        future = self._inflight.get(target)
+        if future is None:
+            os.makedirs(variants_dir(), exist_ok=True)
+            future = asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), render_variant, source, target, VARIANT_SIZES[size], fmt
+            )
+            self._inflight[target] = future
+            future.add_done_callback(lambda _: self._inflight.pop(target, None))
+        await asyncio.shield(future)
+        return target
+
+    def schedule_all(self, filename: str):
+        """Renders every variant of a freshly uploaded file in the background"""
+        if Image is None or not IMAGE_PREGENERATE:
+            return
+        task = asyncio.create_task(self._render_all(os.path.join(uploads.UPLOADS_DIR, filename)))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _render_all(self, source: str):
+        for size in VARIANT_SIZES:
+            for fmt in VARIANT_FORMATS:
+                try:
+                    await self.ensure(source, size, fmt)
+                except Exception as e:
+                    logger.warning("Rendering %s.%s of %s failed: %s", size, fmt, os.path.basename(source), e)
+                    return
+
+    def close(self):
+        for task in self._background:
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+renderer = VariantRenderer()
+
+def _find_source(stem: str):
+    for ext in uploads.ALLOWED_EXTENSIONS:
+        path = os.path.join(uploads.UPLOADS_DIR, stem + ext)
+        if os.path.isfile(path):
+            return path
+    return None
+
+def _negotiate_format(request: Request) -> str:
+    return "webp" if "image/webp" in request.headers.get("accept", "") else "jpg"
+
+async def serve_upload(request: Request):
+    """GET /uploads/{filename}: the original, or a resized variant if one is asked for"""
+    filename = request.path_params["filename"]
+    if filename.startswith(".") or os.sep in filename:
+        return JSONResponse({"error": "Not found"}, status_code=404)
+
+    size = request.query_params.get("size")
+    fmt = request.query_params.get("format")
+    match = _VARIANT_NAME.match(filename)
+    original = os.path.join(uploads.UPLOADS_DIR, filename)
+
+    if match and not os.path.isfile(original):
+        stem, size, fmt = match.group("stem"), match.group("size"), match.group("format")
+        source = _find_source(stem)
+    else:
+        stem = os.path.splitext(filename)[0]
+        source = original if os.path.isfile(original) else None
+
+    if source is None:
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    if not size:
+        return await static_files.serve_file(request, source)
+    if Image is None:
+        # Not a variant: don't let caches keep it under the variant URL
+        return await static_files.serve_file(request, source, headers={"Cache-Control": "no-cache"})
+    if size not in VARIANT_SIZES or (fmt and fmt not in VARIANT_FORMATS):
+        return JSONResponse({"error": f"Unknown image variant {size}.{fmt or ''}"}, status_code=400)
+
+    headers = {}
+    if not fmt:
+        fmt = _negotiate_format(request)
+        headers["Vary"] = "Accept"
+    try:
+        path = await renderer.ensure(source, size, fmt)
+    except Exception as e:
+        logger.warning("Rendering %s.%s of %s failed: %s", size, fmt, filename, e)
+        return await static_files.serve_file(request, source, headers={"Cache-Control": "no-cache"})
+    return await static_files.serve_file(request, path, media_type=VARIANT_FORMATS[fmt], headers=headers)
@@ -0,0 +1,60 @@
+"""
+Single-runner locks for background jobs that every worker process starts.
+
+FileLock is an exclusive, non-blocking lock on a file. The operating system
+drops it when the holder exits, however it exits, so a crashed worker never
+leaves a job without a runner.
+"""
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+class FileLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self) -> bool:
+        """Takes the lock if no other process holds it; True if this process holds it now"""
+        if self._file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        file = open(self.path, "a+b")
+        try:
+            if fcntl:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            file.close()
+            return False
+        self._file = file
+        return True
+
+    def release(self):
+        file, self._file = self._file, None
+        if file is None:
+            return
+        try:
+            if fcntl:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            file.close()
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
@@ -4,16 +4,19 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from starlette.applications import Starlette
-from starlette.routing import Route, WebSocketRoute, Mount
+from starlette.routing import Route, WebSocketRoute
 from starlette.middleware import Middleware
 from starlette.middleware.cors import CORSMiddleware
 from starlette.responses import JSONResponse
-from starlette.staticfiles import StaticFiles
-import models, auth, endpoints, ws_manager
+import asyncio
+import models, auth, endpoints, ws_manager, uploads, images, access_log, metrics, db_profiler, active_orders, archive, migrate
 from database import engine, SessionLocal
 import sentry_sdk
 from sentry_sdk.integrations.starlette import StarletteIntegration
 
+# Tracebacks in error responses and X-DB-* profiling headers
+DEBUG = os.getenv("DEBUG", "true").strip().lower() in ("1", "true", "yes", "on")
+
 # Initialize Sentry if DSN is provided
 SENTRY_DSN = os.getenv("SENTRY_DSN")
 if SENTRY_DSN:
@@ -23,30 +26,52 @@ if SENTRY_DSN:
         traces_sample_rate=1.0,
     )
 
-# Create Tables
-models.Base.metadata.create_all(bind=engine)
+# Bring the schema up to date (migrations/ owns it; see migrate.py)
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "true").strip().lower() in ("1", "true", "yes", "on")
+if MIGRATE_ON_STARTUP:
+    migrate.upgrade()
 
 # Ensure uploads directory exists
-UPLOADS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads")
+UPLOADS_DIR = uploads.UPLOADS_DIR
 os.makedirs(UPLOADS_DIR, exist_ok=True)
 
+background_tasks: list[asyncio.Task] = []
+
 async def startup():
+    access_log.configure_logging()
     await ws_manager.broadcast.connect()
+    if uploads.UPLOAD_SWEEP_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(uploads.sweep_periodically()))
+    if archive.ORDER_ARCHIVE_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(archive.archive_periodically()))
 
 async def shutdown():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    images.renderer.close()
+    active_orders.store.close()
+    await ws_manager.manager.close()
     await ws_manager.broadcast.disconnect()
+    access_log.stop_logging()
 
 async def homepage(request):
     return JSONResponse({"message": "Welcome to Ordera API (Starlette Edition)"})
 
 async def websocket_endpoint(websocket):
+    # Token verified by AuthMiddleware; the restaurant always comes from the token
+    user = getattr(websocket.state, "user", None)
+    if not user or user.get("restaurant_id") is None:
+        await websocket.close(code=1008)
+        return
+
+    res_id = int(user["restaurant_id"])
     restaurant_id = websocket.query_params.get("restaurant_id")
-    if not restaurant_id:
-        await websocket.close()
+    if restaurant_id and restaurant_id != str(res_id):
+        await websocket.close(code=1008)
         return
         
-    res_id = int(restaurant_id)
-        
     await ws_manager.manager.connect(websocket, res_id)
     try:
         while True:
@@ -56,6 +81,9 @@ async def websocket_endpoint(websocket):
 
 routes = [
     Route("/", homepage),
+    Route("/health/db", endpoints.db_pool_health, methods=["GET"]),
+    Route("/metrics", metrics.metrics_endpoint, methods=["GET"]),
+    Route("/health/auth", endpoints.password_hash_health, methods=["GET"]),
     Route("/signup", endpoints.signup, methods=["POST"]),
     Route("/token", endpoints.login, methods=["POST"]),
     Route("/verify-password", endpoints.verify_password, methods=["POST"]),
@@ -67,34 +95,29 @@ routes = [
     Route("/products/", endpoints.create_product, methods=["POST"]),
     Route("/products/{product_id:int}", endpoints.update_product, methods=["PUT"]),
     Route("/products/{product_id:int}", endpoints.delete_product, methods=["DELETE"]),
+    Route("/menu/import", endpoints.import_menu, methods=["POST"]),
+    Route("/menu/export", endpoints.export_menu, methods=["GET"]),
     Route("/upload", endpoints.upload_image, methods=["POST"]),
     Route("/orders/", endpoints.list_orders, methods=["GET"]),
+    Route("/orders/active", endpoints.list_active_orders, methods=["GET"]),
+    Route("/orders/export", endpoints.export_orders, methods=["GET"]),
     Route("/orders/", endpoints.create_order, methods=["POST"]),
     Route("/orders/{order_id:int}/status", endpoints.update_order_status, methods=["PUT"]),
-    Mount("/uploads", StaticFiles(directory=UPLOADS_DIR), name="uploads"),
+    Route("/stats", endpoints.get_stats, methods=["GET"]),
+    Route("/uploads/{filename}", images.serve_upload, methods=["GET", "HEAD"]),
     WebSocketRoute("/ws/kitchen", websocket_endpoint),
 ]
 
-from starlette.middleware.base import BaseHTTPMiddleware
-import logging
-
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger("ordera")
-
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        logger.info(f"INCOMING REQUEST: {request.method} {request.url}")
-        response = await call_next(request)
-        logger.info(f"RESPONSE STATUS: {response.status_code}")
-        return response
-
 middleware = [
-    Middleware(CORSMiddleware, allow_origins=["*"], allow_headers=["*"], allow_methods=["*"]),
-    Middleware(LoggingMiddleware)
+    Middleware(db_profiler.QueryProfilerMiddleware, routes=routes, headers=DEBUG),
+    Middleware(access_log.AccessLogMiddleware, routes=routes),
+    Middleware(metrics.MetricsMiddleware, routes=routes),
+    Middleware(CORSMiddleware, allow_origins=["*"], allow_headers=["*"], allow_methods=["*"], expose_headers=["X-Next-Cursor", "ETag", "X-DB-Queries", "X-DB-Time"]),
+    Middleware(auth.AuthMiddleware),
 ]
 
 app = Starlette(
-    debug=True, 
+    debug=DEBUG,
     routes=routes, 
     middleware=middleware,
     on_startup=[startup],
@@ -0,0 +1,245 @@
+"""
+Bulk menu import and export, as JSON or CSV.
+
+JSON is {"categories": [{"name"}], "products": [{"name", "price", "category", ...}]}
+or a bare array of products. CSV has one product per row, with the columns in
+EXPORT_COLUMNS. A row with only `category` filled in declares an empty category.
+Products name their category, which is created when missing.
+
+Import validates every row before touching the database. The upsert then runs in
+one transaction:
+- categories match by case-insensitive name;
+- products match by `id` (when it is one of this menu's) or else by
+  case-insensitive name, and are updated in place; two rows that resolve to the
+  same product (say one by id, the other by its name) fail the import;
+- everything else is inserted in batches, with COPY on Postgres (psycopg2).
+The menu version is bumped once at the end. Export writes the same format back,
+so a branch's menu round-trips. It reads the menu in one query and encodes it
+EXPORT_CHUNK_ROWS products at a time: a menu is small, and the DB connection is
+back in the pool before the first byte goes to a slow client.
+"""
+import io
+import os
+import csv
+import json
+import logging
+import msgspec
+from sqlalchemy import insert, update
+import database, models, codec, menu_cache
+
+logger = logging.getLogger("ordera.menu_bulk")
+
+MENU_IMPORT_MAX_BYTES = int(os.getenv("MENU_IMPORT_MAX_BYTES", str(5 * 1024 * 1024)))
+MAX_REPORTED_ERRORS = 100
+EXPORT_CHUNK_ROWS = 500
+
+EXPORT_COLUMNS = ("id", "name", "price", "category", "description", "image_url", "is_available", "modifiers")
+COPY_COLUMNS = ("name", "price", "description", "image_url", "category_id", "is_available", "modifiers", "restaurant_id")
+
+class MenuImportError(Exception):
+    def __init__(self, errors: list[str]):
+        super().__init__(f"{len(errors)} invalid rows")
+        self.errors = errors[:MAX_REPORTED_ERRORS]
+
+# --- Parsing ---
+
+def parse_json(body: bytes) -> codec.MenuIn:
+    try:
+        if body.lstrip()[:1] == b"[":
+            return codec.MenuIn(products=codec.decode(body, list[codec.MenuProductIn]))
+        return codec.decode(body, codec.MenuIn)
+    except msgspec.DecodeError as e:
+        raise MenuImportError([str(e)])
+
+def parse_csv(body: bytes) -> codec.MenuIn:
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise MenuImportError(["CSV must be UTF-8"])
+    reader = csv.DictReader(io.StringIO(text))
+    missing = {"name", "price", "category"} - set(reader.fieldnames or ())
+    if missing:
+        raise MenuImportError([f"missing CSV columns: {', '.join(sorted(missing))}"])
+
+    menu = codec.MenuIn()
+    errors = []
+    for line, row in enumerate(reader, start=2):
+        # Empty cells fall back to the field defaults; only known columns are read
+        values = {key: value.strip() for key, value in row.items() if key in EXPORT_COLUMNS and value and value.strip()}
+        if set(values) == {"category"}:
+            menu.categories.append(codec.MenuCategoryIn(name=values["category"]))
+            continue
+        try:
+            if "modifiers" in values:
+                values["modifiers"] = json.loads(values["modifiers"])
+            menu.products.append(msgspec.convert(values, codec.MenuProductIn, strict=False))
+        except (ValueError, msgspec.ValidationError) as e:
+            errors.append(f"line {line}: {e}")
+    if errors:
+        raise MenuImportError(errors)
+    return menu
+
+def validate(menu: codec.MenuIn):
+    """Checks what the types don't: blank names, negative prices, duplicates in the file"""
+    errors = []
+    for i, category in enumerate(menu.categories):
+        if not category.name.strip():
+            errors.append(f"categories[{i}]: name is empty")
+    seen = {}
+    for i, product in enumerate(menu.products):
+        if not product.name.strip():
+            errors.append(f"products[{i}]: name is empty")
+        if not product.category.strip():
+            errors.append(f"products[{i}]: category is empty")
+        if product.price < 0:
+            errors.append(f"products[{i}]: price is negative")
+        key = product.id if product.id is not None else product.name.strip().lower()
+        if key in seen:
+            errors.append(f"products[{i}]: same product as products[{seen[key]}]")
+        seen.setdefault(key, i)
+    if errors:
+        raise MenuImportError(errors)
+
+# --- Import ---
+
+def _copy_products(db, rows: list[dict]) -> bool:
+    """COPY rows into products over the session's connection; False if the driver can't"""
+    dbapi_connection = db.connection().connection.dbapi_connection
+    if not type(dbapi_connection).__module__.startswith("psycopg2"):
+        return False
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            json.dumps(row[c]) if c == "modifiers" else ("true" if row[c] else "false") if c == "is_available" else row[c]
+            for c in COPY_COLUMNS
+        ])
+    buffer.seek(0)
+    with dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY products ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    return True
+
+def import_menu(restaurant_id: int, menu: codec.MenuIn) -> dict:
+    """Upserts the menu in one transaction; raises MenuImportError without writing anything"""
+    validate(menu)
+    with database.get_db_context() as db:
+        categories = {
+            name.lower(): category_id for category_id, name in
+            db.query(models.Category.id, models.Category.name).filter(models.Category.restaurant_id == restaurant_id)
+        }
+        products_by_id = set()
+        products_by_name = {}
+        for product_id, name in db.query(models.Product.id, models.Product.name).filter(
+            models.Product.restaurant_id == restaurant_id
+        ).order_by(models.Product.id):
+            products_by_id.add(product_id)
+            products_by_name.setdefault((name or "").strip().lower(), product_id)
+
+        # An id from another branch's export doesn't match here; the name still can
+        product_ids = [
+            product.id if product.id in products_by_id else products_by_name.get(product.name.strip().lower())
+            for product in menu.products
+        ]
+        errors, targets = [], {}
+        for i, (product, product_id) in enumerate(zip(menu.products, product_ids)):
+            key = product_id if product_id is not None else product.name.strip().lower()
+            if key in targets:
+                errors.append(f"products[{i}]: same product as products[{targets[key]}]")
+            targets.setdefault(key, i)
+        if errors:
+            raise MenuImportError(errors)
+
+        new_categories = {}
+        for name in [c.name for c in menu.categories] + [p.category for p in menu.products]:
+            name = name.strip()
+            if name.lower() not in categories:
+                new_categories.setdefault(name.lower(), name)
+        if new_categories:
+            db.execute(insert(models.Category), [{"name": name, "restaurant_id": restaurant_id} for name in new_categories.values()])
+            categories = {
+                name.lower(): category_id for category_id, name in
+                db.query(models.Category.id, models.Category.name).filter(models.Category.restaurant_id == restaurant_id)
+            }
+
+        inserts, updates = [], []
+        for product, product_id in zip(menu.products, product_ids):
+            values = {
+                "name": product.name.strip(),
+                "price": product.price,
+                "description": product.description or None,
+                "image_url": product.image_url or None,
+                "category_id": categories[product.category.strip().lower()],
+                "is_available": product.is_available,
+                "modifiers": product.modifiers,
+            }
+            if product_id is None:
+                inserts.append(dict(values, restaurant_id=restaurant_id))
+            else:
+                updates.append(dict(values, id=product_id))
+
+        if updates:
+            # ORM bulk UPDATE by primary key: one executemany
+            db.execute(update(models.Product), updates)
+        if inserts and not (db.get_bind().dialect.name == "postgresql" and _copy_products(db, inserts)):
+            db.execute(insert(models.Product), inserts)
+
+        menu_cache.bump_version(db, restaurant_id)
+        db.commit()
+
+    result = {
+        "categories_created": len(new_categories),
+        "products_created": len(inserts),
+        "products_updated": len(updates),
+    }
+    logger.info("Menu imported", extra={"fields": dict(result, restaurant_id=restaurant_id)})
+    return result
+
+# --- Export ---
+
+def load_menu(restaurant_id: int):
+    """(category names, product rows) of the menu, ordered for a stable export"""
+    with database.get_db_context() as db:
+        categories = [name for (name,) in db.query(models.Category.name).filter(
+            models.Category.restaurant_id == restaurant_id
+        ).order_by(models.Category.name, models.Category.id)]
+        products = db.query(
+            models.Product.id, models.Product.name, models.Product.price, models.Category.name.label("category"),
+            models.Product.description, models.Product.image_url, models.Product.is_available, models.Product.modifiers
+        ).outerjoin(models.Category, models.Category.id == models.Product.category_id).filter(
+            models.Product.restaurant_id == restaurant_id
+        ).order_by(models.Category.name, models.Product.name, models.Product.id).all()
+        return categories, products
+
+def _product_struct(row) -> codec.MenuProductIn:
+    return codec.MenuProductIn(
+        id=row.id, name=row.name or "", price=row.price or 0.0, category=row.category or "",
+        description=row.description, image_url=row.image_url,
+        is_available=True if row.is_available is None else row.is_available, modifiers=row.modifiers or {}
+    )
+
+async def export_json(categories: list[str], products: list):
+    yield b'{"categories":' + codec.encode([codec.MenuCategoryIn(name=name) for name in categories]) + b',"products":['
+    for start in range(0, len(products), EXPORT_CHUNK_ROWS):
+        chunk = codec.encode([_product_struct(row) for row in products[start:start + EXPORT_CHUNK_ROWS]])
+        yield (b"," if start else b"") + chunk[1:-1]
+    yield b"]}"
+
+async def export_csv(categories: list[str], products: list):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    # Categories without products still need a row to survive a round trip
+    used = {row.category for row in products}
+    for name in categories:
+        if name not in used:
+            writer.writerow(["", "", "", name, "", "", "", ""])
+    for start in range(0, len(products), EXPORT_CHUNK_ROWS):
+        for row in products[start:start + EXPORT_CHUNK_ROWS]:
+            writer.writerow([
+                row.id, row.name, row.price, row.category or "", row.description or "", row.image_url or "",
+                "false" if row.is_available is False else "true", json.dumps(row.modifiers) if row.modifiers else "",
+            ])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
@@ -0,0 +1,156 @@
+import os
+import asyncio
+import logging
+import collections
+from starlette.requests import Request
+from starlette.responses import Response
+from sqlalchemy import update, func
+import database, models, codec
+
+logger = logging.getLogger("ordera.menu_cache")
+
+# Menu snapshots kept in this process (one per restaurant, least recently used evicted)
+MENU_CACHE_SIZE = int(os.getenv("MENU_CACHE_SIZE", "256"))
+# Optional shared tier so a snapshot built by one worker is reused by the others
+MENU_CACHE_REDIS_URL = os.getenv("MENU_CACHE_REDIS_URL", os.getenv("REDIS_URL", ""))
+MENU_CACHE_REDIS_TTL = int(os.getenv("MENU_CACHE_REDIS_TTL", "86400"))
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+class MenuSnapshot:
+    """Categories and products of one menu version, serialized once"""
+    __slots__ = ("restaurant_id", "version", "categories", "products")
+
+    def __init__(self, restaurant_id: int, version: int, categories: bytes, products: bytes):
+        self.restaurant_id = restaurant_id
+        self.version = version
+        self.categories = categories
+        self.products = products
+
+def menu_etag(restaurant_id: int, version: int, kind: str) -> str:
+    return f'"menu-{restaurant_id}-{version}-{kind}"'
+
+def bump_version(db, restaurant_id: int):
+    """
+    Marks the restaurant's menu as changed.
+    Call inside the transaction that changes categories or products.
+    """
+    db.execute(update(models.Restaurant).where(models.Restaurant.id == restaurant_id).values(
+        menu_version=func.coalesce(models.Restaurant.menu_version, 0) + 1
+    ))
+
+def load_version(restaurant_id: int) -> int:
+    with database.get_db_context() as db:
+        version = db.query(models.Restaurant.menu_version).filter(models.Restaurant.id == restaurant_id).scalar()
+        return version or 0
+
+def build_snapshot(restaurant_id: int) -> MenuSnapshot:
+    with database.get_db_context() as db:
+        # Version first: if the menu changes meanwhile, the snapshot is only ever newer than its version
+        version = db.query(models.Restaurant.menu_version).filter(models.Restaurant.id == restaurant_id).scalar() or 0
+        categories = db.query(models.Category).filter(models.Category.restaurant_id == restaurant_id).all()
+        products = db.query(models.Product).filter(models.Product.restaurant_id == restaurant_id).all()
+
+        category_names = {c.id: c.name for c in categories}
+        return MenuSnapshot(
+            restaurant_id,
+            version,
+            codec.encode([codec.category_from_orm(c) for c in categories]),
+            codec.encode([codec.product_from_orm(p, category_names.get(p.category_id)) for p in products])
+        )
+
+class MenuCache:
+    def __init__(self, maxsize: int = MENU_CACHE_SIZE, redis_url: str = MENU_CACHE_REDIS_URL):
+        self.maxsize = maxsize
+        self._snapshots: collections.OrderedDict[int, MenuSnapshot] = collections.OrderedDict()
+        # (restaurant_id, version) -> the build concurrent misses for that version wait on
+        self._building: dict[tuple[int, int], asyncio.Task] = {}
+        self._redis = None
+        if aioredis and redis_url.startswith(("redis://", "rediss://")):
+            self._redis = aioredis.from_url(redis_url)
+
+    async def get(self, restaurant_id: int, version: int) -> MenuSnapshot:
+        """Returns the snapshot for this menu version, building it at most once per version"""
+        snapshot = self._snapshots.get(restaurant_id)
+        if snapshot and snapshot.version >= version:
+            self._snapshots.move_to_end(restaurant_id)
+            return snapshot
+
+        key = (restaurant_id, version)
+        task = self._building.get(key)
+        if task is None:
+            task = self._building[key] = asyncio.create_task(self._load(restaurant_id, version))
+            task.add_done_callback(lambda _: self._building.pop(key, None))
+        # Shielded: a caller that goes away doesn't cancel the build the others wait on
+        return await asyncio.shield(task)
+
+    async def _load(self, restaurant_id: int, version: int) -> MenuSnapshot:
+        snapshot = await self._get_shared(restaurant_id, version)
+        if not snapshot:
+            snapshot = await database.run_db(build_snapshot, restaurant_id)
+            await self._set_shared(snapshot)
+        self._put(snapshot)
+        return snapshot
+
+    def _put(self, snapshot: MenuSnapshot):
+        self._snapshots[snapshot.restaurant_id] = snapshot
+        self._snapshots.move_to_end(snapshot.restaurant_id)
+        while len(self._snapshots) > self.maxsize:
+            self._snapshots.popitem(last=False)
+
+    def _redis_key(self, restaurant_id: int, version: int) -> str:
+        return f"ordera:menu:{restaurant_id}:{version}"
+
+    async def _get_shared(self, restaurant_id: int, version: int):
+        if not self._redis:
+            return None
+        try:
+            categories, products = await self._redis.hmget(self._redis_key(restaurant_id, version), "categories", "products")
+        except Exception as e:
+            logger.warning("Redis read failed: %s", e)
+            return None
+        if categories is None or products is None:
+            return None
+        return MenuSnapshot(restaurant_id, version, categories, products)
+
+    async def _set_shared(self, snapshot: MenuSnapshot):
+        if not self._redis:
+            return
+        key = self._redis_key(snapshot.restaurant_id, snapshot.version)
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.hset(key, mapping={"categories": snapshot.categories, "products": snapshot.products})
+                pipe.expire(key, MENU_CACHE_REDIS_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Redis write failed: %s", e)
+
+cache = MenuCache()
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+async def menu_response(request: Request, restaurant_id: int, kind: str) -> Response:
+    """
+    Serves the categories or products part of the restaurant's menu snapshot.
+    A matching If-None-Match costs one primary key lookup and returns 304.
+    """
+    version = await database.run_db(load_version, restaurant_id)
+    etag = menu_etag(restaurant_id, version, kind)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    snapshot = await cache.get(restaurant_id, version)
+    headers["ETag"] = menu_etag(restaurant_id, snapshot.version, kind)
+    content = snapshot.categories if kind == "categories" else snapshot.products
+    return Response(content, media_type="application/json", headers=headers)
@@ -0,0 +1,193 @@
+"""
+Prometheus metrics in the text exposition format, served at /metrics.
+
+Collectors are plain dicts updated from the event loop thread only, so recording
+a sample takes no lock and costs a dict lookup plus a bisect. Gauges that mirror
+existing state (DB pool, WebSocket connections) are read when /metrics is scraped
+instead of being kept up to date on every change.
+"""
+import time
+import bisect
+from starlette.requests import Request
+from starlette.responses import Response
+import database
+
+# Upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PUBLISH_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        # Unlabelled series start at 0 so rate() has a first sample
+        self.values: dict[tuple, float] = {} if label_names else {(): 0}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+class Gauge:
+    """A gauge set directly, or computed by `collect` (returning {labels: value}) at scrape time"""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = (), collect=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.collect = collect
+        self.values: dict[tuple, float] = {} if label_names else {(): 0}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def render(self) -> list[str]:
+        values = self.collect() if self.collect else self.values
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        for labels, value in values.items():
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self.series: dict[tuple, list] = {}
+
+    def observe(self, seconds: float, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, seconds)] += 1
+        series[1] += seconds
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self.series.items():
+            lines.extend(render_histogram_series(self.name, self.label_names, labels, self.buckets, counts, total))
+        return lines
+
+def render_histogram_series(name, label_names, labels, buckets, counts, total) -> list[str]:
+    """counts has one entry per bucket plus the +Inf overflow, not yet cumulative"""
+    lines = []
+    cumulative = 0
+    for upper, count in zip(tuple(buckets) + (float("inf"),), counts):
+        cumulative += count
+        le = 'le="%s"' % _number(upper)
+        lines.append(f"{name}_bucket{_labels(label_names, labels, le)} {cumulative}")
+    lines.append(f"{name}_sum{_labels(label_names, labels)} {total}")
+    lines.append(f"{name}_count{_labels(label_names, labels)} {cumulative}")
+    return lines
+
+# --- Collectors ---
+
+http_request_duration = Histogram(
+    "ordera_http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status")
+)
+http_requests_in_flight = Gauge("ordera_http_requests_in_flight", "HTTP requests being processed")
+broadcast_publish_duration = Histogram(
+    "ordera_broadcast_publish_duration_seconds", "Time to publish one event to the broadcast backend",
+    buckets=PUBLISH_BUCKETS
+)
+orders_created = Counter("ordera_orders_created_total", "Orders placed")
+
+def _render_db_pool() -> list[str]:
+    stats = database.pool_stats()
+    lines = []
+    for key, help_text in (
+        ("size", "Configured pool size"),
+        ("checked_out", "Connections in use"),
+        ("checked_in", "Idle connections in the pool"),
+        ("overflow", "Connections open beyond pool size"),
+    ):
+        if key in stats:
+            lines += [f"# HELP ordera_db_pool_{key} {help_text}", f"# TYPE ordera_db_pool_{key} gauge",
+                      f"ordera_db_pool_{key} {stats[key]}"]
+
+    wait = stats["wait"]
+    lines += ["# HELP ordera_db_pool_wait_seconds Time spent waiting to check a connection out",
+              "# TYPE ordera_db_pool_wait_seconds histogram"]
+    lines += render_histogram_series(
+        "ordera_db_pool_wait_seconds", (), (), database.POOL_WAIT_BUCKETS[:-1],
+        list(wait["buckets"].values()), wait["sum_seconds"]
+    )
+    lines += ["# HELP ordera_db_pool_timeouts_total Checkouts that hit the pool timeout",
+              "# TYPE ordera_db_pool_timeouts_total counter",
+              f"ordera_db_pool_timeouts_total {wait['timeouts']}"]
+    return lines
+
+COLLECTORS = [http_request_duration, http_requests_in_flight, broadcast_publish_duration, orders_created]
+
+def register(collector):
+    """Adds a collector owned by another module (e.g. a scrape-time Gauge over its state)"""
+    COLLECTORS.append(collector)
+    return collector
+
+def render() -> str:
+    lines = []
+    for collector in COLLECTORS:
+        lines.extend(collector.render())
+    lines.extend(_render_db_pool())
+    return "\n".join(lines) + "\n"
+
+async def metrics_endpoint(request: Request):
+    return Response(render(), media_type=CONTENT_TYPE)
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording in-flight requests and latency per route template"""
+
+    def __init__(self, app, routes=()):
+        self.app = app
+        self.route_paths = {route.endpoint: route.path for route in routes if hasattr(route, "endpoint")}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            route = self.route_paths.get(scope.get("endpoint"), "<unmatched>")
+            http_request_duration.observe(time.perf_counter() - started, scope["method"], route, status)
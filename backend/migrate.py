@@ -0,0 +1,275 @@
+"""
+Versioned schema migrations.
+
+Revisions live in migrations/ as NNNN_description.py modules with a `revision`
+string and an `upgrade(conn)` function, applied in file name order. Applied
+revisions are recorded in the schema_migrations table. A revision runs in its own
+transaction, together with its schema_migrations row, unless it sets
+`transactional = False` (e.g. CREATE INDEX CONCURRENTLY). Then it runs in autocommit
+and must be safe to repeat.
+
+main.py runs upgrade() at import (MIGRATE_ON_STARTUP). On Postgres, an advisory
+lock makes concurrent workers apply each revision exactly once.
+
+Usage (from backend/):
+    python migrate.py upgrade   apply pending revisions to DATABASE_URL
+    python migrate.py status    list revisions and whether they are applied
+    python migrate.py check     exit 1 if models.py differs from the schema the revisions build
+    python migrate.py check --database
+                                the same against DATABASE_URL as it is (e.g. an upgraded old database)
+    python migrate.py explain   EXPLAIN the hot endpoint queries, exit 1 if one scans a whole table
+"""
+import os
+import sys
+import logging
+import warnings
+import importlib.util
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, String, DateTime, UniqueConstraint, create_engine, inspect, select, text, func
+from sqlalchemy.exc import SAWarning
+from sqlalchemy.pool import StaticPool
+import database, models
+
+logger = logging.getLogger("ordera.migrate")
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+# Arbitrary key for pg_advisory_lock, shared by every process migrating this database
+ADVISORY_LOCK_ID = 7_212_001
+
+version_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", version_metadata,
+    Column("revision", String, primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime),
+)
+
+class Revision:
+    def __init__(self, path: str):
+        spec = importlib.util.spec_from_file_location(f"migrations_{os.path.basename(path)[:-3]}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        self.module = module
+        self.revision = module.revision
+        self.name = os.path.basename(path)[:-3]
+        self.description = (module.__doc__ or "").strip().splitlines()[0] if module.__doc__ else self.name
+        self.transactional = getattr(module, "transactional", True)
+
+    def upgrade(self, conn):
+        self.module.upgrade(conn)
+
+def load_revisions() -> list[Revision]:
+    paths = sorted(
+        os.path.join(MIGRATIONS_DIR, name) for name in os.listdir(MIGRATIONS_DIR)
+        if name.endswith(".py") and name[:4].isdigit()
+    )
+    revisions = [Revision(path) for path in paths]
+    seen = set()
+    for revision in revisions:
+        if revision.revision in seen:
+            raise RuntimeError(f"Duplicate migration revision {revision.revision}")
+        seen.add(revision.revision)
+    return revisions
+
+def applied_revisions(conn) -> set:
+    if not inspect(conn).has_table("schema_migrations"):
+        return set()
+    return set(conn.execute(select(schema_migrations.c.revision)).scalars())
+
+def upgrade(engine=None) -> list[str]:
+    """Applies every pending revision; returns the revisions applied"""
+    engine = engine or database.engine
+    applied_now = []
+    with engine.connect() as lock_conn:
+        if engine.dialect.name == "postgresql":
+            lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+            lock_conn.commit()
+        try:
+            with engine.begin() as conn:
+                version_metadata.create_all(conn)
+                applied = applied_revisions(conn)
+            for revision in load_revisions():
+                if revision.revision in applied:
+                    continue
+                logger.info("Applying migration", extra={"fields": {"revision": revision.revision, "name": revision.name}})
+                if revision.transactional:
+                    with engine.begin() as conn:
+                        revision.upgrade(conn)
+                        _record(conn, revision)
+                else:
+                    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                        revision.upgrade(conn)
+                    with engine.begin() as conn:
+                        _record(conn, revision)
+                applied_now.append(revision.revision)
+        finally:
+            if engine.dialect.name == "postgresql":
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+                lock_conn.commit()
+    return applied_now
+
+def _record(conn, revision: Revision):
+    conn.execute(schema_migrations.insert().values(
+        revision=revision.revision, description=revision.description, applied_at=datetime.utcnow()
+    ))
+
+def status(engine=None) -> list[tuple[str, str, bool]]:
+    """(revision, name, applied) for every revision on disk"""
+    engine = engine or database.engine
+    with engine.connect() as conn:
+        applied = applied_revisions(conn)
+    return [(r.revision, r.name, r.revision in applied) for r in load_revisions()]
+
+# --- Drift check ---
+
+def _index_signature(columns, unique) -> tuple:
+    # Expression indexes (lower(name)) reflect without column names; compare what both sides have
+    return (tuple(c for c in columns if c is not None), bool(unique))
+
+def schema_drift(engine=None) -> list[str]:
+    """
+    Lists every table, column, index or unique constraint of `engine`'s database
+    that differs from models.py. Without an engine, a scratch SQLite database is
+    built from the revisions alone.
+    """
+    if engine is None:
+        engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+        upgrade(engine)
+    inspector = inspect(engine)
+    problems = []
+
+    migrated_tables = set(inspector.get_table_names()) - {"schema_migrations"}
+    model_tables = set(models.Base.metadata.tables)
+    for name in sorted(model_tables - migrated_tables):
+        problems.append(f"table {name}: in models, no migration creates it")
+    for name in sorted(migrated_tables - model_tables):
+        problems.append(f"table {name}: created by migrations, not in models")
+
+    for name in sorted(model_tables & migrated_tables):
+        table = models.Base.metadata.tables[name]
+        migrated_columns = {c["name"] for c in inspector.get_columns(name)}
+        for column in sorted(set(table.columns.keys()) - migrated_columns):
+            problems.append(f"column {name}.{column}: in models, not migrated")
+        for column in sorted(migrated_columns - set(table.columns.keys())):
+            problems.append(f"column {name}.{column}: migrated, not in models")
+
+        model_indexes = {
+            index.name: _index_signature([c.name if isinstance(c, Column) else None for c in index.expressions], index.unique)
+            for index in table.indexes
+        }
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", SAWarning)
+            migrated_indexes = {
+                index["name"]: _index_signature(index["column_names"], index["unique"])
+                for index in inspector.get_indexes(name)
+            }
+            migrated_uniques = {c["name"]: tuple(c["column_names"]) for c in inspector.get_unique_constraints(name)}
+        # SQLite reflection skips expression indexes; sqlite_master still lists them
+        if engine.dialect.name == "sqlite":
+            with engine.connect() as conn:
+                for index_name, sql in conn.execute(
+                    text("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND sql IS NOT NULL"),
+                    {"table": name}
+                ):
+                    if index_name not in migrated_indexes:
+                        migrated_indexes[index_name] = _index_signature([], sql.upper().startswith("CREATE UNIQUE"))
+        for index in sorted(model_indexes.keys() | migrated_indexes.keys()):
+            if index not in migrated_indexes:
+                problems.append(f"index {name}.{index}: in models, not migrated")
+            elif index not in model_indexes:
+                problems.append(f"index {name}.{index}: migrated, not in models")
+            elif model_indexes[index] != migrated_indexes[index]:
+                problems.append(f"index {name}.{index}: models {model_indexes[index]}, migrated {migrated_indexes[index]}")
+
+        model_uniques = {
+            constraint.name: tuple(c.name for c in constraint.columns)
+            for constraint in table.constraints if isinstance(constraint, UniqueConstraint)
+        }
+        if model_uniques != migrated_uniques:
+            problems.append(f"unique constraints on {name}: models {model_uniques}, migrated {migrated_uniques}")
+    return problems
+
+# --- EXPLAIN report ---
+
+def hot_queries() -> list[tuple[str, object]]:
+    """The statements behind the busiest endpoints, with representative parameters"""
+    order, item = models.Order, models.OrderItem
+    active = ["pending", "preparing", "ready"]
+    return [
+        ("list_orders", select(order).where(order.restaurant_id == 1).order_by(order.created_at.desc(), order.id.desc()).limit(101)),
+        ("list_orders ?status", select(order).where(order.restaurant_id == 1, order.status.in_(active)).order_by(order.created_at.desc(), order.id.desc()).limit(101)),
+        ("list_orders ?history", select(models.ArchivedOrder).where(models.ArchivedOrder.restaurant_id == 1).order_by(models.ArchivedOrder.created_at.desc(), models.ArchivedOrder.id.desc()).limit(101)),
+        ("order items (selectinload)", select(item).where(item.order_id.in_([1, 2, 3]))),
+        ("archived order items (selectinload)", select(models.ArchivedOrderItem).where(models.ArchivedOrderItem.order_id.in_([1, 2, 3]))),
+        ("update_order_status", select(order).where(order.id == 1, order.restaurant_id == 1)),
+        ("active orders load", select(order).where(order.restaurant_id == 1, order.status.notin_(["completed", "cancelled"])).order_by(order.created_at, order.id)),
+        ("menu categories", select(models.Category).where(models.Category.restaurant_id == 1)),
+        ("menu products", select(models.Product).where(models.Product.restaurant_id == 1)),
+        ("create_order product check", select(models.Product).where(models.Product.restaurant_id == 1, models.Product.id.in_([1, 2, 3]))),
+        ("login user", select(models.User).where(models.User.username == "admin", models.User.restaurant_id == 1)),
+        ("tenant lookup", select(models.Restaurant.id).where(func.lower(models.Restaurant.name) == "bench - central", func.lower(models.Restaurant.city) == "benchtown")),
+        ("order counter", select(models.OrderCounter.last_number).where(models.OrderCounter.restaurant_id == 1)),
+        ("stats series", select(models.SalesHourly).where(models.SalesHourly.restaurant_id == 1, models.SalesHourly.hour >= datetime(2000, 1, 1), models.SalesHourly.hour < datetime(2000, 1, 31))),
+        ("stats top products", select(models.ProductSalesDaily.product_id, func.sum(models.ProductSalesDaily.quantity)).where(models.ProductSalesDaily.restaurant_id == 1, models.ProductSalesDaily.day >= datetime(2000, 1, 1).date()).group_by(models.ProductSalesDaily.product_id)),
+        ("archive batch scan", select(order.id).where(order.status.in_(["completed"]), order.created_at < datetime(2000, 1, 1), order.id < 1000).order_by(order.created_at).limit(500)),
+    ]
+
+def explain(engine=None) -> list[dict]:
+    """EXPLAIN for each hot query: {"name", "plan", "full_scan"}"""
+    engine = engine or database.engine
+    report = []
+    with engine.connect() as conn:
+        for name, statement in hot_queries():
+            compiled = statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+            if engine.dialect.name == "postgresql":
+                # Small tables are cheaper to scan; forbid that to see whether an index applies
+                conn.execute(text("SET LOCAL enable_seqscan = off"))
+                plan = [row[0] for row in conn.execute(text(f"EXPLAIN {compiled}"))]
+                full_scan = any("Seq Scan" in line for line in plan)
+            else:
+                plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+                # "SCAN orders" reads the whole table; "SCAN orders USING INDEX ..." does not
+                full_scan = any(line.startswith("SCAN ") and " USING " not in line for line in plan)
+            report.append({"name": name, "plan": plan, "full_scan": full_scan})
+        conn.rollback()
+    return report
+
+def main_cli(argv: list[str]) -> int:
+    command = argv[0] if argv else "upgrade"
+    if command == "upgrade":
+        applied = upgrade()
+        print(f"Applied {', '.join(applied)}" if applied else "Schema is up to date")
+    elif command == "status":
+        for revision, name, applied in status():
+            print(f"{'applied ' if applied else 'PENDING '} {name}")
+    elif command == "check" and "--database" in argv[1:]:
+        problems = schema_drift(database.engine)
+        for problem in problems:
+            print(problem)
+        if problems:
+            print("models.py and the database differ: run `python migrate.py upgrade`, or add a revision")
+            return 1
+        print("models.py matches the database")
+    elif command == "check":
+        problems = schema_drift()
+        for problem in problems:
+            print(problem)
+        if problems:
+            print("models.py and migrations/ differ: add a revision")
+            return 1
+        print("models.py matches migrations/")
+    elif command == "explain":
+        failed = 0
+        for entry in explain():
+            failed += entry["full_scan"]
+            print(f"{'FULL SCAN' if entry['full_scan'] else 'index   '}  {entry['name']}")
+            for line in entry["plan"]:
+                print(f"            {line}")
+        return 1 if failed else 0
+    else:
+        print(__doc__)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main_cli(sys.argv[1:]))
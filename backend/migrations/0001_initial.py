@@ -0,0 +1,110 @@
+"""
+Initial schema: the tables as models.py and Base.metadata.create_all built them
+before migrations existed. Tables are frozen here rather than imported from
+models, so this revision keeps describing the same schema as models.py changes.
+
+create_all checks for existing tables first, so databases that were created by
+create_all are adopted as they are: tables they are missing are added, but
+columns and indexes are not added to tables that exist. 0004, 0005 and 0006 bring
+those tables up to date.
+"""
+from sqlalchemy import MetaData, Table, Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Date, JSON, Index, UniqueConstraint, func
+
+revision = "0001"
+
+def upgrade(conn):
+    metadata = MetaData()
+
+    restaurants = Table(
+        "restaurants", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("name", String, index=True),
+        Column("city", String, index=True),
+        Column("event_seq", Integer),
+        Column("menu_version", Integer),
+    )
+    Index("uix_restaurant_name_city", func.lower(restaurants.c.name), func.lower(restaurants.c.city), unique=True)
+
+    Table(
+        "categories", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("name", String, index=True),
+        Column("restaurant_id", Integer, ForeignKey("restaurants.id")),
+    )
+
+    Table(
+        "users", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("username", String, index=True),
+        Column("hashed_password", String),
+        Column("role", String),
+        Column("restaurant_id", Integer, ForeignKey("restaurants.id")),
+        UniqueConstraint("restaurant_id", "username", name="uix_restaurant_username"),
+    )
+
+    Table(
+        "products", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("name", String, index=True),
+        Column("description", String),
+        Column("price", Float),
+        Column("image_url", String),
+        Column("category_id", Integer, ForeignKey("categories.id")),
+        Column("is_available", Boolean),
+        Column("modifiers", JSON),
+        Column("restaurant_id", Integer, ForeignKey("restaurants.id")),
+    )
+
+    Table(
+        "orders", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("order_number", Integer),
+        Column("status", String),
+        Column("total_amount", Float),
+        Column("payment_status", String),
+        Column("payment_method", String),
+        Column("created_at", DateTime),
+        Column("restaurant_id", Integer, ForeignKey("restaurants.id")),
+        Index("ix_orders_restaurant_created", "restaurant_id", "created_at", "id"),
+    )
+
+    Table(
+        "order_items", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("order_id", Integer, ForeignKey("orders.id")),
+        Column("product_id", Integer, ForeignKey("products.id")),
+        Column("quantity", Integer),
+        Column("selected_modifiers", JSON),
+    )
+
+    Table(
+        "order_counters", metadata,
+        Column("restaurant_id", Integer, ForeignKey("restaurants.id"), primary_key=True),
+        Column("last_number", Integer, nullable=False),
+        Column("counter_date", Date),
+    )
+
+    Table(
+        "orders_archive", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("order_number", Integer),
+        Column("status", String),
+        Column("total_amount", Float),
+        Column("payment_status", String),
+        Column("payment_method", String),
+        Column("created_at", DateTime),
+        Column("restaurant_id", Integer, ForeignKey("restaurants.id")),
+        Column("archived_at", DateTime),
+        Index("ix_orders_archive_restaurant_created", "restaurant_id", "created_at", "id"),
+    )
+
+    Table(
+        "order_items_archive", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("order_id", Integer, ForeignKey("orders_archive.id"), index=True),
+        Column("product_id", Integer, ForeignKey("products.id")),
+        Column("quantity", Integer),
+        Column("selected_modifiers", JSON),
+    )
+
+    metadata.create_all(conn)
@@ -0,0 +1,38 @@
+"""
+Indexes for the queries every request runs:
+
+  orders (restaurant_id, status, created_at)  kitchen list (?status=...), active order load
+  orders (status, created_at)                 archive.py batch scan
+  order_items (order_id)                      selectinload of items, archival deletes
+  products (restaurant_id, category_id)       menu load
+  categories (restaurant_id)                  menu load
+
+On Postgres they are built with CREATE INDEX CONCURRENTLY, so the tables stay
+writable while the indexes are built. That cannot run in a transaction, so this
+revision is not transactional. Indexes that already exist are skipped, so a
+failed run can be repeated.
+"""
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, Index
+
+revision = "0002"
+transactional = False
+
+def upgrade(conn):
+    metadata = MetaData()
+    orders = Table(
+        "orders", metadata,
+        Column("restaurant_id", Integer), Column("status", String), Column("created_at", DateTime),
+    )
+    order_items = Table("order_items", metadata, Column("order_id", Integer))
+    products = Table("products", metadata, Column("restaurant_id", Integer), Column("category_id", Integer))
+    categories = Table("categories", metadata, Column("restaurant_id", Integer))
+
+    indexes = [
+        Index("ix_orders_restaurant_status", orders.c.restaurant_id, orders.c.status, orders.c.created_at, postgresql_concurrently=True),
+        Index("ix_orders_status_created", orders.c.status, orders.c.created_at, postgresql_concurrently=True),
+        Index("ix_order_items_order_id", order_items.c.order_id, postgresql_concurrently=True),
+        Index("ix_products_restaurant_category", products.c.restaurant_id, products.c.category_id, postgresql_concurrently=True),
+        Index("ix_categories_restaurant", categories.c.restaurant_id, postgresql_concurrently=True),
+    ]
+    for index in indexes:
+        index.create(conn, checkfirst=True)
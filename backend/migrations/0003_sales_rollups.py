@@ -0,0 +1,31 @@
+"""
+Sales rollup tables (see rollups.py). They start empty: fill them from the
+existing orders with `python rollups.py backfill`.
+"""
+from sqlalchemy import MetaData, Table, Column, Integer, String, Float, ForeignKey, DateTime, Date
+
+revision = "0003"
+
+def upgrade(conn):
+    metadata = MetaData()
+    Table("restaurants", metadata, Column("id", Integer, primary_key=True))
+    Table("products", metadata, Column("id", Integer, primary_key=True))
+
+    Table(
+        "sales_hourly", metadata,
+        Column("restaurant_id", Integer, ForeignKey("restaurants.id"), primary_key=True),
+        Column("hour", DateTime, primary_key=True),
+        Column("payment_method", String, primary_key=True),
+        Column("order_count", Integer, nullable=False),
+        Column("revenue", Float, nullable=False),
+        Column("item_count", Integer, nullable=False),
+    )
+    Table(
+        "product_sales_daily", metadata,
+        Column("restaurant_id", Integer, ForeignKey("restaurants.id"), primary_key=True),
+        Column("day", Date, primary_key=True),
+        Column("product_id", Integer, ForeignKey("products.id"), primary_key=True),
+        Column("quantity", Integer, nullable=False),
+    )
+    metadata.tables["sales_hourly"].create(conn)
+    metadata.tables["product_sales_daily"].create(conn)
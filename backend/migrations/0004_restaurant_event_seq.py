@@ -0,0 +1,14 @@
+"""
+restaurants.event_seq on databases created before it existed.
+
+0001 adopts a restaurants table built by an older create_all as it is, without
+the column. Existing restaurants start at 0, as new ones do.
+"""
+from sqlalchemy import inspect, text
+
+revision = "0004"
+
+def upgrade(conn):
+    columns = {column["name"] for column in inspect(conn).get_columns("restaurants")}
+    if "event_seq" not in columns:
+        conn.execute(text("ALTER TABLE restaurants ADD COLUMN event_seq INTEGER DEFAULT 0"))
@@ -0,0 +1,14 @@
+"""
+restaurants.menu_version on databases created before it existed.
+
+Like event_seq (0004), the column is missing from restaurants tables that an
+older create_all built. Existing menus start at version 0, as new ones do.
+"""
+from sqlalchemy import inspect, text
+
+revision = "0005"
+
+def upgrade(conn):
+    columns = {column["name"] for column in inspect(conn).get_columns("restaurants")}
+    if "menu_version" not in columns:
+        conn.execute(text("ALTER TABLE restaurants ADD COLUMN menu_version INTEGER DEFAULT 0"))
@@ -0,0 +1,77 @@
+"""
+Columns and indexes that databases adopted by 0001 lack.
+
+0001 runs create_all, which skips tables that already exist, so a database built
+by an older create_all keeps its tables as they were. This adds what models.py
+gained on those tables since: the restaurants counters (also added by 0004 and
+0005), the case-insensitive unique (name, city) index and the orders keyset index.
+
+The unique index can't be built while two restaurants share a name and city
+ignoring case. They are not merged automatically, since each has its own users
+and orders: the revision fails, listing them, until all but one are renamed.
+
+Columns missing from orders have no default to fill existing rows with, so
+they are added nullable and left empty (created_at, restaurant_id), as create_all
+made them; an orders table without an id can't be repaired and fails the revision.
+
+Like 0002 it is not transactional, so the orders index is built CONCURRENTLY on
+Postgres, and every step is skipped when already done.
+"""
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, Index, func, inspect, select, text
+from sqlalchemy.schema import CreateIndex
+
+revision = "0006"
+transactional = False
+
+def upgrade(conn):
+    metadata = MetaData()
+    restaurants = Table(
+        "restaurants", metadata,
+        Column("id", Integer), Column("name", String), Column("city", String),
+        Column("event_seq", Integer, server_default="0"),
+        Column("menu_version", Integer, server_default="0"),
+    )
+    orders = Table(
+        "orders", metadata,
+        Column("id", Integer, primary_key=True), Column("restaurant_id", Integer), Column("created_at", DateTime),
+    )
+
+    inspector = inspect(conn)
+    for table in (restaurants, orders):
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if column.primary_key:
+                raise RuntimeError(f"{table.name} has no {column.name} column; it can't be added to existing rows")
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+            if column.server_default is not None:
+                ddl += f" DEFAULT {column.server_default.arg}"
+            conn.execute(text(ddl))
+
+    _reject_duplicate_restaurants(conn, restaurants)
+    indexes = [
+        Index("uix_restaurant_name_city", func.lower(restaurants.c.name), func.lower(restaurants.c.city), unique=True),
+        Index("ix_orders_restaurant_created", orders.c.restaurant_id, orders.c.created_at, orders.c.id, postgresql_concurrently=True),
+    ]
+    for index in indexes:
+        # Not checkfirst: SQLite reflection doesn't see the lower() expression index
+        conn.execute(CreateIndex(index, if_not_exists=True))
+
+def _reject_duplicate_restaurants(conn, restaurants):
+    name, city = func.lower(restaurants.c.name), func.lower(restaurants.c.city)
+    duplicates = conn.execute(
+        select(name, city).group_by(name, city).having(func.count() > 1)
+    ).all()
+    if not duplicates:
+        return
+    groups = []
+    for lower_name, lower_city in duplicates:
+        ids = conn.execute(
+            select(restaurants.c.id).where(name == lower_name, city == lower_city).order_by(restaurants.c.id)
+        ).scalars().all()
+        groups.append(f"{lower_name!r} in {lower_city!r}: ids {', '.join(map(str, ids))}")
+    raise RuntimeError(
+        "Restaurants share a name and city (ignoring case), so uix_restaurant_name_city can't be built. "
+        "Rename all but one of each and run the migration again: " + "; ".join(groups)
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Date, JSON, Index, func
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -9,12 +9,17 @@ class Restaurant(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     city = Column(String, index=True, default="Unknown") # New City Column
+    event_seq = Column(Integer, default=0) # Last realtime event sequence number sent to this restaurant
+    menu_version = Column(Integer, default=0) # Bumped on every category/product change, keys the menu cache
 
     users = relationship("User", back_populates="restaurant")
     categories = relationship("Category", back_populates="restaurant")
     products = relationship("Product", back_populates="restaurant")
     orders = relationship("Order", back_populates="restaurant")
 
+    # Tenant lookup key for /token and /signup: name + city are unique case-insensitively
+    __table_args__ = (Index('uix_restaurant_name_city', func.lower(name), func.lower(city), unique=True),)
+
 
 class Category(Base):
     __tablename__ = "categories"
@@ -26,6 +31,8 @@ class Category(Base):
     restaurant = relationship("Restaurant", back_populates="categories")
     products = relationship("Product", back_populates="category")
 
+    __table_args__ = (Index('ix_categories_restaurant', 'restaurant_id'),)
+
 
 from sqlalchemy import UniqueConstraint
 
@@ -58,12 +65,15 @@ class Product(Base):
     restaurant = relationship("Restaurant", back_populates="products")
     category = relationship("Category", back_populates="products")
 
+    # Menu load (WHERE restaurant_id = ?) and category checks within a restaurant
+    __table_args__ = (Index('ix_products_restaurant_category', 'restaurant_id', 'category_id'),)
+
 class Order(Base):
     __tablename__ = "orders"
 
     id = Column(Integer, primary_key=True, index=True)
     order_number = Column(Integer) # Restaurant-specific count
-    status = Column(String, default="pending") # pending, paid, preparing, ready, completed
+    status = Column(String, default="pending") # pending, paid, preparing, ready, completed, cancelled
     total_amount = Column(Float)
     payment_status = Column(String, default="unpaid")
     payment_method = Column(String, default="cash") # cash, upi, card
@@ -73,14 +83,84 @@ class Order(Base):
     restaurant = relationship("Restaurant", back_populates="orders")
     items = relationship("OrderItem", back_populates="order")
 
+    # Serves the keyset-paginated order list: WHERE restaurant_id = ? ORDER BY created_at DESC, id DESC
+    # the kitchen and active order loads: WHERE restaurant_id = ? AND status IN (...)
+    # and the archiver's batch scan: WHERE status = 'completed' AND created_at < ?
+    # Indexes are created by a revision in migrations/, not by create_all.
+    __table_args__ = (
+        Index('ix_orders_restaurant_created', 'restaurant_id', 'created_at', 'id'),
+        Index('ix_orders_restaurant_status', 'restaurant_id', 'status', 'created_at'),
+        Index('ix_orders_status_created', 'status', 'created_at'),
+    )
+
 class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Integer, default=1)
     selected_modifiers = Column(JSON, default={}) 
     
     order = relationship("Order", back_populates="items")
     product = relationship("Product")
+
+# Completed orders moved out of the hot tables by archive.py. Same columns and ids
+# as orders/order_items, so codec.order_from_orm serializes both alike.
+
+class ArchivedOrder(Base):
+    __tablename__ = "orders_archive"
+
+    id = Column(Integer, primary_key=True)
+    order_number = Column(Integer)
+    status = Column(String)
+    total_amount = Column(Float)
+    payment_status = Column(String)
+    payment_method = Column(String)
+    created_at = Column(DateTime)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"))
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    items = relationship("ArchivedOrderItem", back_populates="order")
+
+    __table_args__ = (Index('ix_orders_archive_restaurant_created', 'restaurant_id', 'created_at', 'id'),)
+
+class ArchivedOrderItem(Base):
+    __tablename__ = "order_items_archive"
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey("orders_archive.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"))
+    quantity = Column(Integer)
+    selected_modifiers = Column(JSON)
+
+    order = relationship("ArchivedOrder", back_populates="items")
+    product = relationship("Product")
+
+class OrderCounter(Base):
+    __tablename__ = "order_counters"
+
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), primary_key=True)
+    last_number = Column(Integer, default=0, nullable=False) # Last order number handed out
+    counter_date = Column(Date) # Business day (UTC) last_number belongs to, used by the daily reset
+
+# Sales rollups maintained by rollups.py in the same transaction as the order change.
+# Cancelled orders are not counted; buckets are by the order's created_at (UTC).
+
+class SalesHourly(Base):
+    __tablename__ = "sales_hourly"
+
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), primary_key=True)
+    hour = Column(DateTime, primary_key=True) # created_at truncated to the hour
+    payment_method = Column(String, primary_key=True)
+    order_count = Column(Integer, default=0, nullable=False)
+    revenue = Column(Float, default=0, nullable=False)
+    item_count = Column(Integer, default=0, nullable=False)
+
+class ProductSalesDaily(Base):
+    __tablename__ = "product_sales_daily"
+
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    quantity = Column(Integer, default=0, nullable=False)
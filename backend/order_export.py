@@ -0,0 +1,161 @@
+"""
+Streaming order history export for accounting, as NDJSON or CSV.
+
+Orders are read with a server-side cursor (stream_results + yield_per), from the
+hot and archive tables at once. The two streams are merged on (created_at, id),
+so the output is in time order across both. Each batch of EXPORT_BATCH_SIZE
+orders loads its items with a single IN query. A batch is encoded to bytes and
+handed to the StreamingResponse before the next one is read, so memory stays
+at about one batch, however many orders are exported. The DB work runs in
+database.run_db, one batch per call. The export holds one pooled connection
+per table until it finishes, or until the client goes away: the connections are
+then released on a DB worker without awaiting it, so the cancelled response
+can't skip that step.
+"""
+import io
+import os
+import csv
+import zlib
+import heapq
+import threading
+from datetime import datetime
+from sqlalchemy import select
+import database, models, codec
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+CSV_COLUMNS = (
+    "order_id", "order_number", "created_at", "status", "payment_status", "payment_method", "total_amount",
+    "product_id", "product_name", "unit_price", "quantity", "selected_modifiers",
+)
+
+def stream_orders(model, item_model, restaurant_id: int, criteria: list):
+    """Yields codec.Order for one table in (created_at, id) order, EXPORT_BATCH_SIZE orders per round trip"""
+    with database.get_db_context() as db:
+        result = db.execute(
+            select(
+                model.id, model.order_number, model.status, model.total_amount,
+                model.payment_status, model.payment_method, model.created_at
+            ).where(model.restaurant_id == restaurant_id, *criteria)
+            .order_by(model.created_at, model.id)
+            .execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+        )
+        for batch in result.partitions():
+            items: dict[int, list] = {}
+            for row in db.execute(
+                select(
+                    item_model.order_id, item_model.id, item_model.product_id, item_model.quantity,
+                    item_model.selected_modifiers, models.Product.name, models.Product.price
+                ).outerjoin(models.Product, models.Product.id == item_model.product_id)
+                .where(item_model.order_id.in_([order.id for order in batch]))
+                .order_by(item_model.order_id, item_model.id)
+            ):
+                items.setdefault(row.order_id, []).append(codec.OrderItem(
+                    id=row.id,
+                    product_id=row.product_id,
+                    product=codec.ProductRef(id=row.product_id, name=row.name, price=row.price) if row.name is not None else None,
+                    quantity=row.quantity,
+                    selected_modifiers=row.selected_modifiers,
+                ))
+            for order in batch:
+                yield codec.Order(
+                    id=order.id,
+                    order_number=order.order_number,
+                    status=order.status,
+                    total_amount=order.total_amount,
+                    payment_status=order.payment_status,
+                    payment_method=order.payment_method,
+                    items=items.get(order.id, []),
+                    created_at=order.created_at,
+                )
+
+def encode_ndjson(orders: list) -> bytes:
+    return b"".join(codec.encode(order) + b"\n" for order in orders)
+
+def encode_csv(orders: list, header: bool = False) -> bytes:
+    """One row per order item; orders without items get one row with the item columns empty"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(CSV_COLUMNS)
+    for order in orders:
+        columns = [
+            order.id, order.order_number, order.created_at.isoformat() if order.created_at else "",
+            order.status, order.payment_status, order.payment_method, order.total_amount,
+        ]
+        for item in order.items or [None]:
+            if item is None:
+                writer.writerow(columns + [""] * 5)
+                continue
+            writer.writerow(columns + [
+                item.product_id,
+                item.product.name if item.product else "",
+                item.product.price if item.product else "",
+                item.quantity,
+                codec.encode(item.selected_modifiers).decode() if item.selected_modifiers else "",
+            ])
+    return buffer.getvalue().encode()
+
+class OrderExport:
+    """Merges the hot and archive streams and hands them out as encoded chunks"""
+
+    def __init__(self, restaurant_id: int, fmt: str, hot_criteria: list, archive_criteria: list):
+        self.fmt = fmt
+        self.streams = [
+            stream_orders(models.Order, models.OrderItem, restaurant_id, hot_criteria),
+            stream_orders(models.ArchivedOrder, models.ArchivedOrderItem, restaurant_id, archive_criteria),
+        ]
+        self.orders = heapq.merge(*self.streams, key=lambda order: (order.created_at or datetime.min, order.id))
+        self.started = False
+        self.closed = False
+        # A close from the event loop waits for a chunk being read on a DB worker
+        self._lock = threading.Lock()
+
+    def next_chunk(self):
+        """Encoded bytes of the next batch, or None when done (blocking: call through run_db)"""
+        batch = []
+        with self._lock:
+            if self.closed:
+                return None
+            for order in self.orders:
+                batch.append(order)
+                if len(batch) >= EXPORT_BATCH_SIZE:
+                    break
+        if not batch and self.started:
+            return None
+        header = not self.started
+        self.started = True
+        return encode_csv(batch, header) if self.fmt == "csv" else encode_ndjson(batch)
+
+    def close(self):
+        """Releases both connections (blocking); safe to call more than once"""
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            for stream in self.streams:
+                stream.close()
+
+    async def close_soon(self):
+        """Hands close to a DB worker without awaiting it, so cancellation can't skip it"""
+        database.db_executor.submit(self.close)
+
+async def stream(export: OrderExport, gzip: bool = False):
+    """Async body for StreamingResponse; compresses on the fly when gzip is set"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    try:
+        while True:
+            chunk = await database.run_db(export.next_chunk)
+            if chunk is None:
+                break
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+        if compressor:
+            yield compressor.flush()
+    finally:
+        # Doesn't wait for the close: on a client disconnect this generator is
+        # cancelled, and waiting here would be cancelled too, leaking both connections
+        await export.close_soon()
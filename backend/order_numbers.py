@@ -0,0 +1,104 @@
+import os
+import threading
+from datetime import datetime, date
+from sqlalchemy import update, select, func, case
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import database, models
+
+# Start numbering from 1 again every business day (UTC), as printed on receipts
+ORDER_NUMBER_RESET_DAILY = os.getenv("ORDER_NUMBER_RESET_DAILY", "false").strip().lower() in ("1", "true", "yes", "on")
+# Numbers reserved per round trip. 1 keeps numbers gapless and allocates inside the
+# order's own transaction; larger blocks are cached in-process and may leave gaps on restart.
+ORDER_NUMBER_BLOCK_SIZE = max(1, int(os.getenv("ORDER_NUMBER_BLOCK_SIZE", "1")))
+
+class OrderNumberAllocator:
+    """
+    Per-restaurant order numbers from the order_counters row.
+
+    The counter is bumped with a single UPDATE ... RETURNING (Postgres, SQLite >= 3.35),
+    so concurrent kiosks always get distinct numbers and the hot path is one statement.
+    """
+
+    def __init__(self, block_size: int = ORDER_NUMBER_BLOCK_SIZE, reset_daily: bool = ORDER_NUMBER_RESET_DAILY):
+        self.block_size = block_size
+        self.reset_daily = reset_daily
+        self._lock = threading.Lock()
+        # restaurant_id -> [business_day, next_number, last_reserved_number]
+        self._blocks: dict[int, list] = {}
+
+    def allocate(self, db, restaurant_id: int) -> int:
+        """Returns the next order number for the restaurant"""
+        if self.block_size == 1:
+            # Inside the caller's transaction: a rolled back order gives its number back
+            return self._reserve(db.connection(), restaurant_id, 1)
+
+        today = self._business_day()
+        with self._lock:
+            block = self._blocks.get(restaurant_id)
+            if not block or block[0] != today or block[1] > block[2]:
+                # Reserve in an independent transaction so the block survives order rollbacks
+                with database.engine.begin() as conn:
+                    last = self._reserve(conn, restaurant_id, self.block_size)
+                block = [today, last - self.block_size + 1, last]
+                self._blocks[restaurant_id] = block
+            number = block[1]
+            block[1] += 1
+            return number
+
+    def _business_day(self) -> date:
+        return datetime.utcnow().date()
+
+    def _reserve(self, conn, restaurant_id: int, count: int) -> int:
+        """Atomically adds count to the counter and returns the new last number"""
+        last = self._bump(conn, restaurant_id, count)
+        if last is None:
+            self._create_counter(conn, restaurant_id)
+            last = self._bump(conn, restaurant_id, count)
+        return last
+
+    def _bump(self, conn, restaurant_id: int, count: int):
+        counter = models.OrderCounter
+        if self.reset_daily:
+            today = self._business_day()
+            values = {
+                counter.last_number: case(
+                    (counter.counter_date == today, counter.last_number + count),
+                    else_=count
+                ),
+                counter.counter_date: today,
+            }
+        else:
+            values = {counter.last_number: counter.last_number + count}
+
+        stmt = update(counter).where(counter.restaurant_id == restaurant_id).values(values)
+        if conn.dialect.update_returning:
+            return conn.execute(stmt.returning(counter.last_number)).scalar()
+        if conn.execute(stmt).rowcount == 0:
+            return None
+        return conn.execute(
+            select(counter.last_number).where(counter.restaurant_id == restaurant_id)
+        ).scalar()
+
+    def _create_counter(self, conn, restaurant_id: int):
+        """Creates the counter row, continuing from the restaurant's existing orders"""
+        today = self._business_day()
+        seed_query = select(func.max(models.Order.order_number)).where(models.Order.restaurant_id == restaurant_id)
+        if self.reset_daily:
+            seed_query = seed_query.where(models.Order.created_at >= datetime.combine(today, datetime.min.time()))
+        seed = conn.execute(seed_query).scalar() or 0
+        if not self.reset_daily:
+            # Older numbers may have moved to the archive (today's never do)
+            archived = select(func.max(models.ArchivedOrder.order_number)).where(models.ArchivedOrder.restaurant_id == restaurant_id)
+            seed = max(seed, conn.execute(archived).scalar() or 0)
+
+        values = {"restaurant_id": restaurant_id, "last_number": seed, "counter_date": today}
+        if conn.dialect.name == "postgresql":
+            stmt = pg_insert(models.OrderCounter).values(**values).on_conflict_do_nothing(index_elements=["restaurant_id"])
+        elif conn.dialect.name == "sqlite":
+            stmt = sqlite_insert(models.OrderCounter).values(**values).on_conflict_do_nothing(index_elements=["restaurant_id"])
+        else:
+            stmt = models.OrderCounter.__table__.insert().values(**values)
+        conn.execute(stmt)
+
+allocator = OrderNumberAllocator()
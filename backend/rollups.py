@@ -0,0 +1,221 @@
+"""
+Sales rollups for the admin dashboard.
+
+sales_hourly keeps orders, revenue and items per (restaurant, hour, payment method).
+product_sales_daily keeps quantity sold per (restaurant, day, product).
+create_order and update_order_status update them inside the transaction that
+changes the order, so they are never out of step with the orders themselves.
+Cancelled orders are not counted: cancelling takes an order back out of its
+buckets, and un-cancelling puts it back. /stats reads at most a month of hourly
+rows, whatever the size of the order history. Days start at the caller's local
+midnight (utc_offset): the hourly rows are regrouped into local days, while top
+products count the UTC days with the same dates.
+
+Rebuild from orders and orders_archive (from backend/):
+    python rollups.py backfill [--restaurant ID]
+"""
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, update, func, or_, desc
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import database, models
+
+logger = logging.getLogger("ordera.rollups")
+
+# period -> (bucket, number of buckets)
+PERIODS = {"day": ("hour", 24), "week": ("day", 7), "month": ("day", 30)}
+TOP_PRODUCTS = 10
+# Offsets in use run from UTC-12 to UTC+14
+MAX_UTC_OFFSET_MINUTES = 14 * 60
+
+def counted(status) -> bool:
+    return status != "cancelled"
+
+def hour_bucket(created_at: datetime) -> datetime:
+    return created_at.replace(minute=0, second=0, microsecond=0)
+
+def _increment(db, model, keys: dict, amounts: dict):
+    """INSERT ... ON CONFLICT DO UPDATE SET column = column + amount"""
+    table = model.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = pg_insert if dialect == "postgresql" else sqlite_insert
+        stmt = insert(table).values(**keys, **amounts)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={column: table.c[column] + stmt.excluded[column] for column in amounts}
+        )
+        db.execute(stmt)
+        return
+    match = [table.c[column] == value for column, value in keys.items()]
+    result = db.execute(update(table).where(*match).values({column: table.c[column] + amount for column, amount in amounts.items()}))
+    if result.rowcount == 0:
+        db.execute(table.insert().values(**keys, **amounts))
+
+def record_order(db, restaurant_id: int, order, sign: int = 1):
+    """Adds (sign=1) or removes (sign=-1) one order, with its items, from the rollups"""
+    created_at = order.created_at or datetime.utcnow()
+    quantities: dict[int, int] = {}
+    for item in order.items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + (item.quantity or 0)
+
+    _increment(db, models.SalesHourly, {
+        "restaurant_id": restaurant_id,
+        "hour": hour_bucket(created_at),
+        "payment_method": order.payment_method or "unknown",
+    }, {
+        "order_count": sign,
+        "revenue": sign * (order.total_amount or 0.0),
+        "item_count": sign * sum(quantities.values()),
+    })
+    for product_id, quantity in quantities.items():
+        _increment(db, models.ProductSalesDaily, {
+            "restaurant_id": restaurant_id, "day": created_at.date(), "product_id": product_id,
+        }, {"quantity": sign * quantity})
+
+def record_status_change(db, restaurant_id: int, order, previous_status):
+    """Call after setting order.status; only a move into or out of 'cancelled' changes the rollups"""
+    if counted(previous_status) != counted(order.status):
+        record_order(db, restaurant_id, order, 1 if counted(order.status) else -1)
+
+def backfill_restaurant(restaurant_id: int) -> int:
+    """Recomputes one restaurant's rollups from its hot and archived orders; returns orders counted"""
+    with database.get_db_context() as db:
+        # Taken first: create_order and status changes lock the same row (next_event_seq)
+        # before touching the rollups, so they wait for the rebuild instead of being lost
+        db.query(models.Restaurant.id).filter(models.Restaurant.id == restaurant_id).with_for_update().first()
+        db.execute(delete(models.SalesHourly).where(models.SalesHourly.restaurant_id == restaurant_id))
+        db.execute(delete(models.ProductSalesDaily).where(models.ProductSalesDaily.restaurant_id == restaurant_id))
+
+        hourly: dict[tuple, list] = {}
+        daily: dict[tuple, int] = {}
+        orders = 0
+        for order, item in ((models.Order, models.OrderItem), (models.ArchivedOrder, models.ArchivedOrderItem)):
+            rows = db.execute(
+                select(order.id, order.created_at, order.payment_method, order.total_amount, item.product_id, item.quantity)
+                .outerjoin(item, item.order_id == order.id)
+                .where(order.restaurant_id == restaurant_id, or_(order.status.is_(None), order.status != "cancelled"))
+                .order_by(order.id)
+                .execution_options(yield_per=1000)
+            )
+            last_id = None
+            for order_id, created_at, payment_method, total_amount, product_id, quantity in rows:
+                created_at = created_at or datetime.utcnow()
+                bucket = hourly.setdefault((hour_bucket(created_at), payment_method or "unknown"), [0, 0.0, 0])
+                if order_id != last_id:
+                    last_id = order_id
+                    orders += 1
+                    bucket[0] += 1
+                    bucket[1] += total_amount or 0.0
+                if product_id is not None:
+                    bucket[2] += quantity or 0
+                    key = (created_at.date(), product_id)
+                    daily[key] = daily.get(key, 0) + (quantity or 0)
+
+        if hourly:
+            db.execute(models.SalesHourly.__table__.insert(), [
+                {"restaurant_id": restaurant_id, "hour": hour, "payment_method": method,
+                 "order_count": count, "revenue": revenue, "item_count": items}
+                for (hour, method), (count, revenue, items) in hourly.items()
+            ])
+        if daily:
+            db.execute(models.ProductSalesDaily.__table__.insert(), [
+                {"restaurant_id": restaurant_id, "day": day, "product_id": product_id, "quantity": quantity}
+                for (day, product_id), quantity in daily.items()
+            ])
+        db.commit()
+        return orders
+
+def backfill(restaurant_id: int = None) -> int:
+    """Rebuilds the rollups of one restaurant or all of them, one transaction per restaurant"""
+    if restaurant_id is not None:
+        return backfill_restaurant(restaurant_id)
+    with database.get_db_context() as db:
+        restaurant_ids = [row.id for row in db.query(models.Restaurant.id).order_by(models.Restaurant.id)]
+    total = 0
+    for rid in restaurant_ids:
+        counted_orders = backfill_restaurant(rid)
+        logger.info("Rollups rebuilt", extra={"fields": {"restaurant_id": rid, "orders": counted_orders}})
+        total += counted_orders
+    return total
+
+def stats(restaurant_id: int, period: str = "day", now: datetime = None, utc_offset: int = 0) -> dict:
+    """
+    Totals, payment method split, a zero-filled series and the top products for
+    the current day (hourly), or the last 7 / 30 days (daily), in the time zone
+    utc_offset minutes east of UTC. Series and range times are UTC.
+    """
+    bucket, count = PERIODS[period]
+    offset = timedelta(minutes=utc_offset)
+    now = now or datetime.utcnow()
+    today = (now + offset).replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == "hour":
+        start, step = today, timedelta(hours=1)
+    else:
+        start, step = today - timedelta(days=count - 1), timedelta(days=1)
+    end = start + step * count
+    first_day, last_day = start.date(), end.date()
+    # Local midnight in UTC; rows are whole UTC hours, so a half-hour offset
+    # starts the day at the next whole hour
+    start, end = start - offset, end - offset
+
+    with database.get_db_context() as db:
+        rows = db.query(models.SalesHourly).filter(
+            models.SalesHourly.restaurant_id == restaurant_id,
+            models.SalesHourly.hour >= start,
+            models.SalesHourly.hour < end
+        ).all()
+        top = db.query(
+            models.ProductSalesDaily.product_id, models.Product.name, func.sum(models.ProductSalesDaily.quantity).label("quantity")
+        ).outerjoin(models.Product, models.Product.id == models.ProductSalesDaily.product_id).filter(
+            models.ProductSalesDaily.restaurant_id == restaurant_id,
+            models.ProductSalesDaily.day >= first_day,
+            models.ProductSalesDaily.day < last_day
+        ).group_by(models.ProductSalesDaily.product_id, models.Product.name).order_by(desc("quantity")).limit(TOP_PRODUCTS).all()
+
+    series = [{"start": start + step * i, "orders": 0, "revenue": 0.0, "items": 0} for i in range(count)]
+    by_payment_method: dict[str, dict] = {}
+    for row in rows:
+        point = series[int((row.hour - start) / step)]
+        point["orders"] += row.order_count
+        point["revenue"] += row.revenue
+        point["items"] += row.item_count
+        method = by_payment_method.setdefault(row.payment_method, {"orders": 0, "revenue": 0.0})
+        method["orders"] += row.order_count
+        method["revenue"] += row.revenue
+
+    orders = sum(point["orders"] for point in series)
+    revenue = sum(point["revenue"] for point in series)
+    for point in series:
+        point["start"] = point["start"].isoformat()
+        point["revenue"] = round(point["revenue"], 2)
+    for method in by_payment_method.values():
+        method["revenue"] = round(method["revenue"], 2)
+
+    return {
+        "period": period,
+        "bucket": bucket,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "utc_offset": utc_offset,
+        "totals": {
+            "orders": orders,
+            "revenue": round(revenue, 2),
+            "items": sum(point["items"] for point in series),
+            "average_order_value": round(revenue / orders, 2) if orders else 0.0,
+        },
+        "by_payment_method": by_payment_method,
+        "series": series,
+        "top_products": [{"product_id": row.product_id, "name": row.name, "quantity": row.quantity} for row in top],
+    }
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Rebuild the sales rollups from the order tables")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--restaurant", type=int, help="only this restaurant id")
+    args = parser.parse_args()
+    import migrate
+    migrate.upgrade()
+    print(f"Rolled up {backfill(args.restaurant)} orders")
@@ -0,0 +1,259 @@
+"""
+Static serving for /uploads.
+
+Uploaded images are stored under their SHA-256 (see uploads.py), so a URL never
+changes content: hashed names are served with a one year `immutable` Cache-Control
+and kiosks stop revalidating them. Other files get `no-cache` and are revalidated
+with their strong ETag. Range requests, If-None-Match / If-Range, precompressed
+.br/.gz siblings for text assets and an in-memory LRU of small hot files are handled
+here; large bodies go out through the server's zero-copy send when it offers one.
+"""
+import os
+import re
+import mimetypes
+import collections
+from email.utils import formatdate
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from menu_cache import etag_matches
+
+STATIC_IMMUTABLE_MAX_AGE = int(os.getenv("STATIC_IMMUTABLE_MAX_AGE", str(365 * 24 * 3600)))
+# Files up to this size are kept in memory once read; the whole cache is bounded too
+STATIC_CACHE_MAX_FILE_BYTES = int(os.getenv("STATIC_CACHE_MAX_FILE_BYTES", str(256 * 1024)))
+STATIC_CACHE_BYTES = int(os.getenv("STATIC_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+CHUNK_SIZE = 64 * 1024
+
+# <sha256>.<ext> originals and <sha256>_<size>.<format> variants
+_HASHED_NAME = re.compile(r"^[0-9a-f]{64}(_[a-z]+)?\.[a-z0-9]+$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Only text formats benefit from .br/.gz siblings; images are already compressed
+COMPRESSIBLE_TYPES = {"image/svg+xml", "application/json", "text/css", "text/plain", "application/javascript", "text/javascript"}
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+def is_content_hashed(filename: str) -> bool:
+    return bool(_HASHED_NAME.match(filename))
+
+class StaticFile:
+    """Stat result and validators of one file (one encoding) on disk"""
+    __slots__ = ("path", "size", "mtime_ns", "etag", "last_modified", "data")
+
+    def __init__(self, path: str, stat: os.stat_result, etag: str, data: bytes = None):
+        self.path = path
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self.etag = etag
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.data = data
+
+class HotFileCache:
+    """LRU of small file bodies, bounded by total bytes. Used from the event loop only."""
+
+    def __init__(self, max_bytes: int = STATIC_CACHE_BYTES, max_file_bytes: int = STATIC_CACHE_MAX_FILE_BYTES):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._files: collections.OrderedDict[str, StaticFile] = collections.OrderedDict()
+
+    def get(self, path: str):
+        entry = self._files.get(path)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._files.move_to_end(path)
+        return entry
+
+    def put(self, entry: StaticFile):
+        if entry.data is None or entry.size > self.max_file_bytes:
+            return
+        self.discard(entry.path)
+        self._files[entry.path] = entry
+        self.bytes += entry.size
+        while self.bytes > self.max_bytes and self._files:
+            _, evicted = self._files.popitem(last=False)
+            self.bytes -= evicted.size
+
+    def discard(self, path: str):
+        entry = self._files.pop(path, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def stats(self) -> dict:
+        return {"files": len(self._files), "bytes": self.bytes, "hits": self.hits, "misses": self.misses}
+
+hot_files = HotFileCache()
+
+def _load(path: str, etag_suffix: str, immutable: bool, max_file_bytes: int) -> StaticFile:
+    stat = os.stat(path)
+    if immutable:
+        # The name is the content hash (plus variant and encoding), nothing else can change
+        etag = f'"{os.path.basename(path)}"'
+    else:
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{etag_suffix}"'
+    data = None
+    if stat.st_size <= max_file_bytes:
+        with open(path, "rb") as f:
+            data = f.read()
+    return StaticFile(path, stat, etag, data)
+
+def _accepted_encodings(request: Request) -> set:
+    header = request.headers.get("accept-encoding", "")
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name.lower())
+    return accepted
+
+def parse_range(header: str, size: int):
+    """
+    Returns (start, end) inclusive for a single satisfiable byte range, None to ignore
+    the header (malformed or multiple ranges: the full body is sent) or False when it
+    cannot be satisfied.
+    """
+    match = _RANGE.match(header.replace(" ", ""))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    return start, end
+
+class StaticFileResponse(Response):
+    """Body of a file (or a slice of it) from memory, zero-copy send or chunked reads"""
+
+    def __init__(self, entry: StaticFile, status_code: int, headers: dict, media_type: str,
+                 start: int = 0, end: int = None, send_body: bool = True):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.entry = entry
+        self.start = start
+        self.end = entry.size - 1 if end is None else end
+        self.send_body = send_body
+        self.headers["content-length"] = str(max(self.end - self.start + 1, 0))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        count = self.end - self.start + 1
+        if not self.send_body or count <= 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        if self.entry.data is not None:
+            await send({"type": "http.response.body", "body": self.entry.data[self.start:self.end + 1]})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if "http.response.zerocopysend" in extensions:
+            # sendfile(2) from the file descriptor, the bytes never enter Python
+            with open(self.entry.path, "rb") as f:
+                await send({"type": "http.response.zerocopysend", "file": f, "offset": self.start, "count": count})
+            return
+        if "http.response.pathsend" in extensions and self.start == 0 and count == self.entry.size:
+            await send({"type": "http.response.pathsend", "path": os.path.abspath(self.entry.path)})
+            return
+
+        f = await run_in_threadpool(open, self.entry.path, "rb")
+        try:
+            await run_in_threadpool(f.seek, self.start)
+            remaining = count
+            while remaining > 0:
+                chunk = await run_in_threadpool(f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            await run_in_threadpool(f.close)
+
+async def _open_entry(path: str, etag_suffix: str, immutable: bool):
+    """Cached entry for the path, re-validated against the file unless its name is content-hashed"""
+    entry = hot_files.get(path)
+    if entry is not None and immutable:
+        return entry
+    if entry is not None:
+        try:
+            stat = await run_in_threadpool(os.stat, path)
+        except FileNotFoundError:
+            hot_files.discard(path)
+            return None
+        if stat.st_mtime_ns == entry.mtime_ns and stat.st_size == entry.size:
+            return entry
+        hot_files.discard(path)
+    try:
+        entry = await run_in_threadpool(_load, path, etag_suffix, immutable, hot_files.max_file_bytes)
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+        return None
+    hot_files.put(entry)
+    return entry
+
+async def serve_file(request: Request, path: str, media_type: str = None, headers: dict = None) -> Response:
+    """
+    Serves a file with caching validators; returns 404 if it does not exist.
+    A Cache-Control passed in headers overrides the one derived from the name.
+    """
+    filename = os.path.basename(path)
+    immutable = is_content_hashed(filename)
+    media_type = media_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    response_headers = dict(headers or {})
+
+    entry = None
+    encoding = None
+    if media_type in COMPRESSIBLE_TYPES:
+        response_headers["Vary"] = ", ".join(filter(None, [response_headers.get("Vary"), "Accept-Encoding"]))
+        accepted = _accepted_encodings(request)
+        for name, suffix in PRECOMPRESSED:
+            if name in accepted:
+                entry = await _open_entry(path + suffix, f"-{name}", immutable)
+                if entry is not None:
+                    encoding = name
+                    break
+    if entry is None:
+        entry = await _open_entry(path, "", immutable)
+    if entry is None:
+        return Response(status_code=404)
+
+    if encoding:
+        response_headers["Content-Encoding"] = encoding
+    response_headers.update({
+        "ETag": entry.etag,
+        "Last-Modified": entry.last_modified,
+        "Accept-Ranges": "bytes",
+    })
+    response_headers.setdefault(
+        "Cache-Control", f"public, max-age={STATIC_IMMUTABLE_MAX_AGE}, immutable" if immutable else "no-cache"
+    )
+    if etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=response_headers)
+
+    send_body = request.method != "HEAD"
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == entry.etag):
+        byte_range = parse_range(range_header, entry.size)
+        if byte_range is False:
+            response_headers["Content-Range"] = f"bytes */{entry.size}"
+            return Response(status_code=416, headers=response_headers)
+        if byte_range:
+            start, end = byte_range
+            response_headers["Content-Range"] = f"bytes {start}-{end}/{entry.size}"
+            return StaticFileResponse(entry, 206, response_headers, media_type, start, end, send_body)
+
+    return StaticFileResponse(entry, 200, response_headers, media_type, send_body=send_body)
@@ -0,0 +1,65 @@
+import os
+import threading
+import collections
+from sqlalchemy import func
+import models
+
+# Restaurants resolved by (name, city) kept in this process
+TENANT_CACHE_SIZE = int(os.getenv("TENANT_CACHE_SIZE", "1024"))
+
+def tenant_key(name: str, city: str) -> tuple:
+    """Normalized lookup key, matching the lower(name), lower(city) unique index"""
+    return (name.strip().lower(), city.strip().lower())
+
+class TenantCache:
+    """
+    Maps (name, city) to restaurant id and metadata so /token does not re-resolve
+    the tenant on every login. Only found restaurants are cached.
+    Accessed from DB worker threads, hence the lock.
+    """
+
+    def __init__(self, maxsize: int = TENANT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: collections.OrderedDict[tuple, dict] = collections.OrderedDict()
+
+    def get(self, name: str, city: str):
+        key = tenant_key(name, city)
+        with self._lock:
+            tenant = self._entries.get(key)
+            if tenant:
+                self._entries.move_to_end(key)
+            return tenant
+
+    def put(self, tenant: dict):
+        key = tenant_key(tenant["name"], tenant["city"])
+        with self._lock:
+            self._entries[key] = tenant
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, name: str, city: str):
+        with self._lock:
+            self._entries.pop(tenant_key(name, city), None)
+
+cache = TenantCache()
+
+def find_restaurant(db, name: str, city: str):
+    """
+    Resolves a restaurant by name and city, case-insensitively, through the
+    unique (lower(name), lower(city)) index. Returns {"id", "name", "city"} or None.
+    """
+    tenant = cache.get(name, city)
+    if tenant:
+        return tenant
+    name_key, city_key = tenant_key(name, city)
+    row = db.query(models.Restaurant.id, models.Restaurant.name, models.Restaurant.city).filter(
+        func.lower(models.Restaurant.name) == name_key,
+        func.lower(models.Restaurant.city) == city_key
+    ).first()
+    if not row:
+        return None
+    tenant = {"id": row.id, "name": row.name, "city": row.city}
+    cache.put(tenant)
+    return tenant
@@ -0,0 +1,72 @@
+-- Schema of a database built by Base.metadata.create_all before migrations/ existed
+-- (models.py at the baseline commit, SQLite). Used to test upgrading such databases.
+CREATE TABLE restaurants (
+	id INTEGER NOT NULL,
+	name VARCHAR,
+	city VARCHAR,
+	PRIMARY KEY (id)
+);
+CREATE INDEX ix_restaurants_name ON restaurants (name);
+CREATE INDEX ix_restaurants_city ON restaurants (city);
+CREATE INDEX ix_restaurants_id ON restaurants (id);
+CREATE TABLE categories (
+	id INTEGER NOT NULL,
+	name VARCHAR,
+	restaurant_id INTEGER,
+	PRIMARY KEY (id),
+	FOREIGN KEY(restaurant_id) REFERENCES restaurants (id)
+);
+CREATE INDEX ix_categories_name ON categories (name);
+CREATE INDEX ix_categories_id ON categories (id);
+CREATE TABLE users (
+	id INTEGER NOT NULL,
+	username VARCHAR,
+	hashed_password VARCHAR,
+	role VARCHAR,
+	restaurant_id INTEGER,
+	PRIMARY KEY (id),
+	CONSTRAINT uix_restaurant_username UNIQUE (restaurant_id, username),
+	FOREIGN KEY(restaurant_id) REFERENCES restaurants (id)
+);
+CREATE INDEX ix_users_id ON users (id);
+CREATE INDEX ix_users_username ON users (username);
+CREATE TABLE orders (
+	id INTEGER NOT NULL,
+	order_number INTEGER,
+	status VARCHAR,
+	total_amount FLOAT,
+	payment_status VARCHAR,
+	payment_method VARCHAR,
+	created_at DATETIME,
+	restaurant_id INTEGER,
+	PRIMARY KEY (id),
+	FOREIGN KEY(restaurant_id) REFERENCES restaurants (id)
+);
+CREATE INDEX ix_orders_id ON orders (id);
+CREATE TABLE products (
+	id INTEGER NOT NULL,
+	name VARCHAR,
+	description VARCHAR,
+	price FLOAT,
+	image_url VARCHAR,
+	category_id INTEGER,
+	is_available BOOLEAN,
+	modifiers JSON,
+	restaurant_id INTEGER,
+	PRIMARY KEY (id),
+	FOREIGN KEY(category_id) REFERENCES categories (id),
+	FOREIGN KEY(restaurant_id) REFERENCES restaurants (id)
+);
+CREATE INDEX ix_products_name ON products (name);
+CREATE INDEX ix_products_id ON products (id);
+CREATE TABLE order_items (
+	id INTEGER NOT NULL,
+	order_id INTEGER,
+	product_id INTEGER,
+	quantity INTEGER,
+	selected_modifiers JSON,
+	PRIMARY KEY (id),
+	FOREIGN KEY(order_id) REFERENCES orders (id),
+	FOREIGN KEY(product_id) REFERENCES products (id)
+);
+CREATE INDEX ix_order_items_id ON order_items (id);
@@ -0,0 +1,85 @@
+import sys
+import json
+import logging
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+import access_log
+
+@pytest.fixture
+def access_records(caplog):
+    caplog.set_level(logging.INFO, logger="ordera.access")
+    return lambda: [record for record in caplog.records if record.name == "ordera.access"]
+
+def test_errors_are_logged_with_route_template_tenant_and_db_time(client, tenant, access_records):
+    response = client.put("/orders/987654/status?status_update=paid", headers=tenant["headers"])
+    assert response.status_code == 404
+
+    [record] = access_records()
+    assert record.levelno == logging.WARNING
+    fields = record.fields
+    assert fields["method"] == "PUT"
+    assert fields["route"] == "/orders/{order_id:int}/status"
+    assert fields["path"] == "/orders/987654/status"
+    assert fields["status"] == 404
+    assert fields["bytes"] == len(response.content)
+    assert fields["restaurant_id"] == tenant["id"]
+    assert fields["db_queries"] >= 1
+    assert fields["db_ms"] >= 0
+
+def test_unmatched_paths(client, access_records):
+    assert client.get("/no/such/page").status_code == 404
+    [record] = access_records()
+    assert record.fields["route"] == "<unmatched>"
+    assert record.fields["restaurant_id"] is None
+
+def _app():
+    async def ok(request):
+        return PlainTextResponse("ok")
+
+    async def boom(request):
+        raise RuntimeError("boom")
+
+    routes = [Route("/ok", ok), Route("/boom", boom)]
+    return Starlette(routes=routes), routes
+
+def test_successes_are_sampled(access_records):
+    app, routes = _app()
+    sampled_out = TestClient(access_log.AccessLogMiddleware(app, routes=routes, sample_rate=0))
+    sampled_in = TestClient(access_log.AccessLogMiddleware(app, routes=routes, sample_rate=1))
+    sampled_out.get("/ok")
+    assert access_records() == []
+    sampled_in.get("/ok")
+    [record] = access_records()
+    assert record.levelno == logging.INFO
+    assert record.fields["route"] == "/ok"
+    assert record.fields["bytes"] == 2
+
+def test_slow_requests_are_always_logged(access_records):
+    app, routes = _app()
+    TestClient(access_log.AccessLogMiddleware(app, routes=routes, sample_rate=0, slow_ms=0)).get("/ok")
+    assert len(access_records()) == 1
+
+def test_unhandled_exceptions_are_logged_as_500(access_records):
+    app, routes = _app()
+    with pytest.raises(RuntimeError):
+        TestClient(access_log.AccessLogMiddleware(app, routes=routes, sample_rate=0)).get("/boom")
+    [record] = access_records()
+    assert record.levelno == logging.ERROR
+    assert record.fields["status"] == 500
+
+def test_json_formatter_merges_fields_and_tracebacks():
+    record = logging.LogRecord("ordera.test", logging.ERROR, __file__, 1, "failed %s", ("twice",), None)
+    record.fields = {"order_id": 7}
+    try:
+        raise ValueError("bad")
+    except ValueError:
+        record.exc_info = sys.exc_info()
+    entry = json.loads(access_log.JsonFormatter().format(record))
+    assert entry["msg"] == "failed twice"
+    assert entry["level"] == "ERROR"
+    assert entry["logger"] == "ordera.test"
+    assert entry["order_id"] == 7
+    assert "ValueError: bad" in entry["exc"]
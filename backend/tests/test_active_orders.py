@@ -0,0 +1,74 @@
+import json
+import time
+import codec
+import active_orders
+import ws_manager
+from conftest import place_order
+
+def order(order_id: int, status: str = "pending", modifiers=None) -> codec.Order:
+    items = [codec.OrderItem(id=order_id, product_id=1, product=None, quantity=1, selected_modifiers=modifiers or {})]
+    return codec.Order(id=order_id, order_number=order_id, status=status, total_amount=1.0,
+                       payment_status="unpaid", payment_method="cash", items=items, created_at=None)
+
+def test_projection_drops_duplicate_and_stale_events():
+    projection = active_orders.RestaurantProjection(1, 10, [order(1)])
+    assert not projection.apply(10, order(2))  # already in the loaded state
+    assert projection.apply(11, order(2))
+    assert not projection.apply(11, order(2, "paid"))
+    assert projection.apply(12, order(2, "paid"))
+    assert not projection.apply(11, order(2, "pending"))
+    assert projection.orders[2].order.status == "paid"
+    assert projection.version == 2
+
+def test_finished_orders_are_not_revived_by_late_events():
+    projection = active_orders.RestaurantProjection(1, 0, [order(1)])
+    assert projection.apply(5, order(1, "completed"))
+    assert 1 not in projection.orders
+    assert not projection.apply(4, order(1, "preparing"))
+    assert 1 not in projection.orders
+
+def test_body_is_newest_first_and_rebuilt_on_change():
+    projection = active_orders.RestaurantProjection(1, 0, [order(1), order(2)])
+    assert [o["id"] for o in json.loads(projection.body())] == [2, 1]
+    etag = projection.etag()
+    projection.apply(1, order(3))
+    assert [o["id"] for o in json.loads(projection.body())] == [3, 2, 1]
+    assert projection.etag() != etag
+
+def test_modifier_selections_are_shared():
+    first = active_orders.ActiveOrder(1, order(1, modifiers={"size": "M"}))
+    second = active_orders.ActiveOrder(1, order(2, modifiers={"size": "M"}))
+    assert first.order.items[0].selected_modifiers is second.order.items[0].selected_modifiers
+
+def active(client, tenant, **headers):
+    return client.get("/orders/active", headers={**tenant["headers"], **headers})
+
+def test_active_orders_endpoint_follows_order_events(client, tenant, product):
+    first = place_order(client, tenant, product)
+    response = active(client, tenant)
+    assert [o["id"] for o in response.json()] == [first["id"]]
+    etag = response.headers["etag"]
+
+    # Served from memory, revalidated by ETag
+    cached = active(client, tenant, **{"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["x-db-queries"] == "0"
+
+    second = place_order(client, tenant, product)
+    client.put(f"/orders/{first['id']}/status?status_update=completed", headers=tenant["headers"])
+    response = active(client, tenant, **{"If-None-Match": etag})
+    assert response.status_code == 200
+    assert [o["id"] for o in response.json()] == [second["id"]]
+    assert response.headers["etag"] != etag
+
+def test_events_from_other_processes_reach_the_projection(client, tenant, product):
+    placed = place_order(client, tenant, product)
+    projection = client.portal.call(active_orders.store.get, tenant["id"])
+    # Published by another worker: only the broadcast channel carries it here
+    event = codec.OrderEvent(event="status_update", seq=projection.orders[placed["id"]].seq + 1,
+                             order_id=placed["id"], order=order(placed["id"], "cancelled"), status="cancelled")
+    client.portal.call(ws_manager.manager.broadcast_to_restaurant, codec.encode(event).decode(), tenant["id"])
+    deadline = time.monotonic() + 2
+    while placed["id"] in projection.orders and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert active(client, tenant).json() == []
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+from conftest import place_order
+import archive
+import database
+import models
+
+def finished_long_ago(client, tenant, product, count: int = 2) -> list[int]:
+    """Places `count` orders, completes them and backdates them past the archive age"""
+    ids = []
+    for _ in range(count):
+        order = place_order(client, tenant, product)
+        client.put(f"/orders/{order['id']}/status?status_update=completed", headers=tenant["headers"])
+        ids.append(order["id"])
+    with database.get_db_context() as db:
+        db.query(models.Order).filter(models.Order.id.in_(ids)).update(
+            {models.Order.created_at: datetime.utcnow() - timedelta(days=archive.ORDER_ARCHIVE_AFTER_DAYS + 1)},
+            synchronize_session=False
+        )
+        db.commit()
+    # The newest order always stays hot
+    place_order(client, tenant, product)
+    return ids
+
+def listed(client, tenant, **params) -> set[int]:
+    return {order["id"] for order in client.get("/orders/", headers=tenant["headers"], params=params).json()}
+
+def test_old_completed_orders_move_to_the_archive(client, tenant, product):
+    ids = finished_long_ago(client, tenant, product)
+    assert client.portal.call(archive.archive_pass) >= len(ids)
+
+    with database.get_db_context() as db:
+        assert db.query(models.Order).filter(models.Order.id.in_(ids)).count() == 0
+        archived = db.query(models.ArchivedOrder).filter(models.ArchivedOrder.id.in_(ids)).all()
+        assert {order.id for order in archived} == set(ids)
+        assert db.query(models.ArchivedOrderItem).filter(models.ArchivedOrderItem.order_id.in_(ids)).count() == len(ids)
+    assert not listed(client, tenant) & set(ids)
+    assert set(ids) <= listed(client, tenant, history="true")
+
+def test_only_one_process_archives_at_a_time(client, tenant, product):
+    ids = finished_long_ago(client, tenant, product)
+    # Another worker is mid-batch
+    with archive.archive_lock() as locked:
+        assert locked
+        assert archive.archive_batch(archive.archive_cutoff()) == 0
+        with database.get_db_context() as db:
+            assert db.query(models.Order).filter(models.Order.id.in_(ids)).count() == len(ids)
+    assert archive.archive_completed() >= len(ids)
@@ -0,0 +1,94 @@
+import asyncio
+from datetime import timedelta
+from conftest import PASSWORD
+import auth, database, models
+
+def token(**claims):
+    return auth.create_access_token({"sub": "admin", "role": "admin", "restaurant_id": 1, **claims})
+
+def test_cached_token_skips_verification(monkeypatch):
+    cache = auth.TokenCache(maxsize=8)
+    issued = token()
+    assert cache.decode(issued)["sub"] == "admin"
+
+    calls = []
+    monkeypatch.setattr(auth, "decode_token", lambda t: calls.append(t))
+    assert cache.decode(issued)["restaurant_id"] == 1
+    assert calls == []
+
+def test_tampered_payload_is_not_served_from_the_cache():
+    cache = auth.TokenCache(maxsize=8)
+    issued = token()
+    cache.decode(issued)
+    header, _, signature = issued.split(".")
+    forged_payload = token(restaurant_id=2).split(".")[1]
+    assert cache.decode(f"{header}.{forged_payload}.{signature}") is None
+
+def test_expired_token_is_rejected_even_when_cached():
+    cache = auth.TokenCache(maxsize=8)
+    issued = token()
+    payload = cache.decode(issued)
+    payload["exp"] = 1  # as if it expired since it was cached
+    assert cache.decode(issued) is None
+    assert cache.decode(auth.create_access_token({"sub": "x"}, expires_delta=timedelta(seconds=-5))) is None
+
+def test_cache_is_bounded_least_recently_used_first():
+    cache = auth.TokenCache(maxsize=2)
+    first, second, third = token(n=1), token(n=2), token(n=3)
+    cache.decode(first)
+    cache.decode(second)
+    cache.decode(first)
+    cache.decode(third)
+    signatures = set(cache._entries)
+    assert first.rsplit(".", 1)[1] in signatures
+    assert second.rsplit(".", 1)[1] not in signatures
+
+def test_requests_without_a_valid_token_are_unauthorized(client):
+    assert client.get("/orders/").status_code == 401
+    assert client.get("/orders/", headers={"Authorization": "Bearer nonsense"}).status_code == 401
+    assert client.get("/orders/", headers={"Authorization": f"Basic {token()}"}).status_code == 401
+
+def test_bearer_token_reaches_the_handler(client, tenant):
+    assert client.get("/orders/", headers=tenant["headers"]).status_code == 200
+
+def test_scrypt_hashes_are_salted_and_verify():
+    first, second = auth.get_password_hash("secret"), auth.get_password_hash("secret")
+    assert first != second
+    assert first.startswith(f"scrypt${auth.PASSWORD_SCRYPT_N}$")
+    assert auth.verify_password("secret", first)
+    assert not auth.verify_password("Secret", first)
+    assert not auth.verify_password("secret", "scrypt$garbage")
+
+def test_outdated_hashes_need_a_rehash():
+    assert auth.needs_rehash(auth._legacy_hash("secret"))
+    assert auth.needs_rehash(f"scrypt${auth.PASSWORD_SCRYPT_N * 2}$8$1$c2FsdA$ZGlnZXN0")
+    assert not auth.needs_rehash(auth.get_password_hash("secret"))
+
+def test_full_pool_refuses_instead_of_queueing():
+    hasher = auth.PasswordHasher(workers=1, max_pending=2)
+
+    async def main():
+        return await asyncio.gather(*(hasher.hash("secret") for _ in range(4)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert sum(isinstance(r, auth.PasswordHashBusy) for r in results) == 2
+    stats = hasher.stats()
+    assert (stats["completed"], stats["rejected"], stats["pending"]) == (2, 2, 0)
+
+def test_login_upgrades_a_legacy_hash(client, tenant):
+    with database.get_db_context() as db:
+        user = db.query(models.User).filter(models.User.restaurant_id == tenant["id"]).one()
+        user.hashed_password = auth._legacy_hash(PASSWORD)
+        db.commit()
+
+    credentials = {"restaurant_name": tenant["name"], "city": tenant["city"], "username": "admin", "password": PASSWORD}
+    assert client.post("/token", json=credentials).status_code == 200
+    with database.get_db_context() as db:
+        stored = db.query(models.User.hashed_password).filter(models.User.restaurant_id == tenant["id"]).scalar()
+    assert stored.startswith("scrypt$")
+    assert client.post("/token", json={**credentials, "password": "wrong"}).status_code == 401
+
+def test_health_auth_reports_the_pool(client, tenant):
+    stats = client.get("/health/auth").json()
+    assert stats["completed"] > 0
+    assert stats["max_pending"] == auth.PASSWORD_HASH_MAX_PENDING
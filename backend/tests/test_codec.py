@@ -0,0 +1,51 @@
+import json
+from datetime import datetime
+import msgspec
+import pytest
+import codec
+
+def sample_order(**fields) -> codec.Order:
+    values = dict(
+        id=7, order_number=3, status="pending", total_amount=9.5, payment_status="unpaid", payment_method="cash",
+        items=[codec.OrderItem(id=1, product_id=2, product=codec.ProductRef(id=2, name="Tea", price=4.75), quantity=2, selected_modifiers={"milk": True})],
+        created_at=datetime(2026, 1, 2, 3, 4, 5),
+    )
+    values.update(fields)
+    return codec.Order(**values)
+
+def test_order_event_round_trips():
+    event = codec.OrderEvent(event="order_update", seq=4, order_id=7, order=sample_order(), status="pending")
+    assert codec.decode(codec.encode(event), codec.OrderEvent) == event
+
+def test_encoded_order_matches_the_json_clients_read():
+    data = json.loads(codec.encode(sample_order()))
+    assert data["created_at"] == "2026-01-02T03:04:05"
+    assert data["items"][0] == {
+        "id": 1, "product_id": 2, "product": {"id": 2, "name": "Tea", "price": 4.75}, "quantity": 2, "selected_modifiers": {"milk": True},
+    }
+
+def test_unset_status_is_left_out_of_new_order_events():
+    event = codec.OrderEvent(event="new_order", seq=1, order_id=7, order=sample_order())
+    assert "status" not in json.loads(codec.encode(event))
+
+def test_numeric_strings_are_accepted_like_before():
+    body = codec.decode(b'{"total_amount": "12.5", "items": [{"product_id": "3", "quantity": "2"}]}', codec.OrderIn)
+    assert body.total_amount == 12.5
+    assert (body.items[0].product_id, body.items[0].quantity) == (3, 2)
+    assert body.payment_method == "cash"
+
+@pytest.mark.parametrize("body", [b'{"items": [{"product_id": "tea"}]}', b'{"items": {"product_id": 1}}', b'{"total_amount": [1]}'])
+def test_wrong_types_are_rejected(body):
+    with pytest.raises(msgspec.ValidationError):
+        codec.decode(body, codec.OrderIn)
+
+def test_product_update_tells_missing_from_null():
+    update = codec.decode(b'{"description": null}', codec.ProductUpdate)
+    assert update.description is None
+    assert update.name is msgspec.UNSET
+
+def test_bad_order_bodies_are_a_400(client, tenant):
+    assert client.post("/orders/", headers=tenant["headers"], content=b"{not json").json() == {"error": "Invalid JSON"}
+    response = client.post("/orders/", headers=tenant["headers"], json={"total_amount": 1, "items": [{"product_id": "tea"}]})
+    assert response.status_code == 400
+    assert "product_id" in response.json()["error"]
@@ -0,0 +1,64 @@
+import json
+import pytest
+from sqlalchemy import event
+import database
+from conftest import place_order
+
+def order_count(client, tenant) -> int:
+    return len(client.get("/orders/", headers=tenant["headers"]).json())
+
+def test_order_and_items_are_stored_together(client, tenant, product):
+    order = place_order(client, tenant, product, quantity=2, payment_method="card")
+    assert order["status"] == "pending"
+    assert order["payment_method"] == "card"
+    assert [(item["product_id"], item["quantity"]) for item in order["items"]] == [(product["id"], 2)]
+
+def test_unknown_product_rejects_the_whole_order(client, tenant, product):
+    response = client.post("/orders/", headers=tenant["headers"], json={
+        "total_amount": 9.0,
+        "items": [{"product_id": product["id"], "quantity": 1}, {"product_id": 999_999, "quantity": 1}],
+    })
+    assert response.status_code == 400
+    assert "999999" in response.json()["error"]
+    assert order_count(client, tenant) == 0
+
+def test_products_are_validated_in_one_query(client, tenant, product):
+    other = client.post("/products/", headers=tenant["headers"], json={
+        "name": "Fries", "price": 2.0, "category_id": product["category_id"]
+    }).json()
+    selects = []
+    def record(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", record)
+    try:
+        place_order(client, tenant, product)  # creates the counter row
+        selects.clear()
+        response = client.post("/orders/", headers=tenant["headers"], json={
+            "total_amount": 1.0,
+            "items": [{"product_id": p["id"], "quantity": 1, "selected_modifiers": {"n": i}} for i in range(5) for p in (product, other)],
+        })
+    finally:
+        event.remove(database.engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == 10
+    assert len(selects) == 1
+
+@pytest.mark.parametrize("query", ["", "?status_update=", "?status_update=lost", "?status_update=PENDING"])
+def test_invalid_status_update_is_rejected_without_an_event(client, tenant, product, query):
+    order = place_order(client, tenant, product)
+    with client.websocket_connect(f"/ws/kitchen?token={tenant['token']}") as socket:
+        response = client.put(f"/orders/{order['id']}/status{query}", headers=tenant["headers"])
+        assert response.status_code == 400
+        # The next event on the channel is the valid update, not the rejected one
+        client.put(f"/orders/{order['id']}/status?status_update=ready", headers=tenant["headers"])
+        event = json.loads(socket.receive_text())
+    assert event["status"] == "ready"
+    [stored] = client.get("/orders/", headers=tenant["headers"]).json()
+    assert stored["status"] == "ready"
+
+def test_status_update_of_another_restaurants_order_is_not_found(client, tenant, product):
+    order = place_order(client, tenant, product)
+    response = client.put(f"/orders/{order['id'] + 100_000}/status?status_update=ready", headers=tenant["headers"])
+    assert response.status_code == 404
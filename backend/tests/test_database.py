@@ -0,0 +1,63 @@
+import os
+import sys
+import asyncio
+import contextvars
+import subprocess
+import database
+from conftest import BACKEND_DIR
+
+def test_run_db_runs_in_a_worker_thread_with_the_callers_context():
+    request_id = contextvars.ContextVar("request_id")
+
+    async def main():
+        request_id.set("abc")
+        return await database.run_db(lambda: (request_id.get(), __import__("threading").current_thread().name))
+
+    seen, thread = asyncio.run(main())
+    assert seen == "abc"
+    assert thread.startswith("ordera-db")
+
+def test_in_memory_sqlite_is_one_database_for_every_db_worker():
+    # A fresh process: the engine is configured from DATABASE_URL at import
+    code = """
+import asyncio, database, migrate, models
+migrate.upgrade()
+def add():
+    with database.get_db_context() as db:
+        db.add(models.Restaurant(name="Memory - One", city="Nowhere"))
+        db.commit()
+def count():
+    with database.get_db_context() as db:
+        return db.query(models.Restaurant).count()
+async def main():
+    await database.run_db(add)
+    print(await database.run_db(count))
+asyncio.run(main())
+"""
+    env = dict(os.environ, DATABASE_URL="sqlite://")
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split()[-1] == "1"
+
+def test_pool_wait_histogram_is_cumulative_per_bucket():
+    stats = database.PoolWaitStats()
+    for seconds in (0.0005, 0.003, 0.003, 2.0, 60.0):
+        stats.observe(seconds)
+    stats.observe_timeout()
+    snapshot = stats.snapshot()
+    assert snapshot["count"] == 5
+    assert snapshot["timeouts"] == 1
+    assert snapshot["max_seconds"] == 60.0
+    assert snapshot["buckets"]["0.001"] == 1
+    assert snapshot["buckets"]["0.005"] == 2
+    assert snapshot["buckets"]["5.0"] == 1
+    assert snapshot["buckets"]["+Inf"] == 1
+
+def test_health_db_reports_the_live_pool(client):
+    client.get("/categories/")
+    stats = client.get("/health/db").json()
+    assert stats["pool_class"] == "InstrumentedQueuePool"
+    assert stats["size"] == database.DB_POOL_SIZE
+    assert stats["max_overflow"] == database.DB_MAX_OVERFLOW
+    assert stats["checked_out"] >= 0
+    assert stats["wait"]["count"] > 0
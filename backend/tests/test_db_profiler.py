@@ -0,0 +1,67 @@
+import logging
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from conftest import PASSWORD
+import database
+import db_profiler
+import models
+import tenants
+
+def test_failing_statements_raise_the_database_error(tenant):
+    with database.get_db_context() as db:
+        db.add(models.Restaurant(name=tenant["name"].lower(), city=tenant["city"].upper()))
+        with pytest.raises(IntegrityError):
+            db.flush()
+        db.rollback()
+        with pytest.raises(OperationalError):
+            db.execute(text("SELECT * FROM no_such_table"))
+        # The failed statements left no start times behind to be mismatched later
+        assert not db.connection().info.get("query_started")
+
+def test_signup_that_loses_the_race_is_rejected(client, tenant, monkeypatch):
+    # As if a concurrent signup committed between the check and the insert
+    monkeypatch.setattr(tenants, "find_restaurant", lambda db, name, city: None)
+    response = client.post("/signup", json={
+        "restaurant_name": tenant["name"], "city": tenant["city"], "username": "admin", "password": PASSWORD
+    })
+    assert response.status_code == 400
+    assert "already taken" in response.json()["error"]
+
+def test_debug_responses_carry_query_counts(client, tenant):
+    response = client.get("/categories/", headers=tenant["headers"])
+    assert int(response.headers["x-db-queries"]) >= 1
+    assert float(response.headers["x-db-time"]) >= 0
+
+@pytest.mark.parametrize("statement,shape", [
+    ("SELECT *\n  FROM orders WHERE id = 42", "SELECT * FROM orders WHERE id = ?"),
+    ("SELECT * FROM users WHERE name = 'o''brien'", "SELECT * FROM users WHERE name = ?"),
+    ("SELECT * FROM products WHERE id IN (?, ?, ?)", "SELECT * FROM products WHERE id IN (...)"),
+    ("SELECT * FROM products WHERE id IN (%(id_1_1)s, %(id_1_2)s)", "SELECT * FROM products WHERE id IN (...)"),
+])
+def test_normalize_sql(statement, shape):
+    assert db_profiler.normalize_sql(statement) == shape
+
+def test_repeated_statement_shapes_are_reported(caplog):
+    async def n_plus_one(request):
+        def db_work():
+            with database.get_db_context() as db:
+                for product_id in range(6):
+                    db.execute(text(f"SELECT name FROM products WHERE id = {product_id}"))
+        await database.run_db(db_work)
+        return PlainTextResponse("ok")
+
+    routes = [Route("/items/{item_id:int}", n_plus_one)]
+    app = db_profiler.QueryProfilerMiddleware(Starlette(routes=routes), routes=routes, headers=True, threshold=5)
+    caplog.set_level(logging.WARNING, logger="ordera.sql")
+    response = TestClient(app).get("/items/1")
+    assert response.headers["x-db-queries"] == "6"
+
+    [record] = [r for r in caplog.records if r.getMessage() == "Repeated query (N+1)"]
+    assert record.fields["route"] == "/items/{item_id:int}"
+    assert record.fields["executions"] == 6
+    assert record.fields["sql"] == "SELECT name FROM products WHERE id = ?"
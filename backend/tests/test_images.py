@@ -0,0 +1,66 @@
+import io
+import os
+import random
+import asyncio
+import pytest
+import images, uploads
+
+PIL = pytest.importorskip("PIL.Image")
+
+@pytest.fixture
+def photo(client, tenant):
+    """A 1200x600 JPEG upload of its own (uploads are content-addressed); returns its file name"""
+    buffer = io.BytesIO()
+    PIL.new("RGB", (1200, 600), tuple(random.randrange(256) for _ in range(3))).save(buffer, "JPEG")
+    response = client.post("/upload", headers=tenant["headers"], files={"file": ("wide.jpg", buffer.getvalue(), "image/jpeg")})
+    return response.json()["image_url"].rsplit("/", 1)[1]
+
+def size_of(content: bytes) -> tuple:
+    with PIL.open(io.BytesIO(content)) as img:
+        return img.format, img.size
+
+def test_variant_by_query_parameters(client, photo):
+    response = client.get(f"/uploads/{photo}?size=thumb&format=webp")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert size_of(response.content) == ("WEBP", (200, 100))
+    stem = os.path.splitext(photo)[0]
+    assert os.path.isfile(os.path.join(uploads.UPLOADS_DIR, uploads.VARIANTS_DIRNAME, f"{stem}_thumb.webp"))
+
+def test_variant_by_suffix(client, photo):
+    stem = os.path.splitext(photo)[0]
+    response = client.get(f"/uploads/{stem}_medium.jpg")
+    assert response.status_code == 200
+    assert size_of(response.content) == ("JPEG", (800, 400))
+
+def test_format_follows_accept_when_not_given(client, photo):
+    webp = client.get(f"/uploads/{photo}?size=thumb", headers={"Accept": "image/webp,*/*"})
+    jpeg = client.get(f"/uploads/{photo}?size=thumb", headers={"Accept": "image/*"})
+    assert webp.headers["content-type"] == "image/webp"
+    assert jpeg.headers["content-type"] == "image/jpeg"
+    assert webp.headers["vary"] == jpeg.headers["vary"] == "Accept"
+
+def test_original_is_served_unchanged(client, photo):
+    response = client.get(f"/uploads/{photo}")
+    assert size_of(response.content) == ("JPEG", (1200, 600))
+
+def test_unknown_variants_and_files(client, photo):
+    assert client.get(f"/uploads/{photo}?size=huge").status_code == 400
+    assert client.get(f"/uploads/{photo}?size=thumb&format=bmp").status_code == 400
+    assert client.get("/uploads/" + "f" * 64 + "_thumb.webp").status_code == 404
+    assert client.get("/uploads/.sweep.lock").status_code == 404
+
+def test_concurrent_requests_share_one_render(client, photo):
+    source = os.path.join(uploads.UPLOADS_DIR, photo)
+
+    async def twice():
+        first = asyncio.create_task(images.renderer.ensure(source, "medium", "webp"))
+        second = asyncio.create_task(images.renderer.ensure(source, "medium", "webp"))
+        await asyncio.sleep(0)
+        inflight = len(images.renderer._inflight)
+        return inflight, await asyncio.gather(first, second)
+
+    inflight, (first, second) = client.portal.call(twice)
+    assert inflight == 1
+    assert first == second
+    assert not images.renderer._inflight
@@ -0,0 +1,43 @@
+from conftest import place_order
+
+def test_pages_follow_the_cursor_newest_first(client, tenant, product):
+    placed = [place_order(client, tenant, product)["id"] for _ in range(5)]
+
+    seen, cursor = [], None
+    while True:
+        response = client.get("/orders/", headers=tenant["headers"], params={"limit": 2, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 2
+        seen += [order["id"] for order in page]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == placed[::-1]
+
+def test_items_are_included(client, tenant, product):
+    place_order(client, tenant, product, quantity=3)
+    [order] = client.get("/orders/", headers=tenant["headers"]).json()
+    assert order["items"][0]["quantity"] == 3
+    assert order["items"][0]["product"]["name"] == product["name"]
+
+def test_status_filter_accepts_a_list(client, tenant, product):
+    pending = place_order(client, tenant, product)
+    ready = place_order(client, tenant, product)
+    done = place_order(client, tenant, product)
+    client.put(f"/orders/{ready['id']}/status?status_update=ready", headers=tenant["headers"])
+    client.put(f"/orders/{done['id']}/status?status_update=completed", headers=tenant["headers"])
+
+    page = client.get("/orders/?status=pending,ready", headers=tenant["headers"]).json()
+    assert {order["id"] for order in page} == {pending["id"], ready["id"]}
+
+def test_orders_of_other_restaurants_are_not_listed(client, tenant, product):
+    place_order(client, tenant, product)
+    other = client.post("/signup", json={"restaurant_name": f"{tenant['name']}x", "city": tenant["city"], "username": "a", "password": "p"})
+    assert other.status_code == 200
+    token = client.post("/token", json={"restaurant_name": f"{tenant['name']}x", "city": tenant["city"], "username": "a", "password": "p"}).json()["access_token"]
+    assert client.get("/orders/", headers={"Authorization": f"Bearer {token}"}).json() == []
+
+def test_malformed_parameters_are_rejected(client, tenant):
+    for params in ({"cursor": "not-a-cursor"}, {"limit": "many"}, {"from": "yesterday"}):
+        assert client.get("/orders/", headers=tenant["headers"], params=params).status_code == 400
@@ -0,0 +1,84 @@
+import json
+from starlette.requests import Request
+import endpoints
+import menu_bulk
+
+MENU = {
+    "categories": [{"name": "Empty"}],
+    "products": [
+        {"name": "Burger", "price": 4.5, "category": "Mains", "modifiers": {"size": ["S", "L"]}},
+        {"name": "Fries", "price": 2.0, "category": "Sides", "is_available": False},
+    ],
+}
+
+def import_menu(client, tenant, content, content_type="application/json", **headers):
+    return client.post("/menu/import", content=content, headers={**tenant["headers"], "Content-Type": content_type, **headers})
+
+def test_json_round_trip(client, tenant):
+    response = import_menu(client, tenant, json.dumps(MENU))
+    assert response.json() == {"categories_created": 3, "products_created": 2, "products_updated": 0}
+
+    exported = client.get("/menu/export", headers=tenant["headers"]).json()
+    assert [c["name"] for c in exported["categories"]] == ["Empty", "Mains", "Sides"]
+    assert [(p["name"], p["category"], p["is_available"]) for p in exported["products"]] == [
+        ("Burger", "Mains", True), ("Fries", "Sides", False)
+    ]
+    # Importing the export again updates in place
+    exported["products"][0]["price"] = 5.0
+    assert import_menu(client, tenant, json.dumps(exported)).json() == {
+        "categories_created": 0, "products_created": 0, "products_updated": 2
+    }
+    prices = {p["name"]: p["price"] for p in client.get("/products/", headers=tenant["headers"]).json()}
+    assert prices == {"Burger": 5.0, "Fries": 2.0}
+
+def test_csv_round_trip(client, tenant):
+    import_menu(client, tenant, json.dumps(MENU))
+    exported = client.get("/menu/export", headers=tenant["headers"], params={"format": "csv"})
+    assert exported.headers["content-type"].startswith("text/csv")
+    assert exported.text.splitlines()[0] == ",".join(menu_bulk.EXPORT_COLUMNS)
+    response = import_menu(client, tenant, exported.content, "text/csv")
+    assert response.json() == {"categories_created": 0, "products_created": 0, "products_updated": 2}
+
+def test_invalid_rows_change_nothing(client, tenant):
+    bad = {"products": [{"name": "Soup", "price": 3.0, "category": "Starters"}, {"name": " ", "price": -1, "category": "Starters"}]}
+    response = import_menu(client, tenant, json.dumps(bad))
+    assert response.status_code == 400
+    assert response.json()["errors"] == ["products[1]: name is empty", "products[1]: price is negative"]
+    assert client.get("/products/", headers=tenant["headers"]).json() == []
+
+def test_rows_resolving_to_the_same_product_are_rejected(client, tenant):
+    import_menu(client, tenant, json.dumps(MENU))
+    burger = next(p for p in client.get("/products/", headers=tenant["headers"]).json() if p["name"] == "Burger")
+    clash = {"products": [
+        {"id": burger["id"], "name": "Cheeseburger", "price": 5.0, "category": "Mains"},
+        {"name": "burger", "price": 6.0, "category": "Mains"},
+        {"id": 10**9, "name": "Fries", "price": 2.5, "category": "Sides"},
+        {"name": "FRIES", "price": 3.0, "category": "Sides"},
+    ]}
+    response = import_menu(client, tenant, json.dumps(clash))
+    assert response.status_code == 400
+    assert response.json()["errors"] == ["products[1]: same product as products[0]", "products[3]: same product as products[2]"]
+    prices = {p["name"]: p["price"] for p in client.get("/products/", headers=tenant["headers"]).json()}
+    assert prices == {"Burger": 4.5, "Fries": 2.0}
+
+def test_oversized_content_length_is_rejected_up_front(client, tenant, monkeypatch):
+    monkeypatch.setattr(menu_bulk, "MENU_IMPORT_MAX_BYTES", 100)
+    response = import_menu(client, tenant, json.dumps(MENU))
+    assert response.status_code == 413
+
+def test_oversized_streamed_body_stops_being_read(client):
+    received = []
+
+    async def receive():
+        # A chunked body without Content-Length: the limit is enforced while reading
+        received.append(1)
+        return {"type": "http.request", "body": b" " * 64, "more_body": len(received) < 1000}
+
+    request = Request({"type": "http", "method": "POST", "headers": []}, receive)
+    assert client.portal.call(endpoints.read_body, request, 100) is None
+    assert len(received) == 2
+
+    received.clear()
+    request = Request({"type": "http", "method": "POST", "headers": [(b"content-length", b"64000")]}, receive)
+    assert client.portal.call(endpoints.read_body, request, 100) is None
+    assert received == []
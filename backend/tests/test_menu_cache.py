@@ -0,0 +1,59 @@
+import time
+import asyncio
+import menu_cache
+
+def test_menu_is_served_with_a_version_etag(client, tenant, product):
+    response = client.get("/products/", headers=tenant["headers"])
+    assert response.status_code == 200
+    assert [p["name"] for p in response.json()] == ["Burger"]
+    assert response.headers["ETag"].startswith(f'"menu-{tenant["id"]}-')
+
+    again = client.get("/products/", headers={**tenant["headers"], "If-None-Match": response.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.content == b""
+
+def test_changing_the_menu_changes_the_etag(client, tenant, product):
+    before = client.get("/products/", headers=tenant["headers"])
+    client.put(f"/products/{product['id']}", headers=tenant["headers"], json={"price": 6.0})
+    after = client.get("/products/", headers={**tenant["headers"], "If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert after.headers["ETag"] != before.headers["ETag"]
+    assert after.json()[0]["price"] == 6.0
+
+def test_categories_and_products_have_their_own_etags(client, tenant, product):
+    categories = client.get("/categories/", headers=tenant["headers"])
+    products = client.get("/products/", headers=tenant["headers"])
+    assert categories.headers["ETag"] != products.headers["ETag"]
+    assert client.get("/categories/", headers={**tenant["headers"], "If-None-Match": products.headers["ETag"]}).status_code == 200
+
+def test_snapshot_is_built_once_per_version(client, tenant, product, monkeypatch):
+    builds = []
+    original = menu_cache.build_snapshot
+    monkeypatch.setattr(menu_cache, "build_snapshot", lambda rid: builds.append(rid) or original(rid))
+    for _ in range(3):
+        client.get("/products/", headers=tenant["headers"])
+        client.get("/categories/", headers=tenant["headers"])
+    assert builds.count(tenant["id"]) <= 1
+
+def test_weak_and_listed_etags_match(client, tenant, product):
+    etag = client.get("/products/", headers=tenant["headers"]).headers["ETag"]
+    for header in (f"W/{etag}", f'"other", {etag}', "*"):
+        assert client.get("/products/", headers={**tenant["headers"], "If-None-Match": header}).status_code == 304
+
+def test_concurrent_misses_share_one_build(client, tenant, product, monkeypatch):
+    builds = []
+    original = menu_cache.build_snapshot
+    def slow_build(rid):
+        builds.append(rid)
+        time.sleep(0.05)
+        return original(rid)
+    monkeypatch.setattr(menu_cache, "build_snapshot", slow_build)
+    cache = menu_cache.MenuCache(redis_url="")
+
+    async def get_all():
+        return await asyncio.gather(*(cache.get(tenant["id"], 1) for _ in range(10)))
+
+    snapshots = client.portal.call(get_all)
+    assert builds == [tenant["id"]]
+    assert len({id(snapshot) for snapshot in snapshots}) == 1
+    assert not cache._building
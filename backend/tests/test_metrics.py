@@ -0,0 +1,60 @@
+import re
+from conftest import place_order
+import metrics
+
+def sample(text: str, name: str, **labels) -> float:
+    """The value of one series in an exposition, e.g. sample(text, "x_count", route="/orders/")"""
+    for line in text.splitlines():
+        series, _, value = line.rpartition(" ")
+        if series.split("{")[0] != name:
+            continue
+        found = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', series))
+        if all(found.get(key) == str(expected) for key, expected in labels.items()):
+            return float(value)
+    raise AssertionError(f"no sample {name} {labels}")
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("t_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(seconds, "/a")
+    text = "\n".join(histogram.render())
+    assert sample(text, "t_seconds_bucket", route="/a", le="0.1") == 2
+    assert sample(text, "t_seconds_bucket", route="/a", le="1") == 3
+    assert sample(text, "t_seconds_bucket", route="/a", le="+Inf") == 4
+    assert sample(text, "t_seconds_count", route="/a") == 4
+    assert sample(text, "t_seconds_sum", route="/a") == 3.65
+    assert "# TYPE t_seconds histogram" in text
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter("t_total", "test", ("path",))
+    counter.inc('a"b\\c\nd')
+    assert counter.render()[-1] == 't_total{path="a\\"b\\\\c\\nd"} 1'
+
+def test_unlabelled_series_start_at_zero():
+    assert metrics.Counter("t_total", "test").render()[-1] == "t_total 0"
+    assert metrics.Gauge("t_gauge", "test").render()[-1] == "t_gauge 0"
+
+def test_requests_are_recorded_per_route_template(client, tenant, product):
+    before = client.get("/metrics").text
+    created_before = sample(before, "ordera_orders_created_total")
+    order = place_order(client, tenant, product)
+    client.put(f"/orders/{order['id']}/status?status_update=paid", headers=tenant["headers"])
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"] == metrics.CONTENT_TYPE
+    text = response.text
+    assert sample(text, "ordera_orders_created_total") == created_before + 1
+    count = sample(text, "ordera_http_request_duration_seconds_count",
+                   method="PUT", route="/orders/{order_id:int}/status", status=200)
+    assert count >= 1
+    assert f'/orders/{order["id"]}/status' not in text
+    # The scrape itself is in flight while it renders
+    assert sample(text, "ordera_http_requests_in_flight") == 1
+
+def test_realtime_and_pool_gauges(client, tenant):
+    with client.websocket_connect(f"/ws/kitchen?token={tenant['token']}"):
+        text = client.get("/metrics").text
+        assert sample(text, "ordera_websocket_connections", restaurant_id=tenant["id"]) == 1
+    assert sample(text, "ordera_db_pool_timeouts_total") >= 0
+    assert sample(text, "ordera_db_pool_wait_seconds_bucket", le="+Inf") == sample(text, "ordera_db_pool_wait_seconds_count")
+    assert "# TYPE ordera_active_orders gauge" in text
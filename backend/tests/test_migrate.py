@@ -0,0 +1,77 @@
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import migrate
+import models
+
+def columns(engine, table: str) -> set:
+    return {column["name"] for column in inspect(engine).get_columns(table)}
+
+def test_upgrade_adds_event_seq_to_legacy_restaurants(legacy_engine):
+    assert "event_seq" not in columns(legacy_engine, "restaurants")
+    migrate.upgrade(legacy_engine)
+    with legacy_engine.connect() as conn:
+        assert conn.execute(text("SELECT event_seq FROM restaurants WHERE id = 1")).scalar() == 0
+
+def test_upgrade_adds_menu_version_to_legacy_restaurants(legacy_engine):
+    assert "menu_version" not in columns(legacy_engine, "restaurants")
+    migrate.upgrade(legacy_engine)
+    with legacy_engine.connect() as conn:
+        assert conn.execute(text("SELECT menu_version FROM restaurants WHERE id = 1")).scalar() == 0
+
+def test_upgraded_legacy_database_matches_models(legacy_engine):
+    assert "index orders.ix_orders_restaurant_created: in models, not migrated" in migrate.schema_drift(legacy_engine)
+    migrate.upgrade(legacy_engine)
+    assert migrate.schema_drift(legacy_engine) == []
+
+def test_upgraded_legacy_database_works_with_the_models(legacy_engine):
+    migrate.upgrade(legacy_engine)
+    with Session(legacy_engine) as db:
+        restaurant = db.get(models.Restaurant, 1)
+        category = models.Category(name="Mains", restaurant_id=restaurant.id)
+        db.add(category)
+        db.flush()
+        product = models.Product(name="Pie", price=3.0, category_id=category.id, restaurant_id=restaurant.id, is_available=True)
+        db.add(product)
+        db.flush()
+        db.add(models.Order(order_number=1, status="pending", total_amount=3.0, restaurant_id=restaurant.id,
+                            items=[models.OrderItem(product_id=product.id, quantity=1)]))
+        restaurant.event_seq += 1
+        db.commit()
+        assert [o.items[0].product.name for o in db.query(models.Order).filter_by(restaurant_id=1)] == ["Pie"]
+
+        db.add(models.Restaurant(name="OLD BISTRO - SOHO", city="london"))
+        with pytest.raises(IntegrityError):
+            db.commit()
+
+def test_legacy_duplicate_restaurants_block_the_unique_index(legacy_engine):
+    with legacy_engine.begin() as conn:
+        conn.execute(text("INSERT INTO restaurants (id, name, city) VALUES (2, 'OLD BISTRO - SOHO', 'london')"))
+    with pytest.raises(RuntimeError, match="ids 1, 2"):
+        migrate.upgrade(legacy_engine)
+
+    with legacy_engine.begin() as conn:
+        conn.execute(text("UPDATE restaurants SET name = 'Old Bistro - Soho Square' WHERE id = 2"))
+    assert migrate.upgrade(legacy_engine) == ["0006"]
+    assert migrate.schema_drift(legacy_engine) == []
+
+def adopt(engine, orders_sql: str):
+    """Runs 0006 alone on the legacy database, its orders table replaced by this one"""
+    (revision,) = [r for r in migrate.load_revisions() if r.revision == "0006"]
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE orders"))
+        conn.execute(text(orders_sql))
+        conn.execute(text("INSERT INTO orders (status) VALUES ('pending')"))
+    with engine.begin() as conn:
+        revision.upgrade(conn)
+
+def test_missing_orders_columns_are_added_empty(legacy_engine):
+    adopt(legacy_engine, "CREATE TABLE orders (id INTEGER NOT NULL PRIMARY KEY, status VARCHAR)")
+    assert {"created_at", "restaurant_id"} <= columns(legacy_engine, "orders")
+    with legacy_engine.connect() as conn:
+        assert conn.execute(text("SELECT created_at, restaurant_id FROM orders")).one() == (None, None)
+
+def test_orders_without_an_id_fail_clearly(legacy_engine):
+    with pytest.raises(RuntimeError, match="orders has no id column"):
+        adopt(legacy_engine, "CREATE TABLE orders (status VARCHAR, created_at DATETIME, restaurant_id INTEGER)")
@@ -0,0 +1,23 @@
+import json
+from conftest import place_order
+
+def test_events_carry_the_order_and_a_sequence_number(client, tenant, product):
+    with client.websocket_connect(f"/ws/kitchen?token={tenant['token']}") as socket:
+        first = place_order(client, tenant, product, quantity=2)
+        second = place_order(client, tenant, product)
+        response = client.put(f"/orders/{first['id']}/status?status_update=preparing", headers=tenant["headers"])
+        assert response.status_code == 200
+        events = [json.loads(socket.receive_text()) for _ in range(3)]
+
+    assert [event["event"] for event in events] == ["new_order", "new_order", "order_update"]
+    assert [event["order_id"] for event in events] == [first["id"], second["id"], first["id"]]
+    # Consecutive per restaurant, so a client can detect a gap and refetch
+    assert [event["seq"] for event in events] == [events[0]["seq"] + i for i in range(3)]
+    assert events[0]["order"]["items"][0]["quantity"] == 2
+    assert events[2]["status"] == "preparing"
+    assert events[2]["order"]["status"] == "preparing"
+
+def test_sequence_numbers_are_per_restaurant(client, tenant, product):
+    with client.websocket_connect(f"/ws/kitchen?token={tenant['token']}") as socket:
+        place_order(client, tenant, product)
+        assert json.loads(socket.receive_text())["seq"] == 1
@@ -0,0 +1,81 @@
+import gzip
+import json
+import time
+import anyio
+import pytest
+from conftest import place_order
+import database
+import order_export
+import main
+
+def test_ndjson_export_in_time_order(client, tenant, product):
+    ids = [place_order(client, tenant, product)["id"] for _ in range(3)]
+    response = client.get("/orders/export", headers=tenant["headers"])
+    assert response.headers["content-type"] == "application/x-ndjson"
+    orders = [json.loads(line) for line in response.text.splitlines()]
+    assert [order["id"] for order in orders] == ids
+    assert orders[0]["items"][0]["product"]["name"] == "Burger"
+
+def test_csv_export_gzipped(client, tenant, product):
+    place_order(client, tenant, product, quantity=2)
+    response = client.get("/orders/export", headers={**tenant["headers"], "Accept-Encoding": "gzip"},
+                          params={"format": "csv"})
+    assert response.headers["content-encoding"] == "gzip"
+    lines = response.text.splitlines()
+    assert lines[0] == ",".join(order_export.CSV_COLUMNS)
+    assert len(lines) == 2
+
+def checked_out() -> int:
+    return database.pool_stats()["checked_out"]
+
+@pytest.mark.parametrize("slow", ["client", "database"])
+def test_client_disconnect_mid_stream_releases_the_connections(client, tenant, product, monkeypatch, slow):
+    """The disconnect lands while a chunk is being sent, or while the next one is read"""
+    monkeypatch.setattr(order_export, "EXPORT_BATCH_SIZE", 1)
+    if slow == "database":
+        next_chunk = order_export.OrderExport.next_chunk
+
+        def slow_next_chunk(export):
+            if export.started:
+                time.sleep(0.5)
+            return next_chunk(export)
+        monkeypatch.setattr(order_export.OrderExport, "next_chunk", slow_next_chunk)
+    for _ in range(5):
+        place_order(client, tenant, product)
+    baseline = checked_out()
+
+    async def export_then_disconnect():
+        first_chunk = anyio.Event()
+        received = []
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await first_chunk.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                received.append(message["body"])
+                first_chunk.set()
+                if slow == "client":
+                    await anyio.sleep(1)
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": "/orders/export", "raw_path": b"/orders/export", "query_string": b"", "root_path": "",
+            "headers": [(b"host", b"testserver"), (b"authorization", f"Bearer {tenant['token']}".encode())],
+            "client": ("testclient", 50000), "server": ("testserver", 80),
+        }
+        await main.app(scope, receive, send)
+        return received
+
+    received = client.portal.call(export_then_disconnect)
+    assert len(received) == 1
+    deadline = time.monotonic() + 2
+    while checked_out() > baseline and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert checked_out() == baseline
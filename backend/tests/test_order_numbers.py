@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from sqlalchemy import delete
+from conftest import place_order
+import database, models, order_numbers
+
+def allocate(allocator, restaurant_id):
+    with database.get_db_context() as db:
+        number = allocator.allocate(db, restaurant_id)
+        db.commit()
+        return number
+
+def test_orders_are_numbered_per_restaurant(client, tenant, product):
+    numbers = [place_order(client, tenant, product)["order_number"] for _ in range(3)]
+    assert numbers == [1, 2, 3]
+
+def test_concurrent_allocations_are_distinct(tenant):
+    allocator = order_numbers.OrderNumberAllocator(block_size=1, reset_daily=False)
+    with ThreadPoolExecutor(8) as pool:
+        numbers = list(pool.map(lambda _: allocate(allocator, tenant["id"]), range(40)))
+    assert sorted(numbers) == list(range(1, 41))
+
+def test_blocks_are_reserved_once_and_handed_out_in_process(tenant):
+    allocator = order_numbers.OrderNumberAllocator(block_size=5, reset_daily=False)
+    assert [allocate(allocator, tenant["id"]) for _ in range(7)] == list(range(1, 8))
+    with database.get_db_context() as db:
+        # Two blocks reserved: 1-5 and 6-10
+        assert db.get(models.OrderCounter, tenant["id"]).last_number == 10
+
+def test_missing_counter_continues_from_existing_orders(client, tenant, product):
+    for _ in range(2):
+        place_order(client, tenant, product)
+    with database.get_db_context() as db:
+        db.execute(delete(models.OrderCounter).where(models.OrderCounter.restaurant_id == tenant["id"]))
+        db.commit()
+    assert place_order(client, tenant, product)["order_number"] == 3
+
+def test_daily_reset_starts_each_day_at_one(tenant):
+    class Allocator(order_numbers.OrderNumberAllocator):
+        day = date(2026, 1, 1)
+        def _business_day(self):
+            return self.day
+
+    allocator = Allocator(block_size=1, reset_daily=True)
+    assert [allocate(allocator, tenant["id"]) for _ in range(2)] == [1, 2]
+    allocator.day = date(2026, 1, 2)
+    assert allocate(allocator, tenant["id"]) == 1
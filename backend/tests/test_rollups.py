@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+from conftest import place_order
+import database, models, rollups
+
+def stats(client, tenant, period: str = "day") -> dict:
+    response = client.get("/stats", headers=tenant["headers"], params={"period": period})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_orders_are_rolled_up_as_they_are_placed(client, tenant, product):
+    place_order(client, tenant, product, quantity=2, payment_method="card")
+    place_order(client, tenant, product)
+    result = stats(client, tenant)
+
+    assert result["totals"] == {"orders": 2, "revenue": 13.5, "items": 3, "average_order_value": 6.75}
+    assert result["by_payment_method"] == {"card": {"orders": 1, "revenue": 9.0}, "cash": {"orders": 1, "revenue": 4.5}}
+    assert result["top_products"] == [{"product_id": product["id"], "name": "Burger", "quantity": 3}]
+    assert len(result["series"]) == 24
+    assert sum(point["orders"] for point in result["series"]) == 2
+
+def test_cancelled_orders_are_taken_out_and_put_back(client, tenant, product):
+    order = place_order(client, tenant, product)
+    url = f"/orders/{order['id']}/status"
+    client.put(url, params={"status_update": "cancelled"}, headers=tenant["headers"])
+    assert stats(client, tenant)["totals"]["orders"] == 0
+    assert stats(client, tenant)["top_products"] == [{"product_id": product["id"], "name": "Burger", "quantity": 0}]
+    # Moving between counted statuses changes nothing
+    client.put(url, params={"status_update": "pending"}, headers=tenant["headers"])
+    client.put(url, params={"status_update": "paid"}, headers=tenant["headers"])
+    assert stats(client, tenant)["totals"]["orders"] == 1
+
+def test_backfill_rebuilds_the_same_rollups(client, tenant, product):
+    place_order(client, tenant, product, quantity=3, payment_method="card")
+    cancelled = place_order(client, tenant, product)
+    client.put(f"/orders/{cancelled['id']}/status", params={"status_update": "cancelled"}, headers=tenant["headers"])
+    place_order(client, tenant, product)
+    incremental = stats(client, tenant, "week")
+
+    assert rollups.backfill_restaurant(tenant["id"]) == 2
+    assert stats(client, tenant, "week") == incremental
+
+def test_periods(client, tenant):
+    week = stats(client, tenant, "week")
+    assert week["bucket"] == "day"
+    assert len(week["series"]) == 7
+    # Zero-filled days, ending with today
+    starts = [datetime.fromisoformat(point["start"]) for point in week["series"]]
+    assert starts[0] == datetime.fromisoformat(week["from"])
+    assert starts[-1] + timedelta(days=1) == datetime.fromisoformat(week["to"])
+    assert week["totals"] == {"orders": 0, "revenue": 0.0, "items": 0, "average_order_value": 0.0}
+    assert len(stats(client, tenant, "month")["series"]) == 30
+    response = client.get("/stats", headers=tenant["headers"], params={"period": "year"})
+    assert response.status_code == 400
+
+def test_days_start_at_local_midnight(tenant):
+    with database.get_db_context() as db:
+        for hour in (datetime(2026, 3, 1, 22), datetime(2026, 3, 2, 1)):
+            db.add(models.SalesHourly(restaurant_id=tenant["id"], hour=hour, payment_method="cash",
+                                      order_count=1, revenue=5.0, item_count=1))
+        db.commit()
+    now = datetime(2026, 3, 2, 10)
+
+    utc = rollups.stats(tenant["id"], "day", now)
+    assert utc["from"] == "2026-03-02T00:00:00"
+    assert utc["totals"]["orders"] == 1
+
+    # UTC+2: the day began at 22:00 UTC on the 1st
+    local = rollups.stats(tenant["id"], "day", now, utc_offset=120)
+    assert local["from"] == "2026-03-01T22:00:00"
+    assert [point["orders"] for point in local["series"]][:4] == [1, 0, 0, 1]
+    # UTC-3: the day began at 03:00 UTC, after both
+    assert rollups.stats(tenant["id"], "day", now, utc_offset=-180)["totals"]["orders"] == 0
+
+    assert [point["orders"] for point in rollups.stats(tenant["id"], "week", now)["series"]][-2:] == [1, 1]
+    assert [point["orders"] for point in rollups.stats(tenant["id"], "week", now, utc_offset=120)["series"]][-2:] == [0, 2]
+
+def test_utc_offset_is_validated(client, tenant):
+    assert client.get("/stats", headers=tenant["headers"], params={"utc_offset": "-330"}).json()["utc_offset"] == -330
+    for value in ("+1h", "1.5", str(15 * 60)):
+        response = client.get("/stats", headers=tenant["headers"], params={"utc_offset": value})
+        assert response.status_code == 400, value
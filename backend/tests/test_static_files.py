@@ -0,0 +1,94 @@
+import os
+import gzip
+import hashlib
+import pytest
+import static_files
+import uploads
+
+def put(name: str, data: bytes) -> str:
+    os.makedirs(uploads.UPLOADS_DIR, exist_ok=True)
+    with open(os.path.join(uploads.UPLOADS_DIR, name), "wb") as file:
+        file.write(data)
+    return name
+
+@pytest.fixture
+def hashed():
+    data = os.urandom(1000)
+    return put(hashlib.sha256(data).hexdigest() + ".jpg", data), data
+
+@pytest.mark.parametrize("header,expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=900-", (900, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=990-2000", (990, 999)),
+    ("bytes=1000-", False),
+    ("bytes=-0", False),
+    ("bytes=5-1", None),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+])
+def test_parse_range(header, expected):
+    assert static_files.parse_range(header, 1000) == expected
+
+def test_hashed_files_are_immutable_with_a_strong_etag(client, hashed):
+    name, data = hashed
+    response = client.get(f"/uploads/{name}")
+    assert response.content == data
+    assert response.headers["cache-control"] == f"public, max-age={static_files.STATIC_IMMUTABLE_MAX_AGE}, immutable"
+    assert response.headers["etag"] == f'"{name}"'
+    assert client.get(f"/uploads/{name}", headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+def test_other_files_are_revalidated(client):
+    name = put("logo.png", b"not really a png")
+    response = client.get(f"/uploads/{name}")
+    assert response.headers["cache-control"] == "no-cache"
+    assert not response.headers["etag"].startswith('"logo')
+    put(name, b"changed and longer")
+    changed = client.get(f"/uploads/{name}", headers={"If-None-Match": response.headers["etag"]})
+    assert changed.status_code == 200
+    assert changed.content == b"changed and longer"
+
+def test_ranges(client, hashed):
+    name, data = hashed
+    partial = client.get(f"/uploads/{name}", headers={"Range": "bytes=100-199"})
+    assert partial.status_code == 206
+    assert partial.content == data[100:200]
+    assert partial.headers["content-range"] == "bytes 100-199/1000"
+    assert partial.headers["content-length"] == "100"
+
+    assert client.get(f"/uploads/{name}", headers={"Range": "bytes=-10"}).content == data[-10:]
+    unsatisfiable = client.get(f"/uploads/{name}", headers={"Range": "bytes=5000-"})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == "bytes */1000"
+
+def test_if_range_with_a_stale_etag_sends_the_whole_file(client, hashed):
+    name, data = hashed
+    response = client.get(f"/uploads/{name}", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == data
+
+def test_large_files_are_read_in_chunks(client, monkeypatch):
+    monkeypatch.setattr(static_files.hot_files, "max_file_bytes", 1024)
+    data = os.urandom(static_files.CHUNK_SIZE * 2 + 10)
+    name = put(hashlib.sha256(data).hexdigest() + ".png", data)
+    assert client.get(f"/uploads/{name}").content == data
+    tail = client.get(f"/uploads/{name}", headers={"Range": f"bytes={static_files.CHUNK_SIZE - 5}-"})
+    assert tail.content == data[static_files.CHUNK_SIZE - 5:]
+
+def test_head_has_headers_and_no_body(client, hashed):
+    name, _ = hashed
+    response = client.head(f"/uploads/{name}")
+    assert response.status_code == 200
+    assert response.headers["content-length"] == "1000"
+    assert response.content == b""
+
+def test_precompressed_sibling_for_text_assets(client):
+    body = b'{"menu": [' + b'"item", ' * 200 + b'"last"]}'
+    name = put("menu.json", body)
+    put("menu.json.gz", gzip.compress(body))
+    response = client.get(f"/uploads/{name}", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.content == body  # decoded by the client
+    plain = client.get(f"/uploads/{name}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
@@ -0,0 +1,28 @@
+from conftest import PASSWORD
+import tenants
+
+def credentials(tenant, **fields):
+    return {"restaurant_name": tenant["name"], "city": tenant["city"], "username": "admin", "password": PASSWORD, **fields}
+
+def test_name_and_city_are_unique_case_insensitively(client, tenant):
+    duplicate = credentials(tenant, restaurant_name=tenant["name"].upper(), city=f" {tenant['city'].lower()} ")
+    response = client.post("/signup", json=duplicate)
+    assert response.status_code == 400
+    assert "already taken" in response.json()["error"]
+
+def test_login_matches_the_city_case_insensitively(client, tenant):
+    assert client.post("/token", json=credentials(tenant, city=tenant["city"].upper())).status_code == 200
+    # The name itself must match as registered
+    assert client.post("/token", json=credentials(tenant, restaurant_name=tenant["name"].lower())).status_code == 404
+
+def test_resolved_tenants_are_cached(client, tenant):
+    tenants.cache.invalidate(tenant["name"], tenant["city"])
+    assert client.post("/token", json=credentials(tenant)).status_code == 200
+    assert tenants.cache.get(tenant["name"].lower(), tenant["city"]) == {"id": tenant["id"], "name": tenant["name"], "city": tenant["city"]}
+
+def test_tenant_cache_is_bounded():
+    cache = tenants.TenantCache(maxsize=2)
+    for i in range(3):
+        cache.put({"id": i, "name": f"R{i} - A", "city": "C"})
+    assert cache.get("R0 - A", "C") is None
+    assert cache.get("r2 - a", "c")["id"] == 2
@@ -0,0 +1,105 @@
+import os
+import time
+import asyncio
+import hashlib
+import database, models, uploads
+
+PNG = bytes.fromhex("89504e470d0a1a0a0000000d4948445200000001000000010806000000" "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082")
+
+def upload(client, tenant, data: bytes = PNG, name: str = "photo.png"):
+    return client.post("/upload", headers=tenant["headers"], files={"file": (name, data, "image/png")})
+
+def touch(name: str, age_seconds: float = 0, directory: str = None) -> str:
+    path = os.path.join(directory or uploads.UPLOADS_DIR, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(b"x")
+    stamp = time.time() - age_seconds
+    os.utime(path, (stamp, stamp))
+    return path
+
+def test_uploads_are_stored_under_their_hash_once(client, tenant):
+    first = upload(client, tenant)
+    assert first.status_code == 200
+    digest = hashlib.sha256(PNG).hexdigest()
+    assert first.json()["image_url"] == f"/uploads/{digest}.png"
+    assert upload(client, tenant, name="again.png").json() == first.json()
+    assert not [name for name in os.listdir(uploads.UPLOADS_DIR) if name.startswith(uploads.TEMP_PREFIX)]
+
+def test_oversized_and_unsupported_uploads_are_refused(client, tenant, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_MAX_BYTES", 16)
+    assert upload(client, tenant).status_code == 413
+    monkeypatch.undo()
+    assert upload(client, tenant, name="script.svg").status_code == 400
+    assert client.post("/upload", headers=tenant["headers"], data={"other": "x"}).status_code == 400
+
+def test_sweep_only_deletes_what_uploads_wrote(tenant):
+    day = 2 * 24 * 3600
+    kept_hash = "a" * 64
+    with database.get_db_context() as db:
+        db.add(models.Product(name="Kept", price=1.0, image_url=f"/uploads/{kept_hash}.jpg", restaurant_id=tenant["id"]))
+        db.commit()
+
+    orphan = touch("b" * 64 + ".jpg", day)
+    young = touch("c" * 64 + ".png", 0)
+    temp = touch(uploads.TEMP_PREFIX + "x1y2z3ab", day)
+    referenced = touch(kept_hash + ".jpg", day)
+    gitkeep = touch(".gitkeep", day)
+    by_hand = touch("menu-photo.jpg", day)
+    not_an_upload = touch("notes.txt", day)
+    variants = os.path.join(uploads.UPLOADS_DIR, uploads.VARIANTS_DIRNAME)
+    orphan_variant = touch("b" * 64 + "_thumb.webp", day, variants)
+    kept_variant = touch(kept_hash + "_thumb.webp", day, variants)
+    stale_render = touch(kept_hash + "_medium.jpg.123.tmp", day, variants)
+    hand_variant = touch("menu-photo_thumb.webp", day, variants)
+
+    uploads.sweep_orphans()
+
+    for path in (orphan, temp, orphan_variant, stale_render):
+        assert not os.path.exists(path), path
+    for path in (young, referenced, gitkeep, by_hand, not_an_upload, kept_variant, hand_variant):
+        assert os.path.exists(path), path
+
+def test_reuploading_an_old_orphan_keeps_it_from_the_sweep(client, tenant):
+    data = PNG + b"orphan"
+    stored = os.path.join(uploads.UPLOADS_DIR, upload(client, tenant, data).json()["image_url"].rsplit("/", 1)[1])
+    stamp = time.time() - 2 * uploads.UPLOAD_ORPHAN_GRACE_SECONDS
+    os.utime(stored, (stamp, stamp))
+
+    # The same bytes again, before the product that uses them is saved
+    assert upload(client, tenant, data).status_code == 200
+    uploads.sweep_orphans()
+    assert os.path.exists(stored)
+
+def test_only_one_process_holds_the_sweep_lock():
+    holder, other = uploads.sweep_lock(), uploads.sweep_lock()
+    assert holder.acquire()
+    try:
+        assert not other.acquire()
+    finally:
+        holder.release()
+    assert other.acquire()
+    other.release()
+
+def test_periodic_sweep_waits_for_the_lock(monkeypatch):
+    sweeps = []
+    monkeypatch.setattr(uploads, "sweep_orphans", lambda: sweeps.append(1) or 0)
+    holder = uploads.sweep_lock()
+
+    async def run(seconds: float):
+        task = asyncio.create_task(uploads.sweep_periodically(0.01))
+        await asyncio.sleep(seconds)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    assert holder.acquire()
+    try:
+        asyncio.run(run(0.1))
+        assert sweeps == []
+    finally:
+        holder.release()
+    asyncio.run(run(0.1))
+    assert sweeps
+    # Released when the task ended
+    assert holder.acquire()
+    holder.release()
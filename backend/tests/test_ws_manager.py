@@ -0,0 +1,99 @@
+import json
+import time
+import asyncio
+import pytest
+from starlette.websockets import WebSocketDisconnect, WebSocketState
+from conftest import place_order
+import ws_manager
+
+manager = ws_manager.manager
+
+def test_sockets_of_a_restaurant_share_one_subscription(client, tenant, product):
+    url = f"/ws/kitchen?token={tenant['token']}"
+    with client.websocket_connect(url) as first, client.websocket_connect(url) as second:
+        assert len(manager.active_connections[tenant["id"]]) == 2
+        listener = manager._listeners[tenant["id"]]
+
+        order = place_order(client, tenant, product)
+        for socket in (first, second):
+            event = json.loads(socket.receive_text())
+            assert event["event"] == "new_order"
+            assert event["order_id"] == order["id"]
+        # Both sockets were served by the subscription the first one opened
+        assert manager._listeners[tenant["id"]] is listener
+
+def test_last_observer_releases_the_subscription(client, tenant):
+    seen = []
+    client.portal.call(manager.add_observer, tenant["id"], seen.append)
+    assert tenant["id"] in manager._listeners
+
+    client.portal.call(manager.broadcast_to_restaurant, "hello", tenant["id"])
+    deadline = time.monotonic() + 2
+    while not seen and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert seen == ["hello"]
+
+    async def remove():
+        manager.remove_observer(tenant["id"], seen.append)
+    client.portal.call(remove)
+    assert tenant["id"] not in manager._listeners
+
+def test_other_restaurants_do_not_receive_the_event(client, tenant, product):
+    seen = []
+    other = tenant["id"] + 10_000
+    client.portal.call(manager.add_observer, other, seen.append)
+    place_order(client, tenant, product)
+    time.sleep(0.1)
+    assert seen == []
+
+    async def remove():
+        manager.remove_observer(other, seen.append)
+    client.portal.call(remove)
+
+def test_socket_without_token_is_refused(client):
+    with pytest.raises(WebSocketDisconnect) as refused:
+        with client.websocket_connect("/ws/kitchen") as socket:
+            socket.receive_text()
+    assert refused.value.code == 1008
+
+class FakeSocket:
+    """Stands in for a kitchen socket; a stalled one never finishes a send"""
+    application_state = WebSocketState.CONNECTED
+
+    def __init__(self, stalled: bool = False):
+        self.stalled = stalled
+        self.received = []
+        self.closed_with = None
+
+    async def send_text(self, message: str):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.received.append(message)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+def test_stalled_socket_is_dropped_without_holding_up_the_channel(client, tenant, monkeypatch):
+    monkeypatch.setattr(ws_manager, "WS_SEND_TIMEOUT_SECONDS", 0.1)
+    stalled, healthy, seen = FakeSocket(stalled=True), FakeSocket(), []
+    restaurant_id = tenant["id"]
+
+    async def attach():
+        manager.active_connections[restaurant_id] += [stalled, healthy]
+        await manager.add_observer(restaurant_id, seen.append)
+    client.portal.call(attach)
+
+    for message in ("first", "second"):
+        client.portal.call(manager.broadcast_to_restaurant, message, restaurant_id)
+    deadline = time.monotonic() + 2
+    while len(healthy.received) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert healthy.received == ["first", "second"]
+    assert seen == ["first", "second"]
+    assert stalled not in manager.active_connections[restaurant_id]
+    assert stalled.closed_with == 1013
+
+    async def detach():
+        manager.disconnect(healthy, restaurant_id)
+        manager.remove_observer(restaurant_id, seen.append)
+    client.portal.call(detach)
@@ -0,0 +1,261 @@
+import os
+import re
+import logging
+import time
+import asyncio
+import hashlib
+import tempfile
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ImportError:
+    import multipart
+    from multipart.multipart import parse_options_header
+
+import database, models, locks
+
+logger = logging.getLogger("ordera.uploads")
+
+UPLOADS_DIR = os.getenv("UPLOADS_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+# Files younger than this are never swept: they may be uploaded but not yet saved on a product
+UPLOAD_ORPHAN_GRACE_SECONDS = int(os.getenv("UPLOAD_ORPHAN_GRACE_SECONDS", str(24 * 3600)))
+UPLOAD_SWEEP_INTERVAL_SECONDS = int(os.getenv("UPLOAD_SWEEP_INTERVAL_SECONDS", str(6 * 3600)))
+
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+TEMP_PREFIX = ".upload-"
+# Resized copies rendered by images.py, named <stem>_<size>.<format>
+VARIANTS_DIRNAME = "variants"
+# Held by the one worker that sweeps this directory
+SWEEP_LOCK_NAME = ".sweep.lock"
+
+# The only names the sweep deletes: what save_upload and images.py write.
+# Anything else in the directory (.gitkeep, files copied in by hand) is left alone.
+_STORED_NAME = re.compile(r"^[0-9a-f]{64}\.[a-z]+$")
+_TEMP_NAME = re.compile(rf"^{re.escape(TEMP_PREFIX)}\w+$")
+_VARIANT_NAME = re.compile(r"^(?P<stem>[0-9a-f]{64})_[a-z]+\.[a-z]+(?P<tmp>\.\d+\.tmp)?$")
+
+class UploadError(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+class _FilePartReader:
+    """
+    python-multipart callbacks that keep only the bytes of the `file` part.
+    Data is collected per received chunk and drained by the caller after each write().
+    """
+
+    def __init__(self):
+        self.headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self.in_file = False
+        self.filename = None
+        self.found = False
+        self.pending = []
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self.headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self.headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.headers.get(b"content-disposition", b""))
+        if options.get(b"name") == b"file" and not self.found:
+            self.in_file = True
+            self.found = True
+            self.filename = options.get(b"filename", b"").decode("utf-8", "replace")
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self.in_file:
+            self.pending.append(data[start:end])
+
+    def on_part_end(self):
+        self.in_file = False
+
+    def drain(self) -> bytes:
+        data = b"".join(self.pending)
+        self.pending.clear()
+        return data
+
+def _open_temp():
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=UPLOADS_DIR)
+    return os.fdopen(fd, "wb"), path, hashlib.sha256()
+
+def _write_chunk(file, hasher, data: bytes):
+    hasher.update(data)
+    file.write(data)
+
+def _discard(file, path: str):
+    file.close()
+    if os.path.exists(path):
+        os.remove(path)
+
+def _store(file, path: str, digest: str, ext: str) -> str:
+    """Moves the temp file to its content-addressed name; duplicates are stored once"""
+    file.close()
+    filename = f"{digest}{ext}"
+    final_path = os.path.join(UPLOADS_DIR, filename)
+    try:
+        # Restart the orphan grace period: the caller is about to reference this file
+        os.utime(final_path)
+        os.remove(path)
+    except FileNotFoundError:
+        os.replace(path, final_path)
+    return filename
+
+async def save_upload(request: Request, max_bytes: int = None) -> str:
+    """
+    Streams the multipart `file` field to a temp file off the event loop, hashing it
+    as it goes, and stores it as uploads/<sha256><ext>. Memory use is one network
+    chunk regardless of the image size. Returns the stored file name.
+    """
+    max_bytes = max_bytes or UPLOAD_MAX_BYTES
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + 64 * 1024:
+        raise UploadError(f"File too large (max {max_bytes} bytes)", 413)
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadError("Expected multipart/form-data")
+
+    reader = _FilePartReader()
+    parser = multipart.MultipartParser(boundary, reader.callbacks())
+    file, path, hasher = await run_in_threadpool(_open_temp)
+    size = 0
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            data = reader.drain()
+            if not data:
+                continue
+            size += len(data)
+            if size > max_bytes:
+                raise UploadError(f"File too large (max {max_bytes} bytes)", 413)
+            await run_in_threadpool(_write_chunk, file, hasher, data)
+        parser.finalize()
+
+        if not reader.found:
+            raise UploadError("No file provided")
+        ext = os.path.splitext(reader.filename or "")[1].lower() or ".jpg"
+        if ext not in ALLOWED_EXTENSIONS:
+            raise UploadError(f"Unsupported file type {ext}")
+        return await run_in_threadpool(_store, file, path, hasher.hexdigest(), ext)
+    except BaseException:
+        await run_in_threadpool(_discard, file, path)
+        raise
+
+def _is_swept_upload(name: str) -> bool:
+    if _TEMP_NAME.match(name):
+        return True
+    return bool(_STORED_NAME.match(name)) and os.path.splitext(name)[1] in ALLOWED_EXTENSIONS
+
+def _remove_if_older(entry, cutoff: float) -> bool:
+    try:
+        if entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+            return True
+    except FileNotFoundError:
+        pass
+    return False
+
+def sweep_orphans(grace_seconds: int = None) -> int:
+    """
+    Deletes content-addressed uploads that no Product.image_url references, and
+    stale temp files, skipping anything younger than the grace period; then the
+    variants of originals that are gone. Files not named by save_upload or
+    images.py are never touched. Returns the number removed.
+    Call with the sweep lock held (see sweep_periodically).
+    """
+    if grace_seconds is None:
+        grace_seconds = UPLOAD_ORPHAN_GRACE_SECONDS
+    if not os.path.isdir(UPLOADS_DIR):
+        return 0
+    with database.get_db_context() as db:
+        referenced = {
+            os.path.basename(url.split("?", 1)[0])
+            for (url,) in db.query(models.Product.image_url).filter(models.Product.image_url.like("/uploads/%")).distinct()
+        }
+
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    with os.scandir(UPLOADS_DIR) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name not in referenced and _is_swept_upload(entry.name):
+                removed += _remove_if_older(entry, cutoff)
+
+    variants_dir = os.path.join(UPLOADS_DIR, VARIANTS_DIRNAME)
+    if os.path.isdir(variants_dir):
+        stems = {os.path.splitext(name)[0] for name in os.listdir(UPLOADS_DIR)}
+        with os.scandir(variants_dir) as entries:
+            for entry in entries:
+                match = _VARIANT_NAME.match(entry.name)
+                if not match or not entry.is_file():
+                    continue
+                if match.group("stem") not in stems:
+                    try:
+                        os.remove(entry.path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+                elif match.group("tmp"):
+                    # Left behind by a render that died mid-write
+                    removed += _remove_if_older(entry, cutoff)
+    return removed
+
+def sweep_lock() -> locks.FileLock:
+    return locks.FileLock(os.path.join(UPLOADS_DIR, SWEEP_LOCK_NAME))
+
+async def sweep_periodically(interval_seconds: int = UPLOAD_SWEEP_INTERVAL_SECONDS):
+    """
+    Background task started by main.startup in every worker. The first worker to
+    take the sweep lock keeps it and is the only one that sweeps; the others retry
+    each interval, so one of them takes over if it exits.
+    """
+    lock = sweep_lock()
+    try:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            if not lock.acquire():
+                continue
+            try:
+                removed = await database.run_db(sweep_orphans)
+                if removed:
+                    logger.info("Swept %d orphaned uploads", removed)
+            except Exception as e:
+                logger.exception("Orphan sweep failed")
+    finally:
+        lock.release()
+
+if __name__ == "__main__":
+    import sys
+    with sweep_lock() as locked:
+        if not locked:
+            sys.exit(f"A worker is already sweeping {UPLOADS_DIR}")
+        print(f"Removed {sweep_orphans()} orphaned uploads from {UPLOADS_DIR}")
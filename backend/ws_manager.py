@@ -1,34 +1,173 @@
 import os
 import json
+import time
 import asyncio
+import logging
 from starlette.websockets import WebSocket, WebSocketState
 import collections
 from broadcaster import Broadcast
+import metrics
 
 # Get Redis URL from environment
 REDIS_URL = os.getenv("REDIS_URL", "memory://")
 broadcast = Broadcast(REDIS_URL)
 
+logger = logging.getLogger("ordera.ws")
+
+# A socket that takes longer to accept one message (a stalled client with a full
+# TCP window) is dropped, so it can't hold up the rest of its restaurant's channel
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "5"))
+
 class ConnectionManager:
+    """
+    Per-process fan-out hub.
+
+    Each restaurant channel gets exactly one broadcaster subscription per process,
+    shared by every socket of that restaurant connected to this worker. The
+    subscription is opened by the first socket (or observer) and closed when the last
+    one leaves, so the number of Redis subscriptions scales with tenants, not with devices.
+
+    Observers are in-process callbacks that see every message of a channel, e.g. the
+    active order projection keeping itself current with writes from other workers.
+    """
+
     def __init__(self):
-        # We don't necessarily need to track active_connections if 
-        # broadcaster handles the delivery, but it's good for debugging/stats.
         self.active_connections: dict[int, list[WebSocket]] = collections.defaultdict(list)
+        # restaurant_id -> task holding the single broadcast.subscribe() for that channel
+        self._listeners: dict[int, asyncio.Task] = {}
+        # restaurant_id -> set once the channel subscription is live
+        self._subscribed: dict[int, asyncio.Event] = {}
+        self._observers: dict[int, list] = {}
+        # Closes of timed-out sockets, referenced until they finish
+        self._closing: set[asyncio.Task] = set()
 
     async def connect(self, websocket: WebSocket, restaurant_id: int):
         await websocket.accept()
         self.active_connections[restaurant_id].append(websocket)
-        print(f"WS: Connected restaurant {restaurant_id}. Total connections for this ID: {len(self.active_connections[restaurant_id])}")
+        self._ensure_listener(restaurant_id)
+        logger.info("WebSocket connected", extra={"fields": {"restaurant_id": restaurant_id, "connections": len(self.active_connections[restaurant_id])}})
 
     def disconnect(self, websocket: WebSocket, restaurant_id: int):
         if restaurant_id in self.active_connections:
             if websocket in self.active_connections[restaurant_id]:
                 self.active_connections[restaurant_id].remove(websocket)
-                print(f"WS: Disconnected restaurant {restaurant_id}. Remaining: {len(self.active_connections[restaurant_id])}")
+                logger.info("WebSocket disconnected", extra={"fields": {"restaurant_id": restaurant_id, "connections": len(self.active_connections[restaurant_id])}})
+            if not self.active_connections[restaurant_id]:
+                # Last local socket for this tenant: drop the channel subscription
+                del self.active_connections[restaurant_id]
+                self._release_listener(restaurant_id)
+
+    async def add_observer(self, restaurant_id: int, callback, timeout: float = 5.0):
+        """
+        Calls callback(message) for every message published to the restaurant's channel
+        until removed. Returns once the subscription is live (or after `timeout`).
+        """
+        self._observers.setdefault(restaurant_id, []).append(callback)
+        self._ensure_listener(restaurant_id)
+        try:
+            await asyncio.wait_for(self._subscribed[restaurant_id].wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Subscription not ready", extra={"fields": {"restaurant_id": restaurant_id}})
+
+    def remove_observer(self, restaurant_id: int, callback):
+        observers = self._observers.get(restaurant_id)
+        if observers and callback in observers:
+            observers.remove(callback)
+        if not observers:
+            self._observers.pop(restaurant_id, None)
+            self._release_listener(restaurant_id)
+
+    def _ensure_listener(self, restaurant_id: int):
+        if restaurant_id not in self._listeners:
+            self._subscribed[restaurant_id] = asyncio.Event()
+            self._listeners[restaurant_id] = asyncio.create_task(self._listen(restaurant_id))
+
+    def _release_listener(self, restaurant_id: int):
+        if self.active_connections.get(restaurant_id) or self._observers.get(restaurant_id):
+            return
+        self._subscribed.pop(restaurant_id, None)
+        listener = self._listeners.pop(restaurant_id, None)
+        if listener:
+            listener.cancel()
 
     async def broadcast_to_restaurant(self, message: str, restaurant_id: int):
         """Publishes the message to Redis channel for this restaurant"""
-        print(f"BROADCAST: Sending to restaurant_{restaurant_id}: {message}")
+        started = time.perf_counter()
         await broadcast.publish(channel=f"restaurant_{restaurant_id}", message=message)
+        metrics.broadcast_publish_duration.observe(time.perf_counter() - started)
+
+    def connection_counts(self) -> dict:
+        return {(restaurant_id,): len(sockets) for restaurant_id, sockets in self.active_connections.items()}
+
+    async def close(self):
+        """Cancels every channel subscription held by this process"""
+        listeners = list(self._listeners.values())
+        self._listeners.clear()
+        self._subscribed.clear()
+        self._observers.clear()
+        for listener in listeners:
+            listener.cancel()
+        await asyncio.gather(*listeners, return_exceptions=True)
+
+    async def _listen(self, restaurant_id: int):
+        try:
+            async with broadcast.subscribe(channel=f"restaurant_{restaurant_id}") as subscriber:
+                if restaurant_id in self._subscribed:
+                    self._subscribed[restaurant_id].set()
+                async for event in subscriber:
+                    self._notify_observers(event.message, restaurant_id)
+                    await self._fan_out(event.message, restaurant_id)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error("Subscription failed: %s", e, extra={"fields": {"restaurant_id": restaurant_id}})
+            if self._listeners.get(restaurant_id) is asyncio.current_task():
+                del self._listeners[restaurant_id]
+                self._subscribed.pop(restaurant_id, None)
+
+    def _notify_observers(self, message: str, restaurant_id: int):
+        for callback in list(self._observers.get(restaurant_id, ())):
+            try:
+                callback(message)
+            except Exception:
+                logger.exception("Channel observer failed", extra={"fields": {"restaurant_id": restaurant_id}})
+
+    async def _fan_out(self, message: str, restaurant_id: int):
+        """Pushes one message to every local socket of the restaurant concurrently"""
+        sockets = list(self.active_connections.get(restaurant_id, ()))
+        if not sockets:
+            return
+        results = await asyncio.gather(
+            *(self._send(websocket, message) for websocket in sockets),
+            return_exceptions=True
+        )
+        for websocket, result in zip(sockets, results):
+            if isinstance(result, asyncio.TimeoutError):
+                logger.warning("WebSocket send timed out", extra={"fields": {"restaurant_id": restaurant_id}})
+                self.disconnect(websocket, restaurant_id)
+                # The client reconnects and reloads; closing is best effort on a stalled socket
+                task = asyncio.create_task(self._close(websocket))
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+            elif isinstance(result, Exception):
+                self.disconnect(websocket, restaurant_id)
+
+    @staticmethod
+    async def _send(websocket: WebSocket, message: str):
+        if websocket.application_state != WebSocketState.CONNECTED:
+            raise RuntimeError("WebSocket is not connected")
+        await asyncio.wait_for(websocket.send_text(message), WS_SEND_TIMEOUT_SECONDS)
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=1013), WS_SEND_TIMEOUT_SECONDS)
+        except Exception:
+            pass
 
 manager = ConnectionManager()
+
+metrics.register(metrics.Gauge(
+    "ordera_websocket_connections", "Open kitchen WebSocket connections in this process",
+    ("restaurant_id",), collect=manager.connection_counts
+))
@@ -184,3 +184,11 @@ class Order {
     );
   }
 }
+
+// One page of GET /orders/, newest first; nextCursor fetches the page after it
+class OrderPage {
+  final List<Order> orders;
+  final String? nextCursor;
+
+  OrderPage({required this.orders, this.nextCursor});
+}
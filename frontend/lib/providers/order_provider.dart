@@ -6,11 +6,22 @@ import '../services/socket_service.dart';
 
 class OrderProvider with ChangeNotifier {
   List<Order> _orders = [];
-  final ApiService _apiService = ApiService();
-  final SocketService _socketService = SocketService();
+  final ApiService _apiService;
+  final SocketService _socketService;
   String? _authToken;
   int? _restaurantId;
   bool _isSocketInitialized = false;
+  int? _lastEventSeq;
+  // Kitchen displays only need open orders; refetches after missed events keep the mode
+  bool _activeOnly = false;
+  // Order history is loaded a page at a time; the cursor of the next page, if any
+  String? _nextCursor;
+  bool _isLoadingMore = false;
+  bool _loadMoreFailed = false;
+
+  OrderProvider({ApiService? apiService, SocketService? socketService})
+      : _apiService = apiService ?? ApiService(),
+        _socketService = socketService ?? SocketService();
 
   void update(String? token, int? restaurantId) {
     _authToken = token;
@@ -20,22 +31,25 @@ class OrderProvider with ChangeNotifier {
     }
     
     if (_authToken != null && _restaurantId != null && !_isSocketInitialized) {
-      initSocket(_restaurantId!);
+      initSocket(_restaurantId!, _authToken!);
       _isSocketInitialized = true;
     }
   }
 
   List<Order> get orders => _orders;
+  bool get hasMoreOrders => _nextCursor != null;
+  bool get isLoadingMore => _isLoadingMore;
+  bool get loadMoreFailed => _loadMoreFailed;
 
-  void initSocket(int restaurantId) {
+  void initSocket(int restaurantId, String token) {
      print("Initializing Socket for Restaurant: $restaurantId");
-     _socketService.connect(restaurantId);
+     _socketService.connect(restaurantId, token);
      _socketService.stream.listen((message) {
       print("Socket Received: $message");
       try {
         final data = jsonDecode(message);
         if (data['event'] == 'new_order' || data['event'] == 'order_update') {
-          fetchOrders(); 
+          _applyOrderEvent(data);
         }
       } catch (e) {
         print("Error parsing socket message: $e");
@@ -43,11 +57,49 @@ class OrderProvider with ChangeNotifier {
     });
   }
 
-  Future<void> fetchOrders() async {
+  // Events carry the full order and a per-restaurant sequence number, so they can be
+  // applied locally. A full refetch is only needed when an event was missed.
+  void _applyOrderEvent(Map<String, dynamic> data) {
+    final seq = (data['seq'] as num?)?.toInt();
+    final orderJson = data['order'];
+    if (seq == null || orderJson == null) {
+      fetchOrders();
+      return;
+    }
+    if (_lastEventSeq != null && seq <= _lastEventSeq!) {
+      return; // Stale or duplicate event
+    }
+    final missedEvents = _lastEventSeq != null && seq > _lastEventSeq! + 1;
+    _lastEventSeq = seq;
+    if (missedEvents) {
+      fetchOrders();
+      return;
+    }
+
+    final order = Order.fromJson(orderJson);
+    final index = _orders.indexWhere((o) => o.id == order.id);
+    if (index >= 0) {
+      _orders[index] = order;
+    } else {
+      _orders.insert(0, order); // Orders are kept newest first
+    }
+    notifyListeners();
+  }
+
+  Future<void> fetchOrders({bool? activeOnly}) async {
+    _activeOnly = activeOnly ?? _activeOnly;
     try {
       if (_authToken != null) {
         print("Fetching fresh orders...");
-        _orders = await _apiService.getOrders(_authToken!);
+        if (_activeOnly) {
+          _orders = await _apiService.getActiveOrders(_authToken!);
+          _nextCursor = null;
+        } else {
+          final page = await _apiService.getOrders(_authToken!);
+          _orders = page.orders;
+          _nextCursor = page.nextCursor;
+        }
+        _loadMoreFailed = false;
         notifyListeners();
       }
     } catch (e) {
@@ -55,6 +107,27 @@ class OrderProvider with ChangeNotifier {
     }
   }
 
+  // Appends the next (older) page of the order history; screens call it as the list scrolls
+  Future<void> fetchMoreOrders() async {
+    if (_authToken == null || _nextCursor == null || _isLoadingMore) return;
+    _isLoadingMore = true;
+    _loadMoreFailed = false;
+    notifyListeners();
+    try {
+      final page = await _apiService.getOrders(_authToken!, cursor: _nextCursor);
+      // Live events may already have added some of them
+      final known = _orders.map((o) => o.id).toSet();
+      _orders.addAll(page.orders.where((o) => !known.contains(o.id)));
+      _nextCursor = page.nextCursor;
+    } catch (e) {
+      print("Error fetching more orders: $e");
+      _loadMoreFailed = true;
+    } finally {
+      _isLoadingMore = false;
+      notifyListeners();
+    }
+  }
+
   Future<void> updateStatus(int orderId, String status, String token) async {
     print("OrderProvider: Updating Order #$orderId to status: $status");
     try {
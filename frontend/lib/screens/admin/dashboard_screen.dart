@@ -4,6 +4,7 @@ import 'package:intl/intl.dart';
 import '../../providers/order_provider.dart';
 import '../../providers/auth_provider.dart';
 import '../../models/models.dart';
+import '../../services/api_service.dart';
 import '../../config/design_system.dart';
 
 class AdminDashboardScreen extends StatefulWidget {
@@ -12,10 +13,45 @@ class AdminDashboardScreen extends StatefulWidget {
 }
 
 class _AdminDashboardScreenState extends State<AdminDashboardScreen> {
+  final ApiService _apiService = ApiService();
+  OrderProvider? _orderProvider;
+  // Today's totals (since local midnight) from GET /stats, refreshed whenever an order event arrives
+  Map<String, dynamic>? _todayTotals;
+  // From GET /orders/active: the provider holds only the newest page of orders
+  int _activeOrders = 0;
+
   @override
   void initState() {
     super.initState();
-    Future.microtask(() => Provider.of<OrderProvider>(context, listen: false).fetchOrders());
+    Future.microtask(() {
+      _orderProvider = Provider.of<OrderProvider>(context, listen: false);
+      _orderProvider!.addListener(_loadStats);
+      _orderProvider!.fetchOrders(activeOnly: false);
+      _loadStats();
+    });
+  }
+
+  @override
+  void dispose() {
+    _orderProvider?.removeListener(_loadStats);
+    super.dispose();
+  }
+
+  Future<void> _loadStats() async {
+    final token = Provider.of<AuthProvider>(context, listen: false).token;
+    if (token == null) return;
+    try {
+      final stats = await _apiService.getStats(token, period: 'day');
+      final active = await _apiService.getActiveOrders(token);
+      if (mounted) {
+        setState(() {
+          _todayTotals = stats['totals'];
+          _activeOrders = active.length;
+        });
+      }
+    } catch (e) {
+      print("Error fetching stats: $e");
+    }
   }
 
   @override
@@ -34,37 +70,25 @@ class _AdminDashboardScreenState extends State<AdminDashboardScreen> {
         actions: [
           IconButton(
             icon: const Icon(Icons.refresh, color: OrderaDesign.primary),
-            onPressed: () => Provider.of<OrderProvider>(context, listen: false).fetchOrders(),
+            onPressed: () {
+              Provider.of<OrderProvider>(context, listen: false).fetchOrders();
+              _loadStats();
+            },
           ),
           const SizedBox(width: 8),
         ],
       ),
       body: Consumer<OrderProvider>(
         builder: (ctx, orderData, _) {
-          double todayRevenue = 0;
-          int todayOrders = 0;
-          int activeOrders = 0;
           final today = DateTime.now();
           final formattedDate = DateFormat('EEEE, MMM dd').format(today);
 
-          final recentOrders = orderData.orders.reversed.take(5).toList();
-
-          for (var o in orderData.orders) {
-            if (o.status != 'cancelled') {
-              if (o.status != 'completed') {
-                activeOrders++;
-              }
-              if (o.createdAt != null &&
-                  o.createdAt!.day == today.day &&
-                  o.createdAt!.month == today.month &&
-                  o.createdAt!.year == today.year) {
-                todayRevenue += o.totalAmount;
-                todayOrders++;
-              }
-            }
-          }
+          // Newest first, as the server pages them
+          final recentOrders = orderData.orders.take(5).toList();
 
-          double avgOrderValue = todayOrders > 0 ? todayRevenue / todayOrders : 0;
+          final double todayRevenue = (_todayTotals?['revenue'] as num?)?.toDouble() ?? 0;
+          final int todayOrders = (_todayTotals?['orders'] as num?)?.toInt() ?? 0;
+          final double avgOrderValue = (_todayTotals?['average_order_value'] as num?)?.toDouble() ?? 0;
 
           return SingleChildScrollView(
             padding: const EdgeInsets.all(24),
@@ -78,7 +102,7 @@ class _AdminDashboardScreenState extends State<AdminDashboardScreen> {
                 // Stats Row
                 Row(
                   children: [
-                    Expanded(child: _buildStatMiniCard('Active Orders', activeOrders.toString(), Icons.pending_actions, Colors.orange)),
+                    Expanded(child: _buildStatMiniCard('Active Orders', _activeOrders.toString(), Icons.pending_actions, Colors.orange)),
                     const SizedBox(width: 16),
                     Expanded(child: _buildStatMiniCard('Avg. Order', '\$${avgOrderValue.toStringAsFixed(1)}', Icons.analytics, Colors.blue)),
                   ],
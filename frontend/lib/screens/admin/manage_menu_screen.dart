@@ -321,7 +321,7 @@ class _ManageMenuScreenState extends State<ManageMenuScreen> with SingleTickerPr
                   borderRadius: BorderRadius.circular(8),
                   child: product.imageUrl != null && product.imageUrl!.isNotEmpty
                       ? Image.network(
-                          '${_apiService.baseUrl}${product.imageUrl}',
+                          _apiService.imageUrl(product.imageUrl!),
                           width: 50,
                           height: 50,
                           fit: BoxFit.cover,
@@ -14,7 +14,7 @@ class _OrderHistoryScreenState extends State<OrderHistoryScreen> {
   @override
   void initState() {
     super.initState();
-    Future.microtask(() => Provider.of<OrderProvider>(context, listen: false).fetchOrders());
+    Future.microtask(() => Provider.of<OrderProvider>(context, listen: false).fetchOrders(activeOnly: false));
   }
 
   @override
@@ -33,7 +33,8 @@ class _OrderHistoryScreenState extends State<OrderHistoryScreen> {
       ),
       body: Consumer<OrderProvider>(
         builder: (ctx, orderData, _) {
-          final orders = orderData.orders.reversed.toList(); 
+          // Newest first, as the server pages them
+          final orders = orderData.orders;
 
           if (orders.isEmpty) {
             return Center(
@@ -50,8 +51,11 @@ class _OrderHistoryScreenState extends State<OrderHistoryScreen> {
 
           return ListView.builder(
             padding: const EdgeInsets.all(24),
-            itemCount: orders.length,
+            itemCount: orders.length + (orderData.hasMoreOrders ? 1 : 0),
             itemBuilder: (ctx, i) {
+              if (i == orders.length) {
+                return _buildLoadMore(orderData);
+              }
               final order = orders[i];
               return _OrderHistoryCard(order: order);
             },
@@ -60,6 +64,25 @@ class _OrderHistoryScreenState extends State<OrderHistoryScreen> {
       ),
     );
   }
+
+  // Last row while older pages remain: reaching it loads the next page
+  Widget _buildLoadMore(OrderProvider orderData) {
+    if (orderData.loadMoreFailed) {
+      return Center(
+        child: TextButton(
+          onPressed: orderData.fetchMoreOrders,
+          child: const Text('Retry loading older orders'),
+        ),
+      );
+    }
+    if (!orderData.isLoadingMore) {
+      Future.microtask(orderData.fetchMoreOrders);
+    }
+    return const Padding(
+      padding: EdgeInsets.symmetric(vertical: 16),
+      child: Center(child: CircularProgressIndicator()),
+    );
+  }
 }
 
 class _OrderHistoryCard extends StatelessWidget {
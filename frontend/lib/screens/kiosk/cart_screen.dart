@@ -55,7 +55,7 @@ class CartScreen extends StatelessWidget {
                           borderRadius: BorderRadius.circular(12),
                           child: item.product!.imageUrl != null && item.product!.imageUrl!.isNotEmpty
                               ? Image.network(
-                                  '${ApiService().baseUrl}${item.product!.imageUrl}',
+                                  ApiService().imageUrl(item.product!.imageUrl!),
                                   width: 60,
                                   height: 60,
                                   fit: BoxFit.cover,
@@ -257,7 +257,7 @@ class _ProductItemState extends State<_ProductItem> {
                       tag: 'product_${widget.product.id}',
                       child: widget.product.imageUrl != null && widget.product.imageUrl!.isNotEmpty
                           ? Image.network(
-                              '${ApiService().baseUrl}${widget.product.imageUrl}',
+                              ApiService().imageUrl(widget.product.imageUrl!, size: 'medium'),
                               fit: BoxFit.cover,
                               width: double.infinity,
                               errorBuilder: (ctx, _, __) => Container(
@@ -15,7 +15,7 @@ class _KitchenScreenState extends State<KitchenScreen> {
   @override
   void initState() {
     super.initState();
-    Future.microtask(() => Provider.of<OrderProvider>(context, listen: false).fetchOrders());
+    Future.microtask(() => Provider.of<OrderProvider>(context, listen: false).fetchOrders(activeOnly: true));
   }
 
   @override
@@ -7,6 +7,12 @@ import '../config/config.dart';
 class ApiService {
   final String baseUrl = AppConfig.apiBaseUrl;
 
+  // Resized WebP copy of an uploaded image ('thumb' = 200px, 'medium' = 800px)
+  String imageUrl(String path, {String size = 'thumb'}) {
+    if (!path.startsWith('/uploads/')) return '$baseUrl$path';
+    return '$baseUrl$path?size=$size&format=webp';
+  }
+
   Future<User?> login(String restaurantName, String city, String username, String password) async {
     print("ApiService: Login started for $username at $restaurantName ($city)");
     try {
@@ -82,13 +88,37 @@ class ApiService {
     }
   }
 
-  Future<List<Product>> getProducts(String token) async {
+  // Menu responses carry an ETag; revalidating with If-None-Match gets an empty 304
+  // while the menu is unchanged, so the last body is reused.
+  static final Map<String, MapEntry<String, String>> _menuCache = {};
+
+  Future<String?> _getMenu(String path, String token) async {
+    final url = '$baseUrl$path';
+    final cached = _menuCache['$token $url'];
     final response = await http.get(
-      Uri.parse('$baseUrl/products/'),
-      headers: {'Authorization': 'Bearer $token'},
+      Uri.parse(url),
+      headers: {
+        'Authorization': 'Bearer $token',
+        if (cached != null) 'If-None-Match': cached.key,
+      },
     );
+    if (response.statusCode == 304 && cached != null) {
+      return cached.value;
+    }
     if (response.statusCode == 200) {
-      List<dynamic> body = jsonDecode(response.body);
+      final etag = response.headers['etag'];
+      if (etag != null) {
+        _menuCache['$token $url'] = MapEntry(etag, response.body);
+      }
+      return response.body;
+    }
+    return null;
+  }
+
+  Future<List<Product>> getProducts(String token) async {
+    final responseBody = await _getMenu('/products/', token);
+    if (responseBody != null) {
+      List<dynamic> body = jsonDecode(responseBody);
       return body.map((dynamic item) => Product.fromJson(item)).toList();
     } else {
       throw Exception('Failed to load products');
@@ -96,12 +126,9 @@ class ApiService {
   }
 
   Future<List<Category>> getCategories(String token) async {
-    final response = await http.get(
-      Uri.parse('$baseUrl/categories/'),
-      headers: {'Authorization': 'Bearer $token'},
-    );
-    if (response.statusCode == 200) {
-      List<dynamic> body = jsonDecode(response.body);
+    final responseBody = await _getMenu('/categories/', token);
+    if (responseBody != null) {
+      List<dynamic> body = jsonDecode(responseBody);
       return body.map((dynamic item) => Category.fromJson(item)).toList();
     } else {
       throw Exception('Failed to load categories');
@@ -224,17 +251,51 @@ class ApiService {
   }
 
 
-  Future<List<Order>> getOrders(String token) async {
+  // One page of orders, newest first. Pass the page's nextCursor (X-Next-Cursor) to get the next one.
+  Future<OrderPage> getOrders(String token, {String? status, String? cursor}) async {
+    final query = <String, String>{
+      if (status != null) 'status': status,
+      if (cursor != null) 'cursor': cursor,
+    };
     final response = await http.get(
-      Uri.parse('$baseUrl/orders/'),
+      Uri.parse('$baseUrl/orders/').replace(queryParameters: query.isEmpty ? null : query),
       headers: {'Authorization': 'Bearer $token'},
     );
-    if (response.statusCode == 200) {
-      List<dynamic> body = jsonDecode(response.body);
-      return body.map((dynamic item) => Order.fromJson(item)).toList();
-    } else {
+    if (response.statusCode != 200) {
       throw Exception('Failed to load orders');
     }
+    List<dynamic> body = jsonDecode(response.body);
+    return OrderPage(
+      orders: body.map((dynamic item) => Order.fromJson(item)).toList(),
+      nextCursor: response.headers['x-next-cursor'],
+    );
+  }
+
+  // Orders not yet completed or cancelled, newest first, in one response (kitchen display).
+  Future<List<Order>> getActiveOrders(String token) async {
+    final response = await http.get(
+      Uri.parse('$baseUrl/orders/active'),
+      headers: {'Authorization': 'Bearer $token'},
+    );
+    if (response.statusCode != 200) {
+      throw Exception('Failed to load active orders');
+    }
+    List<dynamic> body = jsonDecode(response.body);
+    return body.map((dynamic item) => Order.fromJson(item)).toList();
+  }
+
+  // Sales totals and series from the server-side rollups; period is day, week or month.
+  // Days start at this device's local midnight.
+  Future<Map<String, dynamic>> getStats(String token, {String period = 'day'}) async {
+    final utcOffset = DateTime.now().timeZoneOffset.inMinutes;
+    final response = await http.get(
+      Uri.parse('$baseUrl/stats').replace(queryParameters: {'period': period, 'utc_offset': '$utcOffset'}),
+      headers: {'Authorization': 'Bearer $token'},
+    );
+    if (response.statusCode != 200) {
+      throw Exception('Failed to load stats');
+    }
+    return jsonDecode(response.body);
   }
 
   Future<Order> placeOrder(Order order, String token) async {
@@ -16,7 +16,7 @@ class SocketService {
     return _controller!.stream;
   }
 
-  void connect(int restaurantId) {
+  void connect(int restaurantId, String token) {
     if (_channel != null && _currentRestaurantId == restaurantId) {
       print('SocketService: Already connected to restaurant $restaurantId');
       return;
@@ -25,8 +25,9 @@ class SocketService {
     _currentRestaurantId = restaurantId;
     _controller ??= StreamController.broadcast();
     
-    final wsUrl = '$_wsBase/ws/kitchen?restaurant_id=$restaurantId';
-    print('SocketService: Connecting to $wsUrl');
+    // The server authenticates the handshake with the token and takes the restaurant from it
+    final wsUrl = '$_wsBase/ws/kitchen?restaurant_id=$restaurantId&token=${Uri.encodeQueryComponent(token)}';
+    print('SocketService: Connecting to restaurant $restaurantId');
     
     try {
       _channel = WebSocketChannel.connect(Uri.parse(wsUrl));
@@ -36,7 +37,7 @@ class SocketService {
         },
         onError: (error) {
           print('SocketService Error: $error');
-          _reconnect(restaurantId);
+          _reconnect(restaurantId, token);
         },
         onDone: () {
           print('SocketService: Connection closed');
@@ -48,10 +49,10 @@ class SocketService {
     }
   }
 
-  void _reconnect(int restaurantId) {
+  void _reconnect(int restaurantId, String token) {
     _channel?.sink.close();
     _channel = null;
-    Future.delayed(Duration(seconds: 5), () => connect(restaurantId));
+    Future.delayed(Duration(seconds: 5), () => connect(restaurantId, token));
   }
 
   void disconnect() {
@@ -0,0 +1,94 @@
+import 'dart:async';
+import 'dart:convert';
+
+import 'package:flutter_test/flutter_test.dart';
+
+import 'package:frontend/models/models.dart';
+import 'package:frontend/providers/order_provider.dart';
+import 'package:frontend/services/api_service.dart';
+import 'package:frontend/services/socket_service.dart';
+
+Order order(int id) => Order(
+      id: id,
+      totalAmount: 1.0,
+      paymentStatus: 'unpaid',
+      paymentMethod: 'cash',
+      status: 'pending',
+      items: [],
+    );
+
+// Serves GET /orders/ from a newest-first list, two orders per page
+class FakeApiService extends ApiService {
+  final List<Order> history;
+  final List<String?> cursors = [];
+
+  FakeApiService(this.history);
+
+  @override
+  Future<OrderPage> getOrders(String token, {String? status, String? cursor}) async {
+    cursors.add(cursor);
+    final start = cursor == null ? 0 : int.parse(cursor);
+    final end = (start + 2).clamp(0, history.length);
+    return OrderPage(
+      orders: history.sublist(start, end),
+      nextCursor: end < history.length ? '$end' : null,
+    );
+  }
+}
+
+class FakeSocketService extends SocketService {
+  final StreamController<String> events = StreamController.broadcast();
+
+  @override
+  Stream get stream => events.stream;
+
+  @override
+  void connect(int restaurantId, String token) {}
+}
+
+void main() {
+  late FakeApiService api;
+  late FakeSocketService socket;
+  late OrderProvider provider;
+
+  setUp(() {
+    api = FakeApiService([order(5), order(4), order(3), order(2), order(1)]);
+    socket = FakeSocketService();
+    provider = OrderProvider(apiService: api, socketService: socket);
+    provider.update('token', 1);
+  });
+
+  test('loads one page, newest first', () async {
+    await provider.fetchOrders(activeOnly: false);
+    expect(provider.orders.map((o) => o.id), [5, 4]);
+    expect(provider.hasMoreOrders, isTrue);
+    expect(api.cursors, [null]);
+  });
+
+  test('older pages are appended on demand', () async {
+    await provider.fetchOrders(activeOnly: false);
+    await provider.fetchMoreOrders();
+    await provider.fetchMoreOrders();
+    expect(provider.orders.map((o) => o.id), [5, 4, 3, 2, 1]);
+    expect(provider.hasMoreOrders, isFalse);
+
+    await provider.fetchMoreOrders();
+    expect(api.cursors, [null, '2', '4']);
+  });
+
+  test('new orders from events go first', () async {
+    await provider.fetchOrders(activeOnly: false);
+    socket.events.add(jsonEncode({
+      'event': 'new_order',
+      'seq': 1,
+      'order': {'id': 6, 'total_amount': 1.0, 'status': 'pending', 'items': []},
+    }));
+    await Future.delayed(Duration.zero);
+    expect(provider.orders.map((o) => o.id), [6, 5, 4]);
+
+    // A page overlapping the live events adds no duplicates
+    api.history.insert(0, order(6));
+    await provider.fetchMoreOrders();
+    expect(provider.orders.map((o) => o.id), [6, 5, 4, 3]);
+  });
+}